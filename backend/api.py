@@ -1,42 +1,101 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import logging
+import asyncio
 from contextlib import asynccontextmanager
 
 from routers import auth, users, roles, system, messages, transactions
 from routers import admin_db
 from routers import family_assignation as family_assignation_router
-from database import get_db_connection
-from dependencies import ensure_revoked_tokens_table
+from dependencies import open_cursor, mark_user_wrote
+from database import close_db_pool, warm_db_pools, BACKGROUND_POOL
+from executors import shutdown_executors
+from disconnect import CancelOnDisconnectMiddleware
+from query_budget import QueryBudgetMiddleware
 from utils import init_users_graph
+from id_allocator import ensure_id_sequences_table
+from token_generations import ensure_token_generations_table
+from revocations import ensure_revoked_tokens_table, revocation_purge_loop
+from settings import settings
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    try:
-        ensure_revoked_tokens_table(cursor)
+async def _retry_until_done(name: str, step, delay: float = 5.0) -> None:
+    """Run a startup step until it succeeds (the DB may come up after the app)."""
+    while True:
         try:
-            conn.commit()
+            if await step():
+                return
+        except asyncio.CancelledError:
+            raise
         except Exception:
-            logging.exception(
-                "[lifespan] Commit failed after ensuring revoked_tokens table"
-            )
-        # Initialize users graph at startup
+            logging.exception(f"[lifespan] Startup step '{name}' failed, retrying in {delay}s")
+        await asyncio.sleep(delay)
+
+
+async def _startup(app: FastAPI) -> None:
+    """Warm the pools (and SSH tunnel), ensure tables and build the users graph
+    concurrently; /readyz reports ready once all of it is done.
+    """
+
+    async def _warm() -> bool:
+        opened = await warm_db_pools()
+        logging.info(f"[lifespan] DB pools warmed: {opened}")
+        app.state.db_ready = True
+        return True
+
+    async def _schema() -> bool:
+        cursor = await open_cursor(BACKGROUND_POOL)
         try:
-            init_users_graph(app)
-        except Exception:
-            logging.exception("[lifespan] Failed to initialize users graph")
-        yield
-    finally:
+            await ensure_revoked_tokens_table(cursor)
+            await ensure_id_sequences_table(cursor)
+            await ensure_token_generations_table(cursor)
+            await cursor.commit()
+        finally:
+            await cursor.close()
+        return True
+
+    async def _graph() -> bool:
+        cursor = await open_cursor(BACKGROUND_POOL)
         try:
-            cursor.close()
+            await init_users_graph(app, cursor)
         finally:
+            await cursor.close()
+        # init_users_graph logs its own failures; retry until a graph is stored
+        return getattr(app.state, "users_graph", None) is not None
+
+    await asyncio.gather(
+        _retry_until_done("warm", _warm),
+        _retry_until_done("schema", _schema),
+        _retry_until_done("graph", _graph),
+    )
+    app.state.startup_complete = True
+    logging.info("[lifespan] Startup complete")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db_ready = False
+    app.state.startup_complete = False
+    # Startup runs in the background: no connection is pinned for the app lifetime,
+    # and /healthz answers while the pools warm up
+    startup = asyncio.create_task(_startup(app))
+    background = [startup]
+    if settings.revoked_tokens_purge_interval > 0:
+        background.append(asyncio.create_task(
+            revocation_purge_loop(lambda: open_cursor(BACKGROUND_POOL, "revoked_tokens_purge"))
+        ))
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        for task in background:
             try:
-                conn.close()
-            except Exception:
-                logging.exception("[lifespan] Failed to close DB connection")
+                await task
+            except asyncio.CancelledError:
+                pass
+        await close_db_pool()
+        shutdown_executors()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -52,6 +111,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Stop (and KILL QUERY) handlers whose client went away
+app.add_middleware(CancelOnDisconnectMiddleware)
+# Per-request statement count / DB time, N+1 warnings and the statement budget
+app.add_middleware(QueryBudgetMiddleware)
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    # Restart the primary-read window once a write has completed (see get_read_cursor)
+    response = await call_next(request)
+    if request.method not in {"GET", "HEAD", "OPTIONS"} and response.status_code < 400:
+        mark_user_wrote(getattr(request.state, "user_id", None))
+    return response
+
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(users.router, tags=["Users"])
@@ -1,5 +1,5 @@
 from passlib.context import CryptContext
-from typing import Optional
+from typing import Iterable, Optional
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 import uuid
@@ -31,8 +31,18 @@ def verify_password(plain_password: Optional[str], hashed_password: Optional[str
         logger.warning(f"[auth] Password verify failed, using legacy fallback: {e}")
         return (plain_password or "") == (hashed_password or "")
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+def create_access_token(
+    data: dict,
+    expires_delta: Optional[timedelta] = None,
+    roles: Optional[Iterable[str]] = None,
+    generation: Optional[int] = None,
+) -> str:
+    """Signed access token. With `roles` and `generation` (the user's current token
+    generation) it is self-contained: get_current_user takes the roles from it and
+    accepts it only while the generation is current."""
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=settings.jwt_exp_minutes))
     to_encode.update({"exp": expire, "jti": str(uuid.uuid4())})
+    if roles is not None and generation is not None:
+        to_encode.update({"roles": sorted({str(r).lower() for r in roles}), "gen": int(generation)})
     return jwt.encode(to_encode, settings.jwt_secret, algorithm=settings.jwt_algorithm)
@@ -0,0 +1,113 @@
+"""
+Compare the thread-wrapped mysql-connector path against the native aiomysql path
+behind the same AsyncCursor interface.
+
+Each simulated request opens a cursor (pool checkout), runs the read pattern of an
+authenticated `create_user` call (revocation check, user load, role checks, username
+and parent lookups) and closes the cursor. Read-only, safe to run against a dev DB.
+
+Usage (from backend/, with the usual .env):
+    python benchmarks/bench_db_driver.py --concurrency 15 --duration 10
+    python benchmarks/bench_db_driver.py --drivers aiomysql --concurrency 60
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settings import settings  # noqa: E402
+from dependencies import open_cursor  # noqa: E402
+from database import close_db_pool, get_db_pool_stats  # noqa: E402
+
+QUERIES = [
+    ("SELECT id FROM revoked_tokens WHERE jti = %s", ("bench-jti",)),
+    ("SELECT * FROM users WHERE id = %s", (1,)),
+    ("SELECT id FROM users WHERE username = %s LIMIT 1", ("bench-username",)),
+    ("SELECT id FROM users WHERE id = %s", (1,)),
+    ("SELECT id FROM users WHERE id = %s", (2,)),
+    (
+        "SELECT r.role FROM role_attribution ra JOIN roles r ON r.id = ra.roles_id WHERE ra.users_id = %s",
+        (1,),
+    ),
+    (
+        "SELECT r.role FROM role_attribution ra JOIN roles r ON r.id = ra.roles_id WHERE ra.users_id = %s",
+        (1,),
+    ),
+    ("SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM users", None),
+    ("SELECT id FROM roles WHERE role = %s", ("member",)),
+    ("SELECT * FROM users WHERE id = %s", (1,)),
+]
+
+
+async def _one_request() -> None:
+    cursor = await open_cursor()
+    try:
+        for sql, params in QUERIES:
+            await cursor.execute(sql, params)
+            await cursor.fetchall()
+    finally:
+        await cursor.close()
+
+
+async def _run(driver: str, concurrency: int, duration: float) -> dict:
+    settings.db_driver = driver
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await _one_request()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    # Warm the pool so creation cost is not measured
+    await _one_request()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    pool = get_db_pool_stats()["primary"]
+    await close_db_pool()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float("nan")
+    return {
+        "driver": driver,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99_ms": p99 * 1000,
+        "wait_p99_ms": pool.get("wait_p99_ms", 0.0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--drivers", default="thread,aiomysql")
+    parser.add_argument("--concurrency", type=int, default=settings.db_pool_size)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"{len(QUERIES)} queries per request, concurrency={args.concurrency}, duration={args.duration}s")
+    print(f"{'driver':<10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'wait p99':>9}")
+    for driver in [d.strip() for d in args.drivers.split(",") if d.strip()]:
+        # Fresh loop per driver so pools and executors do not leak between runs
+        res = asyncio.run(_run(driver, args.concurrency, args.duration))
+        print(
+            f"{res['driver']:<10} {res['requests']:>9} {res['errors']:>7} "
+            f"{res['rps']:>9.1f} {res['p50_ms']:>8.2f} {res['p99_ms']:>8.2f} {res['wait_p99_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
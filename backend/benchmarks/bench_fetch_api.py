@@ -0,0 +1,136 @@
+"""
+Compare execute() + fetchone()/fetchall() against the combined fetch_one()/fetch_all()
+cursor API on the read path of an authenticated `GET /transactions` call.
+
+Each simulated request opens a cursor, runs the revocation check, user load, role
+lookup, transaction list and approvals queries, then closes the cursor. On the
+thread driver every awaited cursor call is one hop to the DB executor, so the
+report includes executor hops per request. Read-only, safe to run against a dev DB.
+
+Usage (from backend/, with the usual .env):
+    python benchmarks/bench_fetch_api.py --concurrency 15 --duration 10
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settings import settings  # noqa: E402
+from dependencies import open_cursor  # noqa: E402
+from database import close_db_pool  # noqa: E402
+from executors import get_executor_stats  # noqa: E402
+
+ONE = [
+    ("SELECT id FROM revoked_tokens WHERE jti = %s", ("bench-jti",)),
+    ("SELECT * FROM users WHERE id = %s", (1,)),
+]
+ALL = [
+    (
+        "SELECT r.role FROM role_attribution ra JOIN roles r ON r.id = ra.roles_id WHERE ra.users_id = %s",
+        (1,),
+    ),
+    (
+        "SELECT t.*, u.username AS user_username FROM transactions t "
+        "JOIN users u ON u.id = t.users_id WHERE (t.users_id = %s OR t.status = 'VALIDATED') "
+        "ORDER BY t.created_at DESC LIMIT 50",
+        (1,),
+    ),
+    (
+        "SELECT ta.* FROM transaction_approvals ta WHERE ta.transactions_id IN (%s, %s, %s)",
+        (1, 2, 3),
+    ),
+]
+
+
+async def _request_split(cursor) -> None:
+    for sql, params in ONE:
+        await cursor.execute(sql, params)
+        await cursor.fetchall()
+    for sql, params in ALL:
+        await cursor.execute(sql, params)
+        await cursor.fetchall()
+
+
+async def _request_combined(cursor) -> None:
+    for sql, params in ONE:
+        await cursor.fetch_one(sql, params)
+    for sql, params in ALL:
+        await cursor.fetch_all(sql, params)
+
+
+MODES = {"split": _request_split, "combined": _request_combined}
+
+
+async def _one_request(mode: str) -> None:
+    cursor = await open_cursor()
+    try:
+        await MODES[mode](cursor)
+    finally:
+        await cursor.close()
+
+
+async def _run(mode: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await _one_request(mode)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    # Warm the pool so creation cost is not measured
+    await _one_request(mode)
+    hops_before = get_executor_stats()["db"]["completed"]
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    hops = get_executor_stats()["db"]["completed"] - hops_before
+    await close_db_pool()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float("nan")
+    done = len(latencies) + errors
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "errors": errors,
+        "hops": hops / done if done else 0.0,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99_ms": p99 * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="split,combined")
+    parser.add_argument("--concurrency", type=int, default=settings.db_pool_size)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(
+        f"driver={settings.db_driver}, {len(ONE) + len(ALL)} queries per request, "
+        f"concurrency={args.concurrency}, duration={args.duration}s"
+    )
+    print(f"{'mode':<10} {'requests':>9} {'errors':>7} {'hops/req':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        res = asyncio.run(_run(mode, args.concurrency, args.duration))
+        print(
+            f"{res['mode']:<10} {res['requests']:>9} {res['errors']:>7} {res['hops']:>9.1f} "
+            f"{res['rps']:>9.1f} {res['p50_ms']:>8.2f} {res['p99_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Compare per-statement commits against one transaction() per request on the write
+path of `POST /users` (user row, role attribution, group-admin assignments).
+
+"autocommit" mirrors the old handler: every write commits on its own, so each
+request pays one redo-log flush per statement. "transaction" wraps the same
+writes in cursor.transaction(), with the optional parts in savepoints like the
+handler does, and commits once.
+
+Writes go to a scratch table (`bench_uow`) that is created and dropped by the
+script; application tables are not touched.
+
+Usage (from backend/, with the usual .env):
+    python benchmarks/bench_transaction.py --concurrency 8 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from settings import settings  # noqa: E402
+from dependencies import open_cursor  # noqa: E402
+from database import close_db_pool  # noqa: E402
+
+TABLE = "bench_uow"
+INSERT = f"INSERT INTO {TABLE} (kind, ref_id, note) VALUES (%s, %s, %s)"
+_ids = itertools.count(1)
+
+
+async def _request_autocommit(cursor) -> None:
+    uid = next(_ids)
+    await cursor.execute(INSERT, ("user", uid, "create_user"))
+    await cursor.commit()
+    await cursor.execute(INSERT, ("role", uid, "member"))
+    await cursor.commit()
+    await cursor.executemany(INSERT, [("assignation", uid, "self"), ("assignation", uid, "co")])
+    await cursor.commit()
+
+
+async def _request_transaction(cursor) -> None:
+    uid = next(_ids)
+    async with cursor.transaction():
+        await cursor.execute(INSERT, ("user", uid, "create_user"))
+        async with cursor.transaction():
+            await cursor.execute(INSERT, ("role", uid, "member"))
+        async with cursor.transaction():
+            await cursor.executemany(INSERT, [("assignation", uid, "self"), ("assignation", uid, "co")])
+
+
+MODES = {"autocommit": _request_autocommit, "transaction": _request_transaction}
+
+
+async def _one_request(mode: str) -> None:
+    cursor = await open_cursor()
+    try:
+        await MODES[mode](cursor)
+    finally:
+        await cursor.close()
+
+
+async def _ddl(sql: str) -> None:
+    cursor = await open_cursor()
+    try:
+        await cursor.execute(sql)
+    finally:
+        await cursor.close()
+
+
+async def _run(mode: str, concurrency: int, duration: float) -> dict:
+    await _ddl(
+        f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+        "id INT AUTO_INCREMENT PRIMARY KEY, kind VARCHAR(16), ref_id INT, note VARCHAR(64))"
+    )
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                await _one_request(mode)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    try:
+        # Warm the pool so creation cost is not measured
+        await _one_request(mode)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await _ddl(f"DROP TABLE IF EXISTS {TABLE}")
+        await close_db_pool()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float("nan")
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else float("nan"),
+        "p99_ms": p99 * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modes", default="autocommit,transaction")
+    parser.add_argument("--concurrency", type=int, default=settings.db_pool_size)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    print(f"driver={settings.db_driver}, concurrency={args.concurrency}, duration={args.duration}s")
+    print(f"{'mode':<12} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        res = asyncio.run(_run(mode, args.concurrency, args.duration))
+        print(
+            f"{res['mode']:<12} {res['requests']:>9} {res['errors']:>7} "
+            f"{res['rps']:>9.1f} {res['p50_ms']:>8.2f} {res['p99_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
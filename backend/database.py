@@ -1,146 +1,293 @@
 import mysql.connector
-from mysql.connector import pooling
-import uuid
 from settings import settings
+from db_pool import AsyncConnectionPool, PoolTimeoutError  # noqa: F401
+from executors import db_executor, control_executor
+from ssh_tunnel import SSHTunnelSupervisor
 import logging
 import atexit
-from typing import Optional
+import asyncio
 import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
 
-_ssh_tunnel = None  # type: Optional[object]
+_ssh_tunnels: Optional[SSHTunnelSupervisor] = None
+_ssh_tunnels_lock = threading.Lock()
 
 try:
-    from sshtunnel import SSHTunnelForwarder
+    import aiomysql
 except Exception:  # pragma: no cover
-    SSHTunnelForwarder = None  # type: ignore
-try:
-    import paramiko
-except Exception:
-    paramiko = None
+    aiomysql = None  # type: ignore
 
-# Global pool for connection reuse (Warm Start)
-_db_pool = None
+# Global pools for connection reuse (Warm Start), shared by both drivers
+_db_pools: Dict[str, AsyncConnectionPool] = {}
+_db_pools_lock: Optional[asyncio.Lock] = None
 logger = logging.getLogger("db")
 
-def get_db_connection(autocommit: bool = True):
-    """Return a pooled MySQL connection; create pool on first use.
-    Autocommit is enabled by default but can be disabled for transactions.
-    """
-    global _db_pool, _ssh_tunnel
 
-    base_config = settings.get_db_config()
+def _get_tunnels() -> SSHTunnelSupervisor:
+    """Start the SSH tunnel supervisor on first use (blocking: call off the event loop)."""
+    global _ssh_tunnels
+    with _ssh_tunnels_lock:
+        if _ssh_tunnels is None:
+            sup = SSHTunnelSupervisor(
+                settings,
+                count=settings.ssh_tunnel_count,
+                health_interval=settings.ssh_health_interval,
+            )
+            sup.start()
+            # Stop tunnels on process exit
+            atexit.register(sup.stop)
+            _ssh_tunnels = sup
+    return _ssh_tunnels
+
+
+def _resolve_db_config() -> dict:
+    """Return the MySQL connection config; through one of the SSH tunnels if enabled.
+    Called for every new connection so reconnected/extra tunnels are picked up.
+    """
+    config = dict(settings.get_db_config())
 
     # Harmonisation : en développement, on force la connexion locale
-    if getattr(settings, "is_development", False):
-        effective_host = base_config.get("host")
-        effective_port = base_config.get("port")
-    else:
-        # Si SSH est activé et pas en développement, on utilise le tunnel
-        if getattr(settings, "db_via_ssh", False):
-            if SSHTunnelForwarder is None:
-                raise RuntimeError("sshtunnel is not installed but BACKEND_DB_VIA_SSH=true. Add 'sshtunnel' to requirements and install.")
-
-            if _ssh_tunnel is None or not getattr(_ssh_tunnel, "is_active", False):
-                if not settings.ssh_host or not settings.ssh_user or not settings.ssh_key_path:
-                    raise RuntimeError("SSH DB mode requires BACKEND_SSH_HOST, BACKEND_SSH_USER and BACKEND_SSH_KEY_PATH in .env")
-                tunnel_kwargs = dict(
-                    ssh_username=settings.ssh_user,
-                    remote_bind_address=(settings.ssh_remote_bind_host, settings.ssh_remote_bind_port),
-                    set_keepalive=10.0,
-                    allow_agent=False,
-                )
-                # Optional: SSH password support
-                if getattr(settings, "ssh_password", None):
-                    tunnel_kwargs["ssh_password"] = settings.ssh_password
-                # Try to load the PEM key explicitly using Paramiko for better compatibility
-                pkey_obj = None
-                if paramiko is not None and os.path.exists(settings.ssh_key_path or ""):
-                    key_pw = getattr(settings, "ssh_key_password", None)
-                    for KeyCls in (
-                        getattr(paramiko, "RSAKey", None),
-                        getattr(paramiko, "Ed25519Key", None),
-                        getattr(paramiko, "ECDSAKey", None),
-                        getattr(paramiko, "DSSKey", None),
-                    ):
-                        if KeyCls is None:
-                            continue
-                        try:
-                            pkey_obj = KeyCls.from_private_key_file(settings.ssh_key_path, password=key_pw)
-                            break
-                        except Exception:
-                            # Try next key type
-                            pass
-                # Fall back to path if explicit load failed
-                if pkey_obj is not None:
-                    tunnel_kwargs["ssh_pkey"] = pkey_obj
-                else:
-                    tunnel_kwargs["ssh_pkey"] = settings.ssh_key_path
-                # If a passphrase is set, inform sshtunnel
-                if getattr(settings, "ssh_key_password", None):
-                    tunnel_kwargs["ssh_private_key_password"] = settings.ssh_key_password
-                
-                _ssh_tunnel = SSHTunnelForwarder(
-                    (settings.ssh_host, settings.ssh_port),
-                    **tunnel_kwargs,
-                )
-                _ssh_tunnel.start()
-
-                # Stop tunnel on process exit
-                def _stop_tunnel():
-                    try:
-                        if _ssh_tunnel and getattr(_ssh_tunnel, "is_active", False):
-                            _ssh_tunnel.stop()
-                    except Exception:
-                        pass
-
-                atexit.register(_stop_tunnel)
-
-            effective_host = "127.0.0.1"
-            effective_port = int(getattr(_ssh_tunnel, "local_bind_port", 3306))
-        else:
-            effective_host = base_config.get("host")
-            effective_port = base_config.get("port")
-
-    config = dict(base_config)
-    config.update({"host": effective_host, "port": effective_port})
-
-    # Create pool lazily
-    if _db_pool is None:
-        try:
-            _db_pool = pooling.MySQLConnectionPool(
-                pool_name="kassa_pool",
-                pool_size=settings.db_pool_size,
-                **config,
-            )
-        except mysql.connector.Error as e:
-            # Fallback: try creating the pool again with a unique name
-            logger.warning(f"[db] Initial pool creation failed, retrying with unique name: {e}")
-            _db_pool = pooling.MySQLConnectionPool(
-                pool_name=f"kassa_pool_{uuid.uuid4().hex[:8]}",
-                pool_size=settings.db_pool_size,
-                **config,
+    # Si SSH est activé et pas en développement, on utilise le tunnel
+    if getattr(settings, "db_via_ssh", False) and not getattr(settings, "is_development", False):
+        host, port = (_ssh_tunnels or _get_tunnels()).pick()
+        config.update({"host": host, "port": port})
+    return config
+
+
+def get_ssh_tunnel_stats() -> Optional[list]:
+    """Tunnel health and reconnect counts (None when not connecting over SSH)."""
+    return _ssh_tunnels.stats() if _ssh_tunnels is not None else None
+
+
+# Pool names. "primary" serves interactive traffic; "admin" and "background" are
+# separately sized partitions on the same server; "read" points at the optional replica.
+PRIMARY_POOL = "primary"
+ADMIN_POOL = "admin"
+BACKGROUND_POOL = "background"
+READ_POOL = "read"
+
+
+def has_read_pool() -> bool:
+    return settings.get_db_read_config() is not None
+
+
+def _pool_spec(name: str) -> Tuple[int, float]:
+    """(size, checkout timeout) of a pool partition."""
+    if name == PRIMARY_POOL:
+        return settings.db_pool_size, settings.db_pool_timeout
+    if name == ADMIN_POOL:
+        return settings.db_admin_pool_size, settings.db_admin_pool_timeout
+    if name == BACKGROUND_POOL:
+        return settings.db_background_pool_size, settings.db_background_pool_timeout
+    if name == READ_POOL:
+        return settings.db_read_pool_size, settings.db_pool_timeout
+    raise ValueError(f"Unknown DB pool: {name}")
+
+
+def _build_pool(name: str, config_fn: Callable[[], dict], size: int, timeout: float) -> AsyncConnectionPool:
+    """Create a pool with connect/close/ping hooks for the configured driver.
+    `config_fn` is evaluated per connection (SSH tunnel endpoints can change).
+    """
+    if settings.db_driver == "aiomysql":
+        if aiomysql is None:
+            raise RuntimeError("aiomysql is not installed but BACKEND_DB_DRIVER=aiomysql. Add 'aiomysql' to requirements and install.")
+
+        async def _connect():
+            config = config_fn()
+            return await aiomysql.connect(
+                host=config.get("host"),
+                port=int(config.get("port") or 3306),
+                user=config.get("user"),
+                password=config.get("password") or "",
+                db=config.get("database"),
+                connect_timeout=config.get("connect_timeout", 5),
+                autocommit=True,
             )
 
-    conn = _db_pool.get_connection()
-    # Ensure connection liveness
-    try:
-        conn.ping(reconnect=True, attempts=3, delay=1)
-    except Exception as e:
-        # If ping fails, get a fresh connection from pool
-        try:
+        async def _close(conn):
             conn.close()
-        except Exception as ce:
-            logger.warning(f"[db] Closing dead connection failed: {ce}")
-        conn = _db_pool.get_connection()
-        try:
-            conn.ping(reconnect=True, attempts=3, delay=1)
-        except Exception as e2:
-            logger.warning(f"[db] Second ping attempt failed: {e2}")
-
-    # Set autocommit as requested
+
+        async def _ping(conn):
+            await conn.ping(reconnect=False)
+
+        async def _cancel(conn):
+            # KILL QUERY from a side connection; the victim connection stays usable
+            killer = await _connect()
+            try:
+                async with killer.cursor() as cur:
+                    await cur.execute("KILL QUERY %s", (conn.thread_id(),))
+            finally:
+                killer.close()
+    else:
+        async def _connect():
+            return await db_executor.run(lambda: mysql.connector.connect(autocommit=True, **config_fn()))
+
+        async def _close(conn):
+            await db_executor.run(conn.close)
+
+        async def _ping(conn):
+            await db_executor.run(conn.ping, reconnect=False)
+
+        def _kill_sync(thread_id: int):
+            killer = mysql.connector.connect(**config_fn())
+            try:
+                cur = killer.cursor()
+                cur.execute("KILL QUERY %s", (thread_id,))
+                cur.close()
+            finally:
+                killer.close()
+
+        async def _cancel(conn):
+            # Not on db_executor: its threads may all be busy with the queries being killed
+            await control_executor.run(_kill_sync, conn.connection_id)
+
+    return AsyncConnectionPool(
+        name,
+        _connect,
+        _close,
+        _ping,
+        size=size,
+        max_waiters=settings.db_pool_max_waiters,
+        acquire_timeout=timeout,
+        max_lifetime=settings.db_pool_max_lifetime,
+        idle_timeout=settings.db_pool_idle_timeout,
+        ping_after=settings.db_pool_ping_after,
+        cancel=_cancel,
+        leak_threshold=settings.db_pool_leak_threshold,
+    )
+
+
+async def get_db_pool(name: str = PRIMARY_POOL) -> AsyncConnectionPool:
+    """Return the named connection pool; create it on first use.
+    READ_POOL falls back to the primary when no replica is configured.
+    """
+    global _db_pools_lock
+
+    if name == READ_POOL and not has_read_pool():
+        name = PRIMARY_POOL
+    pool = _db_pools.get(name)
+    if pool is not None:
+        return pool
+    if _db_pools_lock is None:
+        _db_pools_lock = asyncio.Lock()
+    size, timeout = _pool_spec(name)
+    async with _db_pools_lock:
+        if name not in _db_pools:
+            if name == READ_POOL:
+                # The replica is reached directly (no SSH tunnel)
+                config_fn = settings.get_db_read_config
+            else:
+                # Tunnel setup is blocking (paramiko); keep it off the event loop
+                await db_executor.run(_resolve_db_config)
+                config_fn = _resolve_db_config
+            _db_pools[name] = _build_pool(name, config_fn, size, timeout)
+            driver = settings.db_driver
+            if driver == "thread" and getattr(mysql.connector, "HAVE_CEXT", False):
+                # mysql-connector picks its C extension when installed (faster row decoding)
+                driver = "thread+cext"
+            logger.info(
+                f"[db] Pool {name} created (driver={driver}, size={size}, "
+                f"max_waiters={settings.db_pool_max_waiters}, timeout={timeout}s)"
+            )
+    return _db_pools[name]
+
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Frames that only say "a cursor needed a connection"
+_PLUMBING_FILES = {"database.py", "db_pool.py"}
+
+
+def _checkout_stack(limit: int = 6) -> List[str]:
+    """Application frames (handler, helper, dependency) leading to a checkout, innermost first."""
+    frames: List[str] = []
+    frame = sys._getframe(2)
+    depth = 0
+    while frame is not None and len(frames) < limit and depth < 64:
+        code = frame.f_code
+        path = code.co_filename
+        name = getattr(code, "co_qualname", code.co_name)
+        if (
+            path.startswith(_BACKEND_DIR)
+            and "site-packages" not in path
+            and os.path.basename(path) not in _PLUMBING_FILES
+            and not (path.endswith("dependencies.py") and ("Cursor" in name or name == "open_cursor"))
+        ):
+            frames.append(f"{os.path.relpath(path, _BACKEND_DIR)}:{frame.f_lineno} {name}")
+        frame = frame.f_back
+        depth += 1
+    return frames
+
+
+async def acquire_db_connection(name: str = PRIMARY_POOL, owner: Optional[str] = None, wait: bool = True):
+    """Check out a live connection (autocommit on), waiting in line if the pool is busy.
+    Raises PoolTimeoutError when none frees up within BACKEND_DB_POOL_TIMEOUT.
+    With wait=False, returns None at once instead when no connection is free.
+    `owner` (route or job name) and the caller's stack are kept for get_db_checkouts().
+    """
+    pool = await get_db_pool(name)
+    return await pool.acquire(owner, _checkout_stack(), wait)
+
+
+async def release_db_connection(conn, discard: bool = False) -> None:
+    """Return a connection to its pool; discard=True closes it instead of reusing it."""
+    for pool in _db_pools.values():
+        if pool.owns(conn):
+            await pool.release(conn, discard=discard)
+            return
+    # Pool already closed (shutdown): just close the connection
     try:
-        conn.autocommit = autocommit
-    except Exception as e:
-        logger.warning(f"[db] Failed to set autocommit={autocommit}: {e}")
+        await db_executor.run(conn.close)
+    except Exception:
+        pass
+
+
+def mark_connection(conn, state: str) -> None:
+    """Label what a checked-out connection is doing, for get_db_checkouts()."""
+    for pool in _db_pools.values():
+        if pool.set_state(conn, state):
+            return
+
+
+async def kill_query(conn) -> bool:
+    """Stop the statement running on a checked-out connection (KILL QUERY)."""
+    for pool in _db_pools.values():
+        if pool.owns(conn):
+            return await pool.cancel(conn)
+    return False
+
+
+async def close_db_pool() -> None:
+    """Close idle connections and drop all pools (shutdown, benchmarks)."""
+    global _db_pools_lock
+    pools = list(_db_pools.values())
+    _db_pools.clear()
+    _db_pools_lock = None
+    for pool in pools:
+        await pool.close_all()
+
+
+async def warm_db_pools() -> Dict[str, int]:
+    """Open the SSH tunnel (if any) and pre-open BACKEND_DB_POOL_WARM connections
+    in the interactive pool (and the replica pool when configured).
+    """
+    names = [PRIMARY_POOL] + ([READ_POOL] if has_read_pool() else [])
+    pools = [await get_db_pool(name) for name in names]
+    opened = await asyncio.gather(*(pool.warm(settings.db_pool_warm) for pool in pools))
+    return dict(zip(names, opened))
+
+
+def get_db_pool_stats() -> dict:
+    """Checkout-wait timings and in-use/idle gauges, per pool."""
+    if not _db_pools:
+        return {PRIMARY_POOL: {"name": PRIMARY_POOL, "size": settings.db_pool_size, "in_use": 0, "idle": 0, "created": 0}}
+    return {name: pool.stats() for name, pool in _db_pools.items()}
+
 
-    return conn
+def get_db_checkouts() -> List[dict]:
+    """Connections checked out right now across pools (owner, state, held time,
+    checkout stack), longest held first."""
+    items = [item for pool in _db_pools.values() for item in pool.checkouts()]
+    items.sort(key=lambda item: item["held_s"], reverse=True)
+    return items
@@ -0,0 +1,449 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger("db")
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out in time (or the wait queue is full)."""
+
+
+class _PooledEntry:
+    __slots__ = (
+        "conn", "created_at", "last_used", "owner", "stack", "checked_out_at", "state", "next_warning"
+    )
+
+    def __init__(self, conn: Any, now: float):
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        # Current checkout: who holds it, where it was taken, since when, doing what
+        self.owner: Optional[str] = None
+        self.stack: Optional[List[str]] = None
+        self.checked_out_at = now
+        self.state = "idle"
+        # Leak warnings go out at 1x, 2x, 4x... the threshold
+        self.next_warning = 1
+
+
+class AsyncConnectionPool:
+    """Awaitable connection pool shared by both DB drivers.
+
+    - Callers queue in FIFO order once every connection is checked out; a released
+      connection is handed straight to the oldest waiter (no barging).
+    - The wait queue is bounded (`max_waiters`) and each checkout waits at most
+      `acquire_timeout` seconds, then PoolTimeoutError is raised.
+    - Connections older than `max_lifetime` or idle longer than `idle_timeout`
+      are closed instead of being reused.
+    - Liveness is checked by idle age: only connections idle longer than
+      `ping_after` seconds are pinged on checkout.
+    - Each checkout records its owner (route), the call stack that took it and
+      its state; connections held longer than `leak_threshold` seconds are
+      logged as suspected leaks (see checkouts()).
+
+    `connect`, `close`, `ping` and `cancel` (stop the statement running on a
+    checked-out connection) are driver hooks (coroutines); the pool itself never
+    blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        connect: Callable[[], Awaitable[Any]],
+        close: Callable[[Any], Awaitable[None]],
+        ping: Optional[Callable[[Any], Awaitable[None]]] = None,
+        *,
+        size: int,
+        max_waiters: int,
+        acquire_timeout: float,
+        max_lifetime: float,
+        idle_timeout: float,
+        ping_after: float = 0.0,
+        cancel: Optional[Callable[[Any], Awaitable[None]]] = None,
+        leak_threshold: float = 0.0,
+    ):
+        self.name = name
+        self._connect = connect
+        self._close = close
+        self._ping = ping
+        self._cancel = cancel
+        self.size = max(1, int(size))
+        self.max_waiters = max(0, int(max_waiters))
+        self.acquire_timeout = float(acquire_timeout)
+        self.max_lifetime = float(max_lifetime)
+        self.idle_timeout = float(idle_timeout)
+        self.ping_after = float(ping_after)
+        self.leak_threshold = float(leak_threshold)
+
+        self._idle: Deque[_PooledEntry] = deque()
+        self._in_use: Dict[int, _PooledEntry] = {}
+        # Slots counted against `size` while in neither list: connections being
+        # opened, pinged or closed, and handoffs (entry or free slot) a waiter has
+        # not picked up yet
+        self._reserved = 0
+        self._opening = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._reaper: Optional[asyncio.Task] = None
+        self._leak_watch: Optional[asyncio.Task] = None
+        self._closed = False
+
+        # Metrics
+        self._created = 0
+        self._evicted = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._checkouts = 0
+        self._pings = 0
+        self._cancelled = 0
+        self._leak_warnings = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_samples: Deque[float] = deque(maxlen=1024)
+
+    # ------------------------------
+    # Checkout / release
+    # ------------------------------
+
+    def _total(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._reserved
+
+    def _expired(self, entry: _PooledEntry, now: float) -> bool:
+        if self.max_lifetime > 0 and now - entry.created_at > self.max_lifetime:
+            return True
+        if self.idle_timeout > 0 and now - entry.last_used > self.idle_timeout:
+            return True
+        return False
+
+    async def _discard(self, entry: _PooledEntry) -> None:
+        """Close a connection whose slot the caller reserved, then free the slot."""
+        self._evicted += 1
+        try:
+            await self._close(entry.conn)
+        except Exception as e:
+            logger.warning(f"[db] [{self.name}] Closing connection failed: {e}")
+        finally:
+            self._reserved -= 1
+            self._hand_over(None)
+
+    async def _take_idle(self) -> Optional[_PooledEntry]:
+        while self._idle:
+            # LIFO: reuse the warmest connection, let the others age out
+            entry = self._idle.pop()
+            # Still counted while it is checked or closed
+            self._reserved += 1
+            now = time.monotonic()
+            if self._expired(entry, now):
+                await self._discard(entry)
+                continue
+            if self._ping is not None and now - entry.last_used >= self.ping_after:
+                self._pings += 1
+                try:
+                    await self._ping(entry.conn)
+                except asyncio.CancelledError:
+                    # The caller went away mid-ping: the connection's state is unknown
+                    asyncio.get_running_loop().create_task(self._discard(entry))
+                    raise
+                except Exception as e:
+                    logger.warning(f"[db] [{self.name}] Dropping dead pooled connection: {e}")
+                    await self._discard(entry)
+                    continue
+            # The caller checks it out without awaiting in between
+            self._reserved -= 1
+            return entry
+        return None
+
+    async def _open(self, reserved: bool = False) -> _PooledEntry:
+        """Open a connection in a slot reserved now (or already, when `reserved`). On
+        failure the slot goes to the next waiter, which tries in turn."""
+        if not reserved:
+            self._reserved += 1
+        self._opening += 1
+        try:
+            conn = await self._connect()
+        except BaseException:
+            self._reserved -= 1
+            self._hand_over(None)
+            raise
+        finally:
+            self._opening -= 1
+        # The caller checks it out (or parks it) without awaiting in between
+        self._reserved -= 1
+        self._created += 1
+        return _PooledEntry(conn, time.monotonic())
+
+    async def acquire(
+        self, owner: Optional[str] = None, stack: Optional[List[str]] = None, wait: bool = True
+    ) -> Any:
+        """Check out a connection; `owner` and `stack` describe the caller for checkouts().
+        With wait=False, returns None instead of queueing when none is free right now."""
+        if self._closed:
+            raise RuntimeError(f"Pool {self.name} is closed")
+        self._ensure_reaper()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.acquire_timeout
+        entry: Optional[_PooledEntry] = None
+
+        while entry is None:
+            # Newcomers never overtake queued waiters
+            if not self._waiters:
+                entry = await self._take_idle()
+                if entry is not None:
+                    break
+                if self._total() < self.size:
+                    entry = await self._open()
+                    break
+            if not wait:
+                return None
+
+            if len(self._waiters) >= self.max_waiters:
+                self._rejected += 1
+                raise PoolTimeoutError(f"Pool {self.name} wait queue is full")
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._timeouts += 1
+                raise PoolTimeoutError(f"Timed out waiting for a DB connection (pool {self.name})")
+
+            fut = loop.create_future()
+            self._waiters.append(fut)
+            received = False
+            try:
+                # Result is a handed-over entry, or None when a slot was freed; either
+                # way the slot is reserved for us
+                entry = await asyncio.wait_for(asyncio.shield(fut), remaining)
+                received = True
+            except asyncio.TimeoutError:
+                self._timeouts += 1
+                raise PoolTimeoutError(f"Timed out waiting for a DB connection (pool {self.name})")
+            finally:
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+                if not fut.done():
+                    fut.cancel()
+                elif not received and not fut.cancelled():
+                    # Handed a connection or slot after we gave up: pass it on
+                    self._reserved -= 1
+                    self._hand_over(fut.result())
+            if entry is None:
+                # A slot was freed for us: open a connection in it
+                entry = await self._open(reserved=True)
+            else:
+                self._reserved -= 1
+
+        waited = loop.time() - started
+        self._checkouts += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._wait_samples.append(waited)
+        entry.owner = owner
+        entry.stack = stack
+        entry.checked_out_at = time.monotonic()
+        entry.state = "held"
+        entry.next_warning = 1
+        self._in_use[id(entry.conn)] = entry
+        return entry.conn
+
+    def _hand_over(self, entry: Optional[_PooledEntry]) -> None:
+        """Give an entry (or a free slot when entry is None) to the oldest live waiter,
+        reserving the slot until it picks it up; park the entry if nobody waits."""
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self._reserved += 1
+                fut.set_result(entry)
+                return
+        if entry is not None:
+            self._idle.append(entry)
+
+    def owns(self, conn: Any) -> bool:
+        return id(conn) in self._in_use
+
+    def set_state(self, conn: Any, state: str) -> bool:
+        """Label what a checked-out connection is doing (e.g. "executing"); False if not ours."""
+        entry = self._in_use.get(id(conn))
+        if entry is None:
+            return False
+        entry.state = state
+        return True
+
+    async def release(self, conn: Any, discard: bool = False) -> None:
+        entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            # Not ours (or already released): just close it
+            try:
+                await self._close(conn)
+            except Exception:
+                pass
+            return
+        now = time.monotonic()
+        entry.last_used = now
+        entry.state = "idle"
+        if entry.next_warning > 1:
+            logger.info(
+                f"[db] [{self.name}] Connection held by {entry.owner or 'unknown'} released "
+                f"after {now - entry.checked_out_at:.1f}s"
+            )
+        if discard or self._closed or self._expired(entry, now):
+            self._reserved += 1
+            await self._discard(entry)
+            return
+        self._hand_over(entry)
+
+    # ------------------------------
+    # Maintenance
+    # ------------------------------
+
+    async def warm(self, count: int) -> int:
+        """Open up to `count` connections concurrently and park them idle."""
+        count = min(count, self.size - self._total())
+        if count <= 0:
+            return 0
+        # Reserved up front so checkouts meanwhile cannot push the pool past its size
+        self._reserved += count
+
+        async def _warm_one() -> None:
+            self._hand_over(await self._open(reserved=True))
+
+        results = await asyncio.gather(*(_warm_one() for _ in range(count)), return_exceptions=True)
+        opened = 0
+        for res in results:
+            if isinstance(res, BaseException):
+                logger.warning(f"[db] [{self.name}] Warm-up connection failed: {res}")
+            else:
+                opened += 1
+        if opened == 0 and results:
+            raise results[0]
+        return opened
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is None and self.idle_timeout > 0:
+            self._reaper = asyncio.get_running_loop().create_task(self._reap_loop())
+        if self._leak_watch is None and self.leak_threshold > 0:
+            self._leak_watch = asyncio.get_running_loop().create_task(self._leak_loop())
+
+    async def _reap_loop(self) -> None:
+        interval = max(1.0, self.idle_timeout / 2)
+        while not self._closed:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            keep: Deque[_PooledEntry] = deque()
+            expired = []
+            while self._idle:
+                entry = self._idle.popleft()
+                (expired if self._expired(entry, now) else keep).append(entry)
+            self._idle.extend(keep)
+            self._reserved += len(expired)
+            for entry in expired:
+                await self._discard(entry)
+
+    async def _leak_loop(self) -> None:
+        interval = max(1.0, self.leak_threshold / 4)
+        while not self._closed:
+            await asyncio.sleep(interval)
+            self.check_leaks()
+
+    def check_leaks(self) -> int:
+        """Log checkouts held past leak_threshold; returns how many there are."""
+        if self.leak_threshold <= 0:
+            return 0
+        now = time.monotonic()
+        held_too_long = 0
+        for entry in list(self._in_use.values()):
+            held = now - entry.checked_out_at
+            if held < self.leak_threshold:
+                continue
+            held_too_long += 1
+            if held < self.leak_threshold * entry.next_warning:
+                continue
+            # Back off (1x, 2x, 4x... the threshold) so a stuck checkout does not flood the log
+            while held >= self.leak_threshold * entry.next_warning:
+                entry.next_warning *= 2
+            self._leak_warnings += 1
+            where = " <- ".join(entry.stack) if entry.stack else "unknown"
+            logger.warning(
+                f"[db] [{self.name}] Possible connection leak: held {held:.0f}s by "
+                f"{entry.owner or 'unknown'} (state={entry.state}), checked out at {where}"
+            )
+        return held_too_long
+
+    def checkouts(self) -> List[dict]:
+        """Connections currently checked out, longest held first."""
+        now = time.monotonic()
+        items = []
+        for entry in self._in_use.values():
+            held = now - entry.checked_out_at
+            items.append({
+                "pool": self.name,
+                "owner": entry.owner,
+                "state": entry.state,
+                "held_s": round(held, 3),
+                "suspected_leak": self.leak_threshold > 0 and held >= self.leak_threshold,
+                "stack": list(entry.stack or ()),
+            })
+        items.sort(key=lambda item: item["held_s"], reverse=True)
+        return items
+
+    async def cancel(self, conn: Any) -> bool:
+        """Stop the statement running on a checked-out connection; False if unsupported or failed."""
+        if self._cancel is None or not self.owns(conn):
+            return False
+        try:
+            await self._cancel(conn)
+        except Exception as e:
+            logger.warning(f"[db] Pool {self.name}: failed to cancel running statement: {e}")
+            return False
+        self._cancelled += 1
+        return True
+
+    async def close_all(self) -> None:
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._leak_watch is not None:
+            self._leak_watch.cancel()
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.cancel()
+        while self._idle:
+            entry = self._idle.pop()
+            self._reserved += 1
+            await self._discard(entry)
+
+    def stats(self) -> dict:
+        samples = sorted(self._wait_samples)
+
+        def _pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+        now = time.monotonic()
+        held_max = max((now - e.checked_out_at for e in self._in_use.values()), default=0.0)
+
+        return {
+            "name": self.name,
+            "size": self.size,
+            "in_use": len(self._in_use),
+            "idle": len(self._idle),
+            "opening": self._opening,
+            "reserved": self._reserved,
+            "waiting": len(self._waiters),
+            "max_waiters": self.max_waiters,
+            "created": self._created,
+            "evicted": self._evicted,
+            "timeouts": self._timeouts,
+            "rejected": self._rejected,
+            "checkouts": self._checkouts,
+            "pings": self._pings,
+            "cancelled": self._cancelled,
+            "held_max_s": round(held_max, 3),
+            "leak_warnings": self._leak_warnings,
+            "wait_avg_ms": round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            "wait_p50_ms": round(_pct(0.50) * 1000, 3),
+            "wait_p99_ms": round(_pct(0.99) * 1000, 3),
+            "wait_max_ms": round(self._wait_max * 1000, 3),
+        }
@@ -1,11 +1,36 @@
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt, ExpiredSignatureError
-from typing import Optional
-import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, Union
+from contextlib import asynccontextmanager
 import asyncio
+import functools
+import logging
+import re
+import time
 from settings import settings
-from database import get_db_connection
+from executors import db_executor
+from stmt_cache import statement_cache_for
+from identity_map import RequestIdentityMap
+from sql_stats import StatementSample
+from query_budget import check_budget
+from rows import make_records
+from revocations import is_token_revoked
+from principals import load_principal
+from role_cache import load_user_roles
+from token_generations import token_generation_valid, token_claims
+from database import (
+    aiomysql,
+    acquire_db_connection,
+    release_db_connection,
+    kill_query,
+    mark_connection,
+    has_read_pool,
+    PoolTimeoutError,
+    PRIMARY_POOL,
+    ADMIN_POOL,
+    READ_POOL,
+)
 
 logger = logging.getLogger("auth")
 
@@ -13,7 +38,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 
 class AsyncCursor:
-    """Async wrapper around mysql-connector cursor and connection using threadpool.
+    """Async wrapper around mysql-connector cursor and connection using the DB executor.
     Provides awaitable execute/fetch methods and commit/close helpers.
     """
 
@@ -21,82 +46,870 @@ class AsyncCursor:
         # dictionary=True for convenient dict rows across the app
         self._conn = conn
         self._cursor = conn.cursor(dictionary=True)
+        # Tuple cursor for fetch_records / stream(records=True), opened on first use
+        self._tuples = None
+        # Hot parameterized statements run as cached server-side prepared statements
+        self._stmts = statement_cache_for(conn)
+        # Cursor holding the last result (plain or prepared)
+        self._active = self._cursor
+        # Nesting level of transaction() blocks (0 = none open)
+        self._tx_depth = 0
+        # Last call handed to the driver; may outlive a cancelled/timed out caller
+        self._inflight: Optional[asyncio.Future] = None
+        # Calling route for SQL stats, and the statement whose result is still being fetched
+        self.route: Optional[str] = None
+        self._sample: Optional[StatementSample] = None
+
+    def _submit(self, fn: Callable, *args):
+        return db_executor.run(fn, *args)
+
+    async def _track(self, fn: Callable, *args):
+        """Run a driver call; shielded so a cancelled caller leaves it tracked for
+        _settle() instead of letting another statement start on the connection."""
+        await self._settle()
+        self._inflight = asyncio.ensure_future(self._submit(fn, *args))
+        mark_connection(self._conn, "executing")
+        self._inflight.add_done_callback(self._call_done)
+        return await asyncio.shield(self._inflight)
+
+    def _call_done(self, _inflight) -> None:
+        mark_connection(self._conn, "in_transaction" if self._tx_depth else "held")
+
+    async def _settle(self):
+        """Stop (KILL QUERY) and wait for a call abandoned by its caller."""
+        inflight = self._inflight
+        if inflight is None or inflight.done():
+            return
+        logger.info("[auth] Cancelling abandoned DB statement")
+        await kill_query(self._conn)
+        await asyncio.wait([inflight])
+        if not inflight.cancelled():
+            # Expected: "Query execution was interrupted"
+            inflight.exception()
+
+    def _start_sample(self, sql: str, params: Any) -> StatementSample:
+        """Time a statement into sql_stats; closes the previous one first."""
+        self._end_sample()
+        check_budget()
+        return StatementSample(sql, params, self.route)
+
+    def _end_sample(self) -> None:
+        if self._sample is not None:
+            self._sample.finish()
+            self._sample = None
+
+    def _after_execute(self, sample: StatementSample) -> None:
+        # Result sets stay open so fetchone/fetchall add their rows and time;
+        # other statements are done (rows = affected rows)
+        if getattr(self._active, "description", None):
+            self._sample = sample
+        else:
+            sample.finish(self.rowcount)
+
+    async def _fetched(self, call: Callable, *args):
+        """fetchone/fetchall, counted towards the statement whose result they read."""
+        sample = self._sample
+        if sample is None:
+            return await self._track(call, *args)
+        result = await sample.timed(self._track(call, *args))
+        if isinstance(result, list):
+            sample.rows += len(result)
+            self._end_sample()
+        elif result is None:
+            self._end_sample()
+        else:
+            sample.rows += 1
+        return result
+
+    def _execute_sync(self, sql: str, params: Optional[tuple]):
+        cur = self._stmts.execute(sql, params) if self._stmts is not None and params else None
+        if cur is None:
+            cur = self._cursor
+            cur.execute(sql, params)
+        self._active = cur
 
     async def execute(self, sql: str, params: Optional[tuple] = None):
-        return await asyncio.to_thread(self._cursor.execute, sql, params)
+        sample = self._start_sample(sql, params)
+        result = await sample.timed(self._track(self._execute_sync, sql, params))
+        self._after_execute(sample)
+        return result
 
     async def executemany(self, sql: str, seq_params: list):
-        return await asyncio.to_thread(self._cursor.executemany, sql, seq_params)
+        def _run():
+            self._active = self._cursor
+            return self._cursor.executemany(sql, seq_params)
+
+        sample = self._start_sample(sql, seq_params)
+        result = await sample.timed(self._track(_run))
+        sample.finish(self.rowcount)
+        return result
 
     async def fetchone(self):
-        return await asyncio.to_thread(self._cursor.fetchone)
+        return await self._fetched(self._active.fetchone)
 
     async def fetchall(self):
-        return await asyncio.to_thread(self._cursor.fetchall)
+        return await self._fetched(self._active.fetchall)
+
+    async def fetch_one(self, sql: str, params: Optional[tuple] = None):
+        """execute + first row in a single executor hop."""
+        def _run():
+            self._execute_sync(sql, params)
+            # Drain the result so the connection is ready for the next statement
+            rows = self._active.fetchall()
+            return rows[0] if rows else None
+
+        sample = self._start_sample(sql, params)
+        row = await sample.timed(self._track(_run))
+        sample.finish(1 if row else 0)
+        return row
+
+    async def fetch_all(self, sql: str, params: Optional[tuple] = None):
+        """execute + fetchall in a single executor hop."""
+        def _run():
+            self._execute_sync(sql, params)
+            return self._active.fetchall()
+
+        sample = self._start_sample(sql, params)
+        rows = await sample.timed(self._track(_run))
+        sample.finish(len(rows or ()))
+        return rows
+
+    def _tuple_cursor(self):
+        if self._tuples is None:
+            self._tuples = self._conn.cursor()
+        self._active = self._tuples
+        return self._tuples
+
+    async def fetch_records(self, sql: str, params: Optional[tuple] = None) -> list:
+        """Like fetch_all, but rows are compact records (rows.record_type) built from the
+        driver's tuples instead of one dict per row; for large read-only results."""
+        def _run():
+            cur = self._tuple_cursor()
+            cur.execute(sql, params)
+            return make_records(cur.column_names, cur.fetchall())
+
+        sample = self._start_sample(sql, params)
+        rows = await sample.timed(self._track(_run))
+        sample.finish(len(rows))
+        return rows
+
+    async def execute_many_and_commit(self, sql: str, seq_params: list):
+        """executemany + commit in a single executor hop; returns rowcount.
+        Inside transaction() the commit is deferred to the block, like commit()."""
+        def _run():
+            self._active = self._cursor
+            self._cursor.executemany(sql, seq_params)
+            if not self._tx_depth:
+                self._conn.commit()
+            return self._cursor.rowcount
+
+        sample = self._start_sample(sql, seq_params)
+        count = await sample.timed(self._track(_run))
+        sample.finish(count)
+        return count
+
+    async def stream(
+        self, sql: str, params: Optional[tuple] = None, batch_size: int = 500, records: bool = False
+    ) -> AsyncIterator[Any]:
+        """Iterate over an unbuffered result, batch_size rows per executor hop, so the
+        whole result set is never held in memory. The connection is busy until the
+        iteration ends; stopping early discards the rest of the result.
+        records=True yields compact records (see fetch_records) instead of dicts.
+        """
+        # Plain (unbuffered) cursor: prepared statements would buffer the result
+        if records:
+            cur = self._tuple_cursor()
+        else:
+            cur = self._active = self._cursor
+
+        def _batch():
+            rows = cur.fetchmany(batch_size)
+            return make_records(cur.column_names, rows) if records else rows
+
+        def _start():
+            cur.execute(sql, params)
+            return _batch()
+
+        def _discard_rest():
+            while cur.fetchmany(batch_size):
+                pass
+
+        # Timed over the driver calls only, not the time the consumer holds the rows
+        sample = self._start_sample(sql, params)
+        count = 0
+        rows = await sample.timed(self._track(_start))
+        try:
+            while rows:
+                count += len(rows)
+                for row in rows:
+                    yield row
+                rows = await sample.timed(self._track(_batch))
+        finally:
+            sample.finish(count)
+            if getattr(self._conn, "unread_result", False):
+                await self._track(_discard_rest)
 
     @property
     def rowcount(self) -> int:
-        return getattr(self._cursor, "rowcount", 0)
+        return getattr(self._active, "rowcount", 0)
 
     @property
     def lastrowid(self):
-        return getattr(self._cursor, "lastrowid", None)
+        return getattr(self._active, "lastrowid", None)
 
     async def commit(self):
-        return await asyncio.to_thread(self._conn.commit)
+        # Inside transaction() the block commits once on exit
+        if self._tx_depth:
+            return
+        return await self._track(self._conn.commit)
 
     async def rollback(self):
-        return await asyncio.to_thread(self._conn.rollback)
+        return await self._track(self._conn.rollback)
+
+    async def set_autocommit(self, value: bool):
+        def _set():
+            self._conn.autocommit = value
+
+        return await self._track(_set)
+
+    async def _begin(self):
+        def _run():
+            # With autocommit off a transaction is already implicitly open
+            if self._conn.autocommit:
+                self._conn.start_transaction()
+
+        return await self._track(_run)
+
+    async def _finish_transaction(self, commit: bool):
+        return await self._track(self._conn.commit if commit else self._conn.rollback)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Unit of work: statements in the block are committed once on exit, or
+        rolled back if it raises. commit() calls inside the block are deferred.
+
+        Nested blocks use savepoints, so an inner failure that the caller
+        catches only undoes the inner block's writes.
+        """
+        depth = self._tx_depth
+        if depth == 0:
+            await self._begin()
+        else:
+            await self.execute(f"SAVEPOINT kassa_sp_{depth}")
+        self._tx_depth = depth + 1
+        mark_connection(self._conn, "in_transaction")
+        try:
+            yield self
+        except BaseException:
+            self._tx_depth = depth
+            try:
+                if depth == 0:
+                    await self._finish_transaction(False)
+                else:
+                    await self.execute(f"ROLLBACK TO SAVEPOINT kassa_sp_{depth}")
+            except Exception as e:
+                logger.warning(f"[auth] Transaction rollback failed: {e}")
+            raise
+        self._tx_depth = depth
+        if depth == 0:
+            await self._finish_transaction(True)
+        else:
+            await self.execute(f"RELEASE SAVEPOINT kassa_sp_{depth}")
 
     async def close(self):
-        # Close cursor then connection, both in threadpool
+        # Idempotent: handlers sometimes close explicitly before get_cursor does
+        if getattr(self, "_closed", False):
+            return
+        self._closed = True
+        self._end_sample()
+        await self._settle()
+
+        def _finish() -> bool:
+            # Pooled connections must go back clean and in autocommit mode
+            try:
+                if getattr(self._conn, "unread_result", False):
+                    # Drain through the cursor that owns the result (prepared rows are binary)
+                    self._active.fetchall()
+                self._cursor.close()
+                if self._tuples is not None:
+                    self._tuples.close()
+                if not self._conn.autocommit or self._conn.in_transaction:
+                    self._conn.rollback()
+                    self._conn.autocommit = True
+                return True
+            except Exception as e:
+                logger.warning(f"[auth] Failed to reset DB connection: {e}")
+                return False
+
+        reusable = await db_executor.run(_finish)
+        await release_db_connection(self._conn, discard=not reusable)
+
+
+class NativeAsyncCursor(AsyncCursor):
+    """AsyncCursor backed by aiomysql (BACKEND_DB_DRIVER=aiomysql).
+    Same interface as AsyncCursor, but every call is awaited on the event loop
+    instead of hopping to the threadpool.
+    """
+
+    def __init__(self, conn, cursor):
+        # No server-side prepared statements in aiomysql/PyMySQL
+        self._conn = conn
+        self._cursor = cursor
+        self._active = cursor
+        self._tx_depth = 0
+        self._inflight = None
+        self.route = None
+        self._sample = None
+
+    def _submit(self, fn: Callable, *args):
+        return fn(*args)
+
+    async def execute(self, sql: str, params: Optional[tuple] = None):
+        sample = self._start_sample(sql, params)
+        result = await sample.timed(self._track(self._cursor.execute, sql, params))
+        self._after_execute(sample)
+        return result
+
+    async def executemany(self, sql: str, seq_params: list):
+        sample = self._start_sample(sql, seq_params)
+        result = await sample.timed(self._track(self._cursor.executemany, sql, seq_params))
+        sample.finish(self.rowcount)
+        return result
+
+    async def fetchone(self):
+        return await self._fetched(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._fetched(self._cursor.fetchall)
+
+    async def fetch_one(self, sql: str, params: Optional[tuple] = None):
+        async def _run():
+            await self._cursor.execute(sql, params)
+            rows = await self._cursor.fetchall()
+            return rows[0] if rows else None
+
+        sample = self._start_sample(sql, params)
+        row = await sample.timed(self._track(_run))
+        sample.finish(1 if row else 0)
+        return row
+
+    async def fetch_all(self, sql: str, params: Optional[tuple] = None):
+        async def _run():
+            await self._cursor.execute(sql, params)
+            return await self._cursor.fetchall()
+
+        sample = self._start_sample(sql, params)
+        rows = await sample.timed(self._track(_run))
+        sample.finish(len(rows or ()))
+        return rows
+
+    async def fetch_records(self, sql: str, params: Optional[tuple] = None) -> list:
+        async def _run():
+            # Default (tuple) cursor; buffered, so closing it right away is fine
+            cur = await self._conn.cursor()
+            try:
+                await cur.execute(sql, params)
+                rows = await cur.fetchall()
+                return make_records([d[0] for d in cur.description or ()], rows)
+            finally:
+                await cur.close()
+
+        sample = self._start_sample(sql, params)
+        rows = await sample.timed(self._track(_run))
+        sample.finish(len(rows))
+        return rows
+
+    async def execute_many_and_commit(self, sql: str, seq_params: list):
+        async def _run():
+            await self._cursor.executemany(sql, seq_params)
+            if not self._tx_depth:
+                await self._conn.commit()
+            return self._cursor.rowcount
+
+        sample = self._start_sample(sql, seq_params)
+        count = await sample.timed(self._track(_run))
+        sample.finish(count)
+        return count
+
+    async def stream(
+        self, sql: str, params: Optional[tuple] = None, batch_size: int = 500, records: bool = False
+    ) -> AsyncIterator[Any]:
+        # Server-side (unbuffered) cursor; closing it discards unread rows
+        cur = await self._conn.cursor(aiomysql.SSCursor if records else aiomysql.SSDictCursor)
+        sample = self._start_sample(sql, params)
+        count = 0
         try:
-            await asyncio.to_thread(self._cursor.close)
+            await sample.timed(self._track(cur.execute, sql, params))
+            while True:
+                rows = await sample.timed(self._track(cur.fetchmany, batch_size))
+                if not rows:
+                    break
+                if records:
+                    rows = make_records([d[0] for d in cur.description], rows)
+                count += len(rows)
+                for row in rows:
+                    yield row
         finally:
+            sample.finish(count)
+            await self._track(cur.close)
+
+    async def commit(self):
+        if self._tx_depth:
+            return
+        return await self._track(self._conn.commit)
+
+    async def rollback(self):
+        return await self._track(self._conn.rollback)
+
+    async def set_autocommit(self, value: bool):
+        return await self._track(self._conn.autocommit, value)
+
+    async def _begin(self):
+        if self._conn.get_autocommit():
+            await self._track(self._conn.begin)
+
+    async def _finish_transaction(self, commit: bool):
+        return await self._track(self._conn.commit if commit else self._conn.rollback)
+
+    async def close(self):
+        if getattr(self, "_closed", False):
+            return
+        self._closed = True
+        self._end_sample()
+        reusable = True
+        try:
+            await self._settle()
+            await self._cursor.close()
+            # Pooled connections must go back in autocommit mode
+            if not self._conn.closed and not self._conn.get_autocommit():
+                await self._conn.rollback()
+                await self._conn.autocommit(True)
+        except Exception as e:
+            logger.warning(f"[auth] Failed to reset DB connection: {e}")
+            reusable = False
+        await release_db_connection(self._conn, discard=not reusable or self._conn.closed)
+
+
+async def open_cursor(
+    pool: str = PRIMARY_POOL, route: Optional[str] = None, wait: bool = True
+) -> Optional[AsyncCursor]:
+    """Open an AsyncCursor on the configured driver (BACKEND_DB_DRIVER).
+    Waits for a connection from the named pool; callers own the cursor and must close() it.
+    `route` labels its statements in the SQL stats (defaults to the pool name).
+    With wait=False, returns None when the pool has no connection free right now.
+    """
+    conn = await acquire_db_connection(pool, route or pool, wait)
+    if conn is None:
+        return None
+    try:
+        if settings.db_driver == "aiomysql":
+            cursor = NativeAsyncCursor(conn, await conn.cursor(aiomysql.DictCursor))
+        else:
+            cursor = AsyncCursor(conn)
+        cursor.route = route or pool
+        return cursor
+    except Exception:
+        await release_db_connection(conn, discard=True)
+        raise
+
+
+_END = object()
+_SELECT_RE = re.compile(r"^(\s*SELECT)\b", re.I)
+# ER_QUERY_TIMEOUT: a SELECT ran past its MAX_EXECUTION_TIME hint
+_ER_QUERY_TIMEOUT = 3024
+
+
+def _db_errno(error: Exception) -> Optional[int]:
+    """MySQL error number of a driver error (mysql-connector: errno, aiomysql: args[0])."""
+    errno = getattr(error, "errno", None)
+    if errno is None and error.args and isinstance(error.args[0], int):
+        errno = error.args[0]
+    return errno
+
+
+@functools.lru_cache(maxsize=1024)
+def _with_time_limit(sql: str, budget_ms: int) -> str:
+    """Add a MAX_EXECUTION_TIME optimizer hint to a SELECT; the server aborts it past the budget.
+    The route's whole budget (not what is left of it) keeps the text stable for the statement cache.
+    """
+    if "MAX_EXECUTION_TIME" in sql:
+        return sql
+    return _SELECT_RE.sub(lambda m: f"{m.group(1)} /*+ MAX_EXECUTION_TIME({budget_ms}) */", sql, count=1)
+
+
+class LazyCursor:
+    """AsyncCursor facade that checks out a pooled connection on first use.
+    Requests rejected before touching the DB (401/403, validation) never take a
+    pool slot. Same interface as AsyncCursor.
+
+    `pool` is a pool name, or a callable resolved at checkout time (so routing
+    can depend on what the auth dependency found out about the request).
+    `identity` is the request's identity map; statements run here invalidate it.
+    `deadline` is (monotonic deadline, budget in ms) for the request's DB work:
+    SELECTs get a MAX_EXECUTION_TIME hint, and a call still running at the
+    deadline fails with 504 while its statement is killed.
+    `route` ("METHOD /path") labels the request's statements in the SQL stats.
+    """
+
+    def __init__(
+        self,
+        pool: Union[str, Callable[[], str]] = PRIMARY_POOL,
+        identity: Optional[RequestIdentityMap] = None,
+        deadline: Optional[Tuple[float, int]] = None,
+        route: Optional[str] = None,
+    ):
+        self._pool = pool
+        self.identity = identity
+        self._deadline = deadline
+        self.route = route
+        self._inner: Optional[AsyncCursor] = None
+        # Pool the connection actually came from (after replica fallback)
+        self._pool_name: Optional[str] = None
+        self._autocommit = True
+        self._closed = False
+
+    @property
+    def acquired(self) -> bool:
+        return self._inner is not None
+
+    async def _cursor_ready(self) -> AsyncCursor:
+        if self._inner is None:
+            if self._closed:
+                raise RuntimeError("Cursor is closed")
+            pool = self._pool() if callable(self._pool) else self._pool
             try:
-                await asyncio.to_thread(self._conn.close)
-            except Exception as e:
-                logger.warning(f"[auth] Failed to close DB connection: {e}")
+                if pool == READ_POOL:
+                    try:
+                        self._inner = await open_cursor(READ_POOL, self.route)
+                    except Exception as e:
+                        # Replica busy or down: serve the read from the primary
+                        logger.warning(f"[auth] Read pool unavailable, using primary: {e}")
+                        pool = PRIMARY_POOL
+                if self._inner is None:
+                    self._inner = await open_cursor(pool, self.route)
+                self._pool_name = pool
+            except PoolTimeoutError as e:
+                # Pool saturated: ask the client to retry instead of failing with a 500
+                logger.warning(f"[auth] {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Database busy, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            if not self._autocommit:
+                await self._inner.set_autocommit(False)
+        return self._inner
+
+    def _note(self, sql: str) -> None:
+        if self.identity is not None:
+            self.identity.note_statement(sql)
+
+    def _limit(self, sql: str) -> str:
+        if self._deadline is None or not isinstance(sql, str):
+            return sql
+        return _with_time_limit(sql, self._deadline[1])
+
+    async def _bounded(self, call: Callable):
+        inner = await self._cursor_ready()
+        if self._deadline is None:
+            return await call(inner)
+        remaining = self._deadline[0] - time.monotonic()
+        try:
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(call(inner), remaining)
+        except asyncio.TimeoutError:
+            # The abandoned statement is killed before the connection is reused/released
+            raise self._deadline_exceeded()
+        except Exception as e:
+            # The server gave up on a SELECT first (MAX_EXECUTION_TIME hint)
+            if _db_errno(e) == _ER_QUERY_TIMEOUT:
+                raise self._deadline_exceeded() from e
+            raise
+
+    def _deadline_exceeded(self) -> HTTPException:
+        logger.warning(f"[auth] DB deadline of {self._deadline[1]} ms exceeded")
+        return HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Database query timed out",
+        )
 
+    async def execute(self, sql: str, params: Optional[tuple] = None):
+        self._note(sql)
+        sql = self._limit(sql)
+        return await self._bounded(lambda c: c.execute(sql, params))
 
-async def get_cursor():
-    """Async dependency returning an AsyncCursor. Ensures liveness and cleanup."""
-    conn = get_db_connection()
-    # Ensure the connection is alive; reconnect if needed
+    async def executemany(self, sql: str, seq_params: list):
+        self._note(sql)
+        return await self._bounded(lambda c: c.executemany(sql, seq_params))
+
+    async def fetchone(self):
+        return await self._bounded(lambda c: c.fetchone())
+
+    async def fetchall(self):
+        return await self._bounded(lambda c: c.fetchall())
+
+    async def fetch_one(self, sql: str, params: Optional[tuple] = None):
+        sql = self._limit(sql)
+        return await self._bounded(lambda c: c.fetch_one(sql, params))
+
+    async def fetch_all(self, sql: str, params: Optional[tuple] = None):
+        sql = self._limit(sql)
+        return await self._bounded(lambda c: c.fetch_all(sql, params))
+
+    async def fetch_records(self, sql: str, params: Optional[tuple] = None) -> list:
+        sql = self._limit(sql)
+        return await self._bounded(lambda c: c.fetch_records(sql, params))
+
+    async def execute_many_and_commit(self, sql: str, seq_params: list):
+        self._note(sql)
+        return await self._bounded(lambda c: c.execute_many_and_commit(sql, seq_params))
+
+    async def stream(
+        self, sql: str, params: Optional[tuple] = None, batch_size: int = 500, records: bool = False
+    ) -> AsyncIterator[Any]:
+        """See AsyncCursor.stream. The request deadline bounds getting the first rows;
+        after that the iteration is paced by the consumer (e.g. a slow client).
+        """
+        rows = (await self._cursor_ready()).stream(sql, params, batch_size, records)
+        try:
+            first = await self._bounded(lambda c: anext(rows, _END))
+            if first is _END:
+                return
+            yield first
+            async for row in rows:
+                yield row
+        finally:
+            await rows.aclose()
+
+    @property
+    def rowcount(self) -> int:
+        return self._inner.rowcount if self._inner is not None else 0
+
+    @property
+    def lastrowid(self):
+        return self._inner.lastrowid if self._inner is not None else None
+
+    async def commit(self):
+        # Nothing executed yet means nothing to commit
+        if self._inner is not None:
+            return await self._inner.commit()
+
+    async def rollback(self):
+        if self.identity is not None:
+            self.identity.invalidate()
+        if self._inner is not None:
+            return await self._inner.rollback()
+
+    async def set_autocommit(self, value: bool):
+        self._autocommit = value
+        if self._inner is not None:
+            return await self._inner.set_autocommit(value)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """See AsyncCursor.transaction; checks out the connection on entry."""
+        inner = await self._cursor_ready()
+        try:
+            async with inner.transaction():
+                yield self
+        except BaseException:
+            # Rolled back: cached rows may hold writes that never happened
+            if self.identity is not None:
+                self.identity.invalidate()
+            raise
+
+    @property
+    def in_transaction(self) -> bool:
+        return not self._autocommit or (self._inner is not None and self._inner._tx_depth > 0)
+
+    async def spare(self) -> Optional["LazyCursor"]:
+        """Second cursor for the same request (same pool, identity map, deadline and route)
+        on a connection that is free right now, or None if the pool has none to spare.
+        The caller closes it. Autocommit only: it does not see this cursor's transaction.
+        """
+        await self._cursor_ready()
+        inner = await open_cursor(self._pool_name, self.route, wait=False)
+        if inner is None:
+            return None
+        cursor = LazyCursor(self._pool_name, self.identity, self._deadline, self.route)
+        cursor._inner = inner
+        return cursor
+
+    async def close(self):
+        self._closed = True
+        if self._inner is not None:
+            await self._inner.close()
+
+
+async def gather_queries(cursor, *queries: Callable[[Any], Awaitable[Any]]) -> list:
+    """Run independent reads concurrently and return their results in order. Each query
+    is a callable taking a cursor, e.g.
+    `tx, roles = await gather_queries(cursor, lambda c: c.fetch_one(...), lambda c: get_user_roles(c, uid))`.
+
+    The request cursor runs the first query; the others get extra connections from the
+    same pool, at most BACKEND_DB_FANOUT_MAX_CONNECTIONS per request in total. Only
+    connections free right now are used: when the pool is busy the queries share the
+    connections already held instead of queueing for more. Inside a transaction they
+    run one after another on the request cursor, the only one that sees its writes.
+    If a query fails, the others are cancelled (their statements killed) and its error
+    is raised.
+    """
+    limit = settings.db_fanout_max_connections
+    if len(queries) < 2 or limit < 2 or not isinstance(cursor, LazyCursor) or cursor.in_transaction:
+        return [await query(cursor) for query in queries]
+
+    results: list = [None] * len(queries)
+    pending = iter(enumerate(queries))
+    cursors = [cursor]
     try:
-        conn.ping(reconnect=True, attempts=3, delay=1)
-    except Exception as e:
-        logger.warning(f"[auth] DB ping failed, getting fresh connection: {e}")
-        conn = get_db_connection()
-    async_cursor = AsyncCursor(conn)
+        for _ in range(min(limit, len(queries)) - 1):
+            spare = await cursor.spare()
+            if spare is None:
+                break
+            cursors.append(spare)
+
+        async def _worker(c) -> None:
+            # Workers share one iterator: each takes the next query when it is free
+            for i, query in pending:
+                results[i] = await query(c)
+
+        tasks = [asyncio.ensure_future(_worker(c)) for c in cursors]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        for task in tasks:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+    finally:
+        for spare in cursors[1:]:
+            await spare.close()
+    return results
+
+
+def request_identity(request: Request) -> RequestIdentityMap:
+    """The request's identity map, shared by all cursors of the request."""
+    identity = getattr(request.state, "identity", None)
+    if identity is None:
+        identity = request.state.identity = RequestIdentityMap()
+    return identity
+
+
+def request_route(request: Request) -> str:
+    """"METHOD /route/{template}" of the request, for the SQL stats."""
+    route = request.scope.get("route")
+    return f"{request.method} {getattr(route, 'path', None) or request.url.path}"
+
+
+def set_db_deadline(request: Request, seconds: float) -> None:
+    request.state.db_deadline = (
+        (time.monotonic() + seconds, int(seconds * 1000)) if seconds > 0 else None
+    )
+
+
+def request_deadline(request: Request) -> Optional[Tuple[float, int]]:
+    """(monotonic deadline, budget in ms) for the request's DB work, None if unbounded.
+    Defaults to BACKEND_DB_REQUEST_TIMEOUT from the first cursor of the request.
+    """
+    if not hasattr(request.state, "db_deadline"):
+        set_db_deadline(request, settings.db_request_timeout)
+    return request.state.db_deadline
+
+
+def db_deadline(seconds: float):
+    """Route dependency giving the request's DB work its own budget, e.g.
+    `dependencies=[Depends(db_deadline(10))]`. Route dependencies run before the
+    cursor dependencies, so every cursor of the request picks it up.
+    """
+    async def _set_deadline(request: Request):
+        set_db_deadline(request, seconds)
+
+    return _set_deadline
+
+
+async def get_cursor(request: Request):
+    """Async dependency returning a LazyCursor; the connection is only checked out
+    on the first query and always released afterwards.
+    """
+    async_cursor = LazyCursor(
+        identity=request_identity(request), deadline=request_deadline(request), route=request_route(request)
+    )
     try:
         yield async_cursor
     finally:
         await async_cursor.close()
 
 
-def ensure_revoked_tokens_table(cursor):
+async def get_admin_cursor(request: Request):
+    """Async dependency like get_cursor, on the admin/reporting partition
+    (BACKEND_DB_ADMIN_POOL_*), for inspector and bulk admin routes.
+    """
+    async_cursor = LazyCursor(ADMIN_POOL, request_identity(request), request_deadline(request), request_route(request))
     try:
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS revoked_tokens (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                jti VARCHAR(36),
-                token TEXT,
-                expires DATETIME,
-                INDEX idx_jti (jti)
-            ) ENGINE=InnoDB;
-            """
-        )
-    except Exception:
-        logger.exception("[auth] Failed to ensure revoked_tokens table exists")
+        yield async_cursor
+    finally:
+        await async_cursor.close()
+
+
+# Read-your-writes: user id -> monotonic time until which their reads stay on the primary.
+# Per process; with several workers the replica lag window is the only guarantee.
+_recent_writers: Dict[int, float] = {}
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def mark_user_wrote(user_id: Optional[int]) -> None:
+    if user_id is None or settings.db_read_sticky_seconds <= 0 or not has_read_pool():
+        return
+    now = time.monotonic()
+    _recent_writers[user_id] = now + settings.db_read_sticky_seconds
+    if len(_recent_writers) > 10000:
+        for uid in [u for u, until in _recent_writers.items() if until <= now]:
+            _recent_writers.pop(uid, None)
+
+
+def reads_pinned_to_primary(user_id: Optional[int]) -> bool:
+    until = _recent_writers.get(user_id) if user_id is not None else None
+    return until is not None and until > time.monotonic()
+
+
+async def get_read_cursor(request: Request):
+    """Async dependency like get_cursor, but served by the read replica when one is
+    configured (BACKEND_DB_READ_*). Only for read-only routes. Users who wrote within
+    BACKEND_DB_READ_STICKY_SECONDS keep reading from the primary.
+    """
+    def _route() -> str:
+        user_id = getattr(request.state, "user_id", None)
+        return PRIMARY_POOL if reads_pinned_to_primary(user_id) else READ_POOL
+
+    async_cursor = LazyCursor(_route, request_identity(request), request_deadline(request), request_route(request))
+    try:
+        yield async_cursor
+    finally:
+        await async_cursor.close()
 
 
 async def get_current_user(
     request: Request,
     token: Optional[str] = Depends(oauth2_scheme),
-    cursor=Depends(get_cursor),
 ):
+    """The authenticated user. Resolved on its own primary cursor, released as soon
+    as the user is known: routes on another partition (admin, read replica) do not
+    hold a primary connection for their whole run, and with warm caches no
+    connection is taken at all. Rows it loads stay in the request identity map.
+    """
+    cursor = LazyCursor(
+        identity=request_identity(request), deadline=request_deadline(request), route=request_route(request)
+    )
+    try:
+        return await _resolve_user(request, token, cursor)
+    finally:
+        await cursor.close()
+
+
+async def _resolve_user(request: Request, token: Optional[str], cursor):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -124,29 +937,14 @@ async def get_current_user(
             user_id = None
 
         jti: Optional[str] = payload.get("jti")
+        claims = token_claims(payload)
 
         if user_id is None:
             raise credentials_exception
-
-        # Check token revocation
-        # Note: We assume the table `revoked_tokens` exists.
-        # Ideally, use a caching layer (Redis) for revocation lists in high-scale prod.
-        if jti:
-            # Ensure table exists to avoid 500 on first verify (sync helper)
-            # Note: lifespan ensures it as well.
-            # For async cursor, run the check using await.
-            try:
-                await cursor.execute(
-                    "SELECT id FROM revoked_tokens WHERE jti = %s", (jti,)
-                )
-                if await cursor.fetchone():
-                    logger.info(
-                        f"[auth] Token revoked (jti matched) for user_id={user_id}"
-                    )
-                    raise credentials_exception
-            except Exception as e:
-                # If querying fails (e.g., table missing), treat as not revoked
-                logger.warning(f"[auth] Revocation check skipped due to error: {e}")
+        # Used for read routing (get_read_cursor); writes pin the user's reads to the primary
+        request.state.user_id = user_id
+        if request.method not in _SAFE_METHODS:
+            mark_user_wrote(user_id)
 
     except ExpiredSignatureError:
         raise HTTPException(
@@ -156,9 +954,35 @@ async def get_current_user(
         logger.warning(f"[auth] JWT decode error: {e}")
         raise credentials_exception
 
-    # Fetch user
-    await cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-    user = await cursor.fetchone()
+    if claims is not None:
+        # Self-contained token: valid until its generation is bumped (logout and
+        # role changes), and its roles answer has_role for this request
+        try:
+            valid = await token_generation_valid(cursor, user_id, claims["gen"])
+        except Exception as e:
+            logger.warning(f"[auth] Token generation check failed: {e}")
+            raise credentials_exception
+        if not valid:
+            logger.info(f"[auth] Token generation {claims['gen']} outdated for user_id={user_id}")
+            raise credentials_exception
+        identity = getattr(cursor, "identity", None)
+        if identity is not None:
+            identity.prime("roles", user_id, claims["roles"])
+    else:
+        # Check token revocation (in-process index, refreshed from `revoked_tokens`)
+        # Note: We assume the table `revoked_tokens` exists (lifespan ensures it).
+        try:
+            revoked = await is_token_revoked(cursor, jti)
+        except Exception as e:
+            # If querying fails (e.g., table missing), treat as not revoked
+            logger.warning(f"[auth] Revocation check skipped due to error: {e}")
+            revoked = False
+        if revoked:
+            logger.info(f"[auth] Token revoked (jti matched) for user_id={user_id}")
+            raise credentials_exception
+
+    # Fetch user (principal cache: no query for a recently seen user, no password hash)
+    user = await load_principal(cursor, user_id)
 
     if not user:
         raise credentials_exception
@@ -167,25 +991,18 @@ async def get_current_user(
 
 
 async def get_user_roles(cursor, user_id: int):
+    # Role cache: no query for a recently seen user; has_role() checks are memory lookups
     try:
-        await cursor.execute(
-            """
-            SELECT r.role
-            FROM role_attribution ra
-            JOIN roles r ON r.id = ra.roles_id
-            WHERE ra.users_id = %s
-            """,
-            (user_id,),
-        )
-        rows = await cursor.fetchall() or []
-        return [
-            str(r.get("role")).lower() for r in rows if r and r.get("role") is not None
-        ]
+        return sorted(await load_user_roles(cursor, user_id))
     except Exception:
         logger.exception("[auth] Failed to fetch user roles")
         return []
 
 
 async def has_role(cursor, user_id: int, role_name: str) -> bool:
-    roles = await get_user_roles(cursor, user_id)
+    try:
+        roles = await load_user_roles(cursor, user_id)
+    except Exception:
+        logger.exception("[auth] Failed to fetch user roles")
+        return False
     return role_name.lower() in roles
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+
+logger = logging.getLogger("disconnect")
+
+
+class CancelOnDisconnectMiddleware:
+    """Cancel the handler when the client goes away before the response is sent.
+
+    Starlette keeps running a handler after a disconnect until it writes the
+    response, so its DB queries keep a pooled connection busy. Cancelling the
+    handler lets the cursor dependency kill the running statement (KILL QUERY)
+    and release the connection.
+
+    Only requests without a body are watched: they are the long reads (lists,
+    search, admin scans), and the app never needs to read from them, so watching
+    `receive` for `http.disconnect` cannot steal body chunks.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _has_body(scope) -> bool:
+        for name, value in scope.get("headers") or ():
+            if name == b"transfer-encoding" or (name == b"content-length" and value.strip() not in (b"", b"0")):
+                return True
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._has_body(scope):
+            await self.app(scope, receive, send)
+            return
+
+        disconnected = asyncio.Event()
+        # Servers also report http.disconnect once the response is sent; from then on
+        # the handler is only running dependency teardown, which must not be cancelled
+        response_sent = False
+        pending = [await receive()]
+        if pending[0]["type"] == "http.disconnect":
+            return
+
+        async def app_receive():
+            if pending:
+                return pending.pop()
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def watch():
+            try:
+                while (await receive())["type"] != "http.disconnect":
+                    pass
+            except Exception as e:
+                # Server-side receive failure: stop watching, let the handler finish
+                logger.debug(f"[disconnect] Stopped watching for disconnect: {e}")
+                return
+            disconnected.set()
+
+        async def app_send(message):
+            nonlocal response_sent
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_sent = True
+
+        handler = asyncio.ensure_future(self.app(scope, app_receive, app_send))
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.wait({handler, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            handler.cancel()
+            raise
+        finally:
+            watcher.cancel()
+        if not handler.done() and disconnected.is_set() and not response_sent:
+            logger.info(f"[disconnect] Client left, cancelling {scope.get('method')} {scope.get('path')}")
+            handler.cancel()
+            try:
+                await handler
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                logger.exception("[disconnect] Handler failed while being cancelled")
+            return
+        await handler
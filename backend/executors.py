@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from settings import settings
+
+logger = logging.getLogger("executors")
+
+
+class BoundedExecutor:
+    """Named, fixed-size thread pool with queue depth / saturation metrics.
+
+    Each blocking dependency (MySQL, S3, CPU-heavy hashing) gets its own pool so a
+    slow one only queues its own work instead of starving the loop's default executor.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._completed = 0
+        self._failed = 0
+        self._max_queued = 0
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=f"{self.name}-io"
+                    )
+        return self._pool
+
+    def _call(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            result = fn()
+        except BaseException:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+        return result
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Like asyncio.to_thread, but on this executor."""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        call = functools.partial(ctx.run, fn, *args, **kwargs)
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        try:
+            fut = loop.run_in_executor(self._executor(), self._call, call)
+        except RuntimeError:
+            # Executor shut down: the job never got queued
+            with self._lock:
+                self._queued -= 1
+            raise
+        return await fut
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "workers": self.max_workers,
+                "active": self._active,
+                "queued": self._queued,
+                "max_queued": self._max_queued,
+                "saturation": round(self._active / self.max_workers, 3),
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# DB calls (mysql-connector driver); one thread per pooled connection across all partitions
+_db_connections = (
+    settings.db_pool_size
+    + settings.db_admin_pool_size
+    + settings.db_background_pool_size
+    + (settings.db_read_pool_size if settings.db_read_host else 0)
+)
+db_executor = BoundedExecutor("db", settings.db_executor_workers or _db_connections)
+# S3 uploads/deletes
+blob_executor = BoundedExecutor("blob", settings.blob_executor_workers)
+# Password hashing and other CPU-bound work
+cpu_executor = BoundedExecutor("cpu", settings.cpu_executor_workers)
+# DB control statements (KILL QUERY) that must not queue behind the queries they stop
+control_executor = BoundedExecutor("control", 2)
+
+
+def get_executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {ex.name: ex.stats() for ex in (db_executor, blob_executor, cpu_executor, control_executor)}
+
+
+def shutdown_executors() -> None:
+    for ex in (db_executor, blob_executor, cpu_executor, control_executor):
+        ex.shutdown()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from settings import settings
+from dependencies import open_cursor
+from database import BACKGROUND_POOL
+
+logger = logging.getLogger("db")
+
+# Sequence name -> table whose MAX(id) seeds it on first use (None: starts at 1).
+# Tables without AUTO_INCREMENT take their ids from here; every insert into
+# them must, or it may collide with a block another process holds.
+SEQUENCES: Dict[str, Optional[str]] = {
+    "roles": "roles",
+    "family_assignation": "family_assignation",
+    "messages_recipients": "messages_recipients",
+    # Names of proof images uploaded before their transaction exists
+    "transaction_proofs": None,
+}
+
+
+async def ensure_id_sequences_table(cursor) -> None:
+    try:
+        await cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS id_sequences (
+                name VARCHAR(64) NOT NULL PRIMARY KEY,
+                next_id BIGINT NOT NULL
+            ) ENGINE=InnoDB;
+            """
+        )
+    except Exception:
+        logger.exception("[db] Failed to ensure id_sequences table exists")
+
+
+class _Block:
+    __slots__ = ("next", "limit", "lock")
+
+    def __init__(self):
+        self.next = 0
+        self.limit = 0
+        self.lock = asyncio.Lock()
+
+
+# Per process: each worker reserves its own blocks
+_blocks: Dict[str, _Block] = {}
+
+
+async def _reserve(name: str, count: int) -> int:
+    """Move the sequence past `count` ids on its own autocommitted connection (a
+    request's rollback must not hand them out again) and return the first one.
+    The connection comes from the background partition: the calling request already
+    holds a primary one, and with the primary pool saturated by such requests each
+    would wait on itself for a second slot."""
+    cursor = await open_cursor(BACKGROUND_POOL, "id_allocator")
+    try:
+        sql = "UPDATE id_sequences SET next_id = LAST_INSERT_ID(next_id + %s) WHERE name = %s"
+        await cursor.execute(sql, (count, name))
+        if not cursor.rowcount:
+            table = SEQUENCES[name]
+            seed = f"SELECT %s, COALESCE(MAX(id), 0) + 1 FROM {table}" if table else "SELECT %s, 1"
+            # Concurrent seeders: the first one wins, the others are ignored
+            await cursor.execute(f"INSERT IGNORE INTO id_sequences (name, next_id) {seed}", (name,))
+            await cursor.execute(sql, (count, name))
+        # The server reports LAST_INSERT_ID(expr) as the statement's insert id
+        end = cursor.lastrowid
+        if not end:
+            row = await cursor.fetch_one("SELECT LAST_INSERT_ID() AS end_id")
+            end = row["end_id"]
+        return int(end) - count
+    finally:
+        await cursor.close()
+
+
+async def next_ids(name: str, count: int) -> List[int]:
+    """`count` unique ids for a sequence of SEQUENCES, handed out from blocks of
+    BACKEND_DB_ID_BLOCK_SIZE reserved in `id_sequences` (hi/lo): one UPDATE per block
+    instead of a MAX(id) scan per insert. Ids are increasing per process but not
+    gapless: a restart or a rolled-back insert skips the rest of a block.
+    """
+    if name not in SEQUENCES:
+        raise KeyError(f"Unknown id sequence: {name}")
+    if count <= 0:
+        return []
+    block = _blocks.setdefault(name, _Block())
+    async with block.lock:
+        ids: List[int] = []
+        while len(ids) < count:
+            if block.next >= block.limit:
+                size = max(settings.db_id_block_size, count - len(ids))
+                block.next = await _reserve(name, size)
+                block.limit = block.next + size
+                logger.debug(f"[db] Reserved ids {block.next}..{block.limit - 1} for {name}")
+            take = min(count - len(ids), block.limit - block.next)
+            ids.extend(range(block.next, block.next + take))
+            block.next += take
+        return ids
+
+
+async def next_id(name: str) -> int:
+    return (await next_ids(name, 1))[0]
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("identity_map")
+
+
+# ------------------------------
+# Batch loaders: (cursor, keys) -> {key: value}
+# ------------------------------
+
+def _in_clause(column: str, keys: List[int]) -> str:
+    # Single key keeps the exact statement handlers already run (prepared statement cache hit)
+    if len(keys) == 1:
+        return f"{column} = %s"
+    return f"{column} IN ({', '.join(['%s'] * len(keys))})"
+
+
+async def _load_users(cursor, ids: List[int]) -> Dict[int, Any]:
+    rows = await cursor.fetch_all(f"SELECT * FROM users WHERE {_in_clause('id', ids)}", tuple(ids)) or []
+    return {int(r["id"]): r for r in rows}
+
+
+async def _load_roles(cursor, user_ids: List[int]) -> Dict[int, Any]:
+    rows = await cursor.fetch_all(
+        f"""
+        SELECT ra.users_id, r.role
+        FROM role_attribution ra
+        JOIN roles r ON r.id = ra.roles_id
+        WHERE {_in_clause('ra.users_id', user_ids)}
+        """,
+        tuple(user_ids),
+    ) or []
+    roles: Dict[int, List[str]] = {uid: [] for uid in user_ids}
+    for r in rows:
+        if r and r.get("role") is not None:
+            roles.setdefault(int(r["users_id"]), []).append(str(r["role"]).lower())
+    return roles
+
+
+async def _load_transactions(cursor, ids: List[int]) -> Dict[int, Any]:
+    rows = await cursor.fetch_all(f"SELECT * FROM transactions WHERE {_in_clause('id', ids)}", tuple(ids)) or []
+    return {int(r["id"]): r for r in rows}
+
+
+LOADERS: Dict[str, Callable[[Any, List[int]], Awaitable[Dict[int, Any]]]] = {
+    "users": _load_users,
+    "roles": _load_roles,
+    "transactions": _load_transactions,
+}
+
+# Which cached kinds a write to a table makes stale
+_TABLE_KINDS = {
+    "users": ("users",),
+    "roles": ("roles",),
+    "role_attribution": ("roles",),
+    "transactions": ("transactions",),
+}
+_READ_RE = re.compile(r"^\s*(SELECT|SHOW|DESCRIBE|DESC|EXPLAIN|SAVEPOINT|RELEASE)\b", re.I)
+_WRITE_RE = re.compile(
+    r"^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+IGNORE)?|DELETE\s+FROM)\s+`?(\w+)`?", re.I
+)
+
+
+def _copy(value: Any) -> Any:
+    # Callers get their own copy; handlers mutate rows (e.g. pop "password")
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return list(value)
+    return value
+
+
+class _Batch:
+    __slots__ = ("keys", "done")
+
+    def __init__(self):
+        self.keys: List[int] = []
+        self.done = asyncio.get_running_loop().create_future()
+
+
+class RequestIdentityMap:
+    """Per-request identity map for user / role / transaction rows.
+
+    - A row is fetched at most once per request; later lookups are served from memory.
+    - Lookups of the same kind issued in the same loop tick (e.g. under gather) are
+      merged into one `WHERE id IN (...)` query, DataLoader style.
+    - Writes through the request's cursors (see note_statement) drop the kinds they
+      touch, so reads after a write in the same request see the new data.
+    """
+
+    def __init__(self):
+        self._rows: Dict[str, Dict[int, Any]] = {}
+        self._open: Dict[str, _Batch] = {}
+        # Bumped on invalidation so a query in flight does not store stale rows
+        self._generation: Dict[str, int] = {}
+
+    async def load(self, cursor, kind: str, key: Any) -> Any:
+        key = int(key)
+        rows = self._rows.setdefault(kind, {})
+        if key in rows:
+            return _copy(rows[key])
+        batch = self._open.get(kind)
+        if batch is not None:
+            # Join the batch being collected this tick
+            if key not in batch.keys:
+                batch.keys.append(key)
+            found = await asyncio.shield(batch.done)
+            return _copy(found.get(key))
+
+        batch = self._open[kind] = _Batch()
+        batch.keys.append(key)
+        generation = self._generation.get(kind, 0)
+        try:
+            # Let concurrent lookups of this tick join before querying
+            await asyncio.sleep(0)
+            if self._open.get(kind) is batch:
+                del self._open[kind]
+            found = await LOADERS[kind](cursor, batch.keys)
+        except BaseException as e:
+            if self._open.get(kind) is batch:
+                del self._open[kind]
+            if not batch.done.done():
+                batch.done.set_exception(e)
+                # Mark retrieved: joiners (if any) re-raise it themselves
+                batch.done.exception()
+            raise
+        found = {k: found.get(k) for k in batch.keys}
+        if self._generation.get(kind, 0) == generation:
+            self._rows.setdefault(kind, {}).update(found)
+        batch.done.set_result(found)
+        return _copy(found.get(key))
+
+    async def load_many(self, cursor, kind: str, keys: Iterable[Any]) -> Dict[int, Any]:
+        """Load several keys with one query for the ones not cached yet."""
+        wanted = list(dict.fromkeys(int(k) for k in keys))
+        rows = self._rows.setdefault(kind, {})
+        missing = [k for k in wanted if k not in rows]
+        if missing:
+            generation = self._generation.get(kind, 0)
+            found = await LOADERS[kind](cursor, missing)
+            found = {k: found.get(k) for k in missing}
+            if self._generation.get(kind, 0) == generation:
+                rows.update(found)
+            rows = {**rows, **found}
+        return {k: _copy(rows.get(k)) for k in wanted}
+
+    def prime(self, kind: str, key: Any, value: Any) -> None:
+        """Store a row known without a query (e.g. roles from a verified token)."""
+        self._rows.setdefault(kind, {})[int(key)] = value
+
+    def peek(self, kind: str, key: Any) -> Any:
+        """The row if this request already holds it, else None (never queries)."""
+        return _copy(self._rows.get(kind, {}).get(int(key)))
+
+    def invalidate(self, kind: Optional[str] = None) -> None:
+        kinds = [kind] if kind else list(LOADERS)
+        for k in kinds:
+            self._rows.pop(k, None)
+            self._generation[k] = self._generation.get(k, 0) + 1
+
+    def note_statement(self, sql: Any) -> None:
+        """Invalidate what a statement about to run may change."""
+        sql = str(sql)
+        if _READ_RE.match(sql):
+            return
+        m = _WRITE_RE.match(sql)
+        if m is None or re.search(r"\bJOIN\b", sql, re.I):
+            # DDL, multi-table writes, anything unrecognised: drop everything
+            self.invalidate()
+            return
+        for kind in _TABLE_KINDS.get(m.group(1).lower(), ()):
+            self.invalidate(kind)
+
+
+async def load_row(cursor, kind: str, key: Any) -> Any:
+    """Row (or role list for "roles") for `key`, through the cursor's request identity
+    map when it has one; None when it does not exist."""
+    identity = getattr(cursor, "identity", None)
+    if identity is not None:
+        return await identity.load(cursor, kind, key)
+    return (await LOADERS[kind](cursor, [int(key)])).get(int(key))
+
+
+async def load_rows(cursor, kind: str, keys: Iterable[Any]) -> Dict[int, Any]:
+    """Like load_row for several keys, in one query."""
+    identity = getattr(cursor, "identity", None)
+    if identity is not None:
+        return await identity.load_many(cursor, kind, keys)
+    wanted = list(dict.fromkeys(int(k) for k in keys))
+    found = await LOADERS[kind](cursor, wanted) if wanted else {}
+    return {k: found.get(k) for k in wanted}
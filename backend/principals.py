@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from settings import settings
+
+logger = logging.getLogger("auth")
+
+# Every users column but the password hash, which authentication never needs
+PRINCIPAL_COLUMNS = (
+    "id", "firstname", "lastname", "username", "email", "telephone", "birthday",
+    "isactive", "isfirstlogin", "createdat", "updatedat", "createdby", "updatedby",
+    "id_father", "id_mother", "image_url", "gender", "contribution_tier",
+)
+_PRINCIPAL_SQL = f"SELECT {', '.join(PRINCIPAL_COLUMNS)} FROM users WHERE id = %s"
+
+
+class PrincipalCache:
+    """Authenticated users (user id -> projected users row), per process.
+
+    Entries live BACKEND_PRINCIPAL_CACHE_TTL seconds and the least recently used
+    go past BACKEND_PRINCIPAL_CACHE_SIZE. The user endpoints invalidate the rows
+    they write, on this worker; other workers see the change when their entry
+    expires.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Handlers run on the loop, but scripts and jobs may share the process
+        self._lock = threading.Lock()
+        # Bumped on invalidation so a load in flight does not store the old row
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            # Handlers may modify what they get
+            return dict(entry[1])
+
+    def put(self, user_id: int, record: Dict[str, Any], generation: int) -> None:
+        ttl = settings.principal_cache_ttl
+        size = settings.principal_cache_size
+        if ttl <= 0 or size <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + ttl, dict(record))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_ids: Iterable[Any]) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                if self._entries.pop(int(user_id), None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl_s": settings.principal_cache_ttl,
+                "max_entries": settings.principal_cache_size,
+            }
+
+
+principal_cache = PrincipalCache()
+
+
+async def load_principal(cursor, user_id: int) -> Optional[Dict[str, Any]]:
+    """The authenticated user's row without the password hash, from the cache or
+    the DB; None if there is no such user (never cached)."""
+    user_id = int(user_id)
+    record = principal_cache.get(user_id)
+    if record is not None:
+        return record
+    generation = principal_cache.generation
+    record = await cursor.fetch_one(_PRINCIPAL_SQL, (user_id,))
+    if record is None:
+        return None
+    record = dict(record)
+    principal_cache.put(user_id, record, generation)
+    return record
+
+
+def get_principal_cache_stats() -> Dict[str, Any]:
+    return principal_cache.stats()
+
+
+def invalidate_principals(*user_ids: Any) -> None:
+    """Drop cached principals after their users row changed (call after the commit,
+    so a concurrent request cannot cache the old row again)."""
+    principal_cache.invalidate(user_ids)
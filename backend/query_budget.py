@@ -0,0 +1,132 @@
+import contextvars
+import logging
+from collections import Counter
+from typing import List, Optional, Tuple
+
+from settings import settings
+
+logger = logging.getLogger("db")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """A request ran more statements than its budget (raised when the budget is enforced)."""
+
+
+class RequestQueries:
+    """DB work of one request: statements run, time spent in them, and how often
+    each fingerprint ran (the same one over and over is an N+1 loop)."""
+
+    __slots__ = ("count", "elapsed_ms", "fingerprints", "budget", "reported")
+
+    def __init__(self, budget: int):
+        self.count = 0
+        self.elapsed_ms = 0.0
+        self.fingerprints: Counter = Counter()
+        # Statements allowed (0 = unlimited); routes may change it, see query_budget()
+        self.budget = budget
+        self.reported = False
+
+    def add(self, fp: str, ms: float) -> None:
+        self.count += 1
+        self.elapsed_ms += ms
+        self.fingerprints[fp] += 1
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Fingerprints run at least `threshold` times, most frequent first."""
+        if threshold <= 0:
+            return []
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+
+_current: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar(
+    "request_queries", default=None
+)
+
+
+def current_request_queries() -> Optional[RequestQueries]:
+    return _current.get()
+
+
+def note_statement(fp: str, ms: float) -> None:
+    """Count a finished statement against the current request (no-op outside requests)."""
+    queries = _current.get()
+    if queries is not None:
+        queries.add(fp, ms)
+
+
+def check_budget() -> None:
+    """Called before a statement runs. Over budget, the request fails with
+    QueryBudgetExceeded when BACKEND_DB_ENFORCE_QUERY_BUDGET is on, else it is logged once."""
+    queries = _current.get()
+    if queries is None or queries.budget <= 0 or queries.count < queries.budget:
+        return
+    top = queries.fingerprints.most_common(1)
+    hint = f"; most repeated: {top[0][1]}x {top[0][0]}" if top else ""
+    message = f"Request exceeded its DB budget of {queries.budget} statements{hint}"
+    if settings.db_enforce_query_budget:
+        raise QueryBudgetExceeded(message)
+    if not queries.reported:
+        queries.reported = True
+        logger.warning(f"[db] {message}")
+
+
+def query_budget(max_statements: int):
+    """Route dependency overriding the statement budget of a request, e.g.
+    `dependencies=[Depends(query_budget(200))]` (0 = unlimited)."""
+    async def _set_budget():
+        queries = _current.get()
+        if queries is not None:
+            queries.budget = max_statements
+
+    return _set_budget
+
+
+class QueryBudgetMiddleware:
+    """Counts DB statements and DB time per HTTP request.
+
+    - Adds a `Server-Timing: db;dur=...;desc="N statements"` header (statements run
+      before the response starts; streamed bodies keep querying after it).
+    - Logs the request when one fingerprint ran BACKEND_DB_N_PLUS_ONE_THRESHOLD
+      times or more (a per-row query loop).
+    - Applies the per-request budget (BACKEND_DB_REQUEST_MAX_QUERIES) through
+      check_budget(), which the cursors call before each statement.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries(settings.db_request_max_queries)
+        token = _current.set(queries)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and queries.count:
+                headers = list(message.get("headers") or [])
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={queries.elapsed_ms:.1f};desc="{queries.count} statements"'.encode("latin-1"),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._report(scope, queries)
+
+    @staticmethod
+    def _report(scope, queries: RequestQueries) -> None:
+        repeated = queries.repeated(settings.db_n_plus_one_threshold)
+        if not repeated:
+            return
+        route = getattr(scope.get("route"), "path", None) or scope.get("path")
+        loops = "; ".join(f"{n}x {fp}" for fp, n in repeated[:3])
+        logger.warning(
+            f"[db] Possible N+1 in {scope.get('method')} {route} "
+            f"({queries.count} statements, {queries.elapsed_ms:.0f} ms): {loops}"
+        )
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from settings import settings
+
+logger = logging.getLogger("auth")
+
+# Rows read per refresh query
+_BATCH = 5000
+# Ids re-read below the watermark on each refresh: a logout that got its id
+# before another one but committed after it would otherwise never be seen
+_OVERLAP_IDS = 50
+# Named lock (GET_LOCK) so only one worker purges at a time
+_PURGE_LOCK = "kassa_revoked_tokens_purge"
+# Pause between purge batches, so other writers get the table in between
+_PURGE_PAUSE = 0.1
+
+
+# ------------------------------
+# Storage
+# ------------------------------
+
+async def ensure_revoked_tokens_table(cursor):
+    """Create `revoked_tokens` (jti + expiry only) or add the expiry index to an older one.
+    Dropping the old `token` column is left to database/migrations/002_revoked_tokens_compact.sql.
+    """
+    try:
+        await cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                jti VARCHAR(36) NOT NULL,
+                expires DATETIME NOT NULL,
+                INDEX idx_jti (jti),
+                INDEX idx_expires (expires)
+            ) ENGINE=InnoDB;
+            """
+        )
+        if not await cursor.fetch_one(
+            """
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = 'revoked_tokens' AND index_name = 'idx_expires'
+            LIMIT 1
+            """
+        ):
+            # The purge deletes by expiry; without the index each batch scans the table
+            await cursor.execute("ALTER TABLE revoked_tokens ADD INDEX idx_expires (expires)")
+            logger.info("[auth] Added idx_expires to revoked_tokens")
+    except Exception:
+        logger.exception("[auth] Failed to ensure revoked_tokens table exists")
+
+
+async def revoke_token(cursor, jti: str, expires: datetime) -> None:
+    """Store a revocation (jti and token expiry, naive UTC) and apply it to this worker at once.
+    The caller commits."""
+    await cursor.execute(
+        "INSERT INTO revoked_tokens (jti, expires) VALUES (%s, %s)",
+        (jti, expires.astimezone(timezone.utc).replace(tzinfo=None) if expires.tzinfo else expires),
+    )
+    note_revoked(jti, expires)
+
+
+def _epoch(expires: Any) -> float:
+    """revoked_tokens.expires (naive UTC DATETIME) as a timestamp; no expiry = never."""
+    if expires is None:
+        return float("inf")
+    if isinstance(expires, datetime):
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        return expires.timestamp()
+    return float(expires)
+
+
+class RevocationIndex:
+    """Revoked token ids (jti) of this process, each kept until its token expires.
+
+    Filled from `revoked_tokens` incrementally (rows past the highest id seen),
+    at most every BACKEND_REVOCATION_REFRESH_SECONDS, by whichever request finds it
+    stale; logouts handled by this process are added at once. A logout on another
+    worker is therefore honoured here within the refresh interval.
+    """
+
+    def __init__(self):
+        self._expires: Dict[str, float] = {}
+        self._watermark = 0
+        self._loaded = False
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def add(self, jti: str, expires: Any) -> None:
+        exp = _epoch(expires)
+        if exp > time.time():
+            self._expires[jti] = max(exp, self._expires.get(jti, exp))
+
+    def contains(self, jti: str) -> bool:
+        exp = self._expires.get(jti)
+        return exp is not None and exp > time.time()
+
+    def stale(self) -> bool:
+        return not self._loaded or time.monotonic() - self._refreshed_at >= settings.revocation_refresh_seconds
+
+    def _prune(self) -> None:
+        now = time.time()
+        for jti in [j for j, exp in self._expires.items() if exp <= now]:
+            del self._expires[jti]
+
+    async def refresh(self, cursor) -> None:
+        """Read revocations past the watermark (all of them on the first call)."""
+        async with self._lock:
+            # Another request refreshed while this one waited
+            if not self.stale():
+                return
+            after = max(self._watermark - _OVERLAP_IDS, 0) if self._loaded else 0
+            added = 0
+            try:
+                while True:
+                    rows = await cursor.fetch_all(
+                        "SELECT id, jti, expires FROM revoked_tokens WHERE id > %s ORDER BY id LIMIT %s",
+                        (after, _BATCH),
+                    ) or []
+                    for row in rows:
+                        if row.get("jti"):
+                            self.add(row["jti"], row.get("expires"))
+                            added += 1
+                        after = max(after, int(row["id"]))
+                    if len(rows) < _BATCH:
+                        break
+            except Exception:
+                if self._loaded:
+                    # Retry after another interval instead of on every request
+                    self._refreshed_at = time.monotonic()
+                raise
+            self._watermark = max(self._watermark, after)
+            self._prune()
+            if not self._loaded:
+                logger.info(f"[auth] Revocation index loaded: {len(self._expires)} active of {added} revoked tokens")
+            self._loaded = True
+            self._refreshed_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self._loaded,
+            "active": len(self._expires),
+            "watermark": self._watermark,
+            "age_s": round(time.monotonic() - self._refreshed_at, 1) if self._loaded else None,
+        }
+
+
+revocation_index = RevocationIndex()
+
+
+async def is_token_revoked(cursor, jti: Optional[str]) -> bool:
+    """Whether the token with this jti was revoked (logout). Answered from the
+    in-process index; only a stale index costs a query, to catch up on new rows.
+    BACKEND_REVOCATION_REFRESH_SECONDS=0 disables the index (one query per call).
+    """
+    if not jti:
+        return False
+    if settings.revocation_refresh_seconds <= 0:
+        return bool(await cursor.fetch_one("SELECT id FROM revoked_tokens WHERE jti = %s", (jti,)))
+    if revocation_index.stale():
+        try:
+            await revocation_index.refresh(cursor)
+        except Exception as e:
+            if not revocation_index.loaded:
+                raise
+            # Keep serving from the last good state until the next interval
+            logger.warning(f"[auth] Revocation index refresh failed, using stale index: {e}")
+    return revocation_index.contains(jti)
+
+
+def note_revoked(jti: Optional[str], expires: Any) -> None:
+    """Add a revocation written by this process (logout) without waiting for a refresh."""
+    if jti:
+        revocation_index.add(jti, expires)
+
+
+# ------------------------------
+# Purge of expired revocations
+# ------------------------------
+
+_purge_stats: Dict[str, Any] = {
+    "runs": 0,
+    # Runs that found another worker purging
+    "skipped": 0,
+    "failures": 0,
+    "rows_deleted": 0,
+    "batches": 0,
+    "last_run_at": None,
+    "last_deleted": 0,
+    "last_duration_ms": None,
+    "last_error": None,
+}
+
+
+async def purge_expired_revocations(cursor) -> int:
+    """Delete revocations whose token has expired (such tokens fail validation
+    anyway), BACKEND_REVOKED_TOKENS_PURGE_BATCH rows per statement so no single
+    DELETE holds locks for long. Returns the rows deleted; 0 if another worker
+    is already purging.
+    """
+    row = await cursor.fetch_one("SELECT GET_LOCK(%s, 0) AS got", (_PURGE_LOCK,))
+    if not row or not row["got"]:
+        _purge_stats["skipped"] += 1
+        return 0
+    started = time.perf_counter()
+    batch = max(1, settings.revoked_tokens_purge_batch)
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None)
+    deleted = 0
+    try:
+        while True:
+            await cursor.execute(
+                "DELETE FROM revoked_tokens WHERE expires < %s ORDER BY expires LIMIT %s",
+                (cutoff, batch),
+            )
+            count = max(cursor.rowcount or 0, 0)
+            deleted += count
+            _purge_stats["rows_deleted"] += count
+            _purge_stats["batches"] += 1
+            if count < batch:
+                break
+            await asyncio.sleep(_PURGE_PAUSE)
+    finally:
+        _purge_stats["runs"] += 1
+        _purge_stats["last_run_at"] = datetime.now(timezone.utc).isoformat()
+        _purge_stats["last_deleted"] = deleted
+        _purge_stats["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        try:
+            await cursor.execute("DO RELEASE_LOCK(%s)", (_PURGE_LOCK,))
+        except Exception as e:
+            # The lock goes with the connection anyway
+            logger.debug(f"[auth] Failed to release purge lock: {e}")
+    if deleted:
+        logger.info(f"[auth] Purged {deleted} expired revoked tokens")
+    return deleted
+
+
+async def revocation_purge_loop(open_cursor: Callable[[], Awaitable[Any]]) -> None:
+    """Purge every BACKEND_REVOKED_TOKENS_PURGE_INTERVAL seconds, on a cursor from
+    `open_cursor` (closed after each run). Runs until cancelled."""
+    while True:
+        await asyncio.sleep(settings.revoked_tokens_purge_interval)
+        try:
+            cursor = await open_cursor()
+            try:
+                await purge_expired_revocations(cursor)
+            finally:
+                await cursor.close()
+            _purge_stats["last_error"] = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _purge_stats["failures"] += 1
+            _purge_stats["last_error"] = str(e)
+            logger.warning(f"[auth] Revoked tokens purge failed: {e}")
+
+
+def get_revocation_stats() -> Dict[str, Any]:
+    """Revocation index state and purge progress of this process."""
+    return {
+        "index": revocation_index.stats(),
+        "purge": {
+            "interval_s": settings.revoked_tokens_purge_interval,
+            "batch": settings.revoked_tokens_purge_batch,
+            **_purge_stats,
+        },
+    }
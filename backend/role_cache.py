@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Tuple
+
+from settings import settings
+from identity_map import load_row
+
+logger = logging.getLogger("auth")
+
+
+class RoleCache:
+    """Role names of users (user id -> frozenset of lowercase names), per process.
+
+    Entries live BACKEND_ROLE_CACHE_TTL seconds and the least recently used go past
+    BACKEND_ROLE_CACHE_SIZE. The role endpoints invalidate the users whose roles
+    they change (or everything, when a role itself is renamed or deleted) on this
+    worker; other workers see the change when their entry expires.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[int, Tuple[float, FrozenSet[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on invalidation so a load in flight does not store the old roles
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, user_id: int) -> Optional[FrozenSet[str]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, roles: FrozenSet[str], generation: int) -> None:
+        ttl = settings.role_cache_ttl
+        size = settings.role_cache_size
+        if ttl <= 0 or size <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[user_id] = (time.monotonic() + ttl, roles)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_ids: Iterable[Any]) -> None:
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                if self._entries.pop(int(user_id), None) is not None:
+                    self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl_s": settings.role_cache_ttl,
+                "max_entries": settings.role_cache_size,
+            }
+
+
+role_cache = RoleCache()
+
+
+async def load_user_roles(cursor, user_id: int) -> FrozenSet[str]:
+    """Lowercase role names of a user, from the cache or the DB (through the
+    request identity map, so lookups of one tick share a query)."""
+    user_id = int(user_id)
+    # Primed by get_current_user from a self-contained token, or already read by this request
+    identity = getattr(cursor, "identity", None)
+    held = identity.peek("roles", user_id) if identity is not None else None
+    if held is not None:
+        return frozenset(held)
+    # Inside a transaction the request may have changed role_attribution itself
+    if not getattr(cursor, "in_transaction", False):
+        roles = role_cache.get(user_id)
+        if roles is not None:
+            return roles
+    generation = role_cache.generation
+    roles = frozenset(await load_row(cursor, "roles", user_id) or ())
+    if not getattr(cursor, "in_transaction", False):
+        role_cache.put(user_id, roles, generation)
+    return roles
+
+
+def get_role_cache_stats() -> Dict[str, Any]:
+    return role_cache.stats()
+
+
+def invalidate_roles(*user_ids: Any) -> None:
+    """Drop cached roles after role_attribution rows of these users changed (call
+    after the commit, so a concurrent request cannot cache the old roles again)."""
+    role_cache.invalidate(user_ids)
+
+
+def clear_role_cache() -> None:
+    """Drop every cached role set, e.g. after a role was renamed or deleted."""
+    role_cache.clear()
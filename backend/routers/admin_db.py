@@ -2,11 +2,25 @@ from fastapi import APIRouter, Depends, HTTPException, status, Request
 from typing import List, Dict, Any, Optional, Tuple
 import logging
 
-from dependencies import get_cursor, get_current_user, has_role
+from dependencies import get_admin_cursor, get_current_user, has_role, db_deadline
+from database import get_db_pool_stats, get_ssh_tunnel_stats, get_db_checkouts
+from stmt_cache import get_stmt_cache_stats
+from sql_stats import get_sql_stats, reset_sql_stats
+from revocations import get_revocation_stats
+from principals import get_principal_cache_stats
+from role_cache import get_role_cache_stats
+from token_generations import get_token_generation_stats, bump_token_generations
+from principals import invalidate_principals
+from role_cache import invalidate_roles, clear_role_cache
 from settings import settings
 from aws_file import AwsFile
+from executors import blob_executor, get_executor_stats
 
-router = APIRouter()
+# Deleting their rows would make revoked or outdated tokens valid again
+_PROTECTED_TABLES = {"revoked_tokens", "user_token_generations"}
+
+# Table scans and bulk deletes: bounded so an abandoned one stops using the DB
+router = APIRouter(dependencies=[Depends(db_deadline(20))])
 logger = logging.getLogger("admin_db")
 
 
@@ -33,7 +47,7 @@ async def _ensure_admin(cursor, current_user: dict):
 
 @router.get("/admin/db/tables")
 async def list_tables(
-    cursor=Depends(get_cursor), current_user: dict = Depends(get_current_user)
+    cursor=Depends(get_admin_cursor), current_user: dict = Depends(get_current_user)
 ):
     await _ensure_admin(cursor, current_user)
     db = await _get_db_name(cursor)
@@ -59,9 +73,85 @@ async def list_tables(
     return result
 
 
+@router.get("/admin/db/pool")
+async def pool_stats(
+    cursor=Depends(get_admin_cursor), current_user: dict = Depends(get_current_user)
+):
+    """Connection pool gauges (in use / idle / waiting), checkout-wait timings,
+    executor queue depth / saturation, prepared statement cache hits, SSH
+    tunnel health, principal / role cache hits and token generations."""
+    await _ensure_admin(cursor, current_user)
+    return {
+        "pools": get_db_pool_stats(),
+        "executors": get_executor_stats(),
+        "statements": get_stmt_cache_stats(),
+        "tunnels": get_ssh_tunnel_stats(),
+        "principals": get_principal_cache_stats(),
+        "roles": get_role_cache_stats(),
+        "token_generations": get_token_generation_stats(),
+    }
+
+
+
+@router.get("/admin/db/checkouts")
+async def pool_checkouts(
+    cursor=Depends(get_admin_cursor), current_user: dict = Depends(get_current_user)
+):
+    """Connections checked out right now: owner route, state (held / executing /
+    in_transaction), how long, and the stack that took them. Entries held past
+    BACKEND_DB_POOL_LEAK_THRESHOLD are flagged as suspected leaks."""
+    await _ensure_admin(cursor, current_user)
+    checkouts = get_db_checkouts()
+    return {
+        "leak_threshold_s": settings.db_pool_leak_threshold,
+        "suspected_leaks": sum(1 for c in checkouts if c["suspected_leak"]),
+        "checkouts": checkouts,
+    }
+
+
+@router.get("/admin/db/revocations")
+async def revocation_stats(
+    cursor=Depends(get_admin_cursor), current_user: dict = Depends(get_current_user)
+):
+    """Revoked-token index of this worker (active entries, watermark, age) and
+    progress of the expired revocations purge (runs, rows deleted, last run)."""
+    await _ensure_admin(cursor, current_user)
+    return get_revocation_stats()
+
+_QUERY_SORTS = {"total_ms", "calls", "mean_ms", "max_ms", "rows", "errors"}
+
+
+@router.get("/admin/db/queries")
+async def query_stats(
+    limit: int = 20,
+    sort: str = "total_ms",
+    cursor=Depends(get_admin_cursor),
+    current_user: dict = Depends(get_current_user),
+):
+    """Top SQL fingerprints of this process (default: by total time), with call
+    counts, latency histogram / percentiles, rows and calling routes."""
+    await _ensure_admin(cursor, current_user)
+    if sort not in _QUERY_SORTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort must be one of: {', '.join(sorted(_QUERY_SORTS))}",
+        )
+    return get_sql_stats(limit=max(1, min(limit, 200)), sort=sort)
+
+
+@router.delete("/admin/db/queries")
+async def reset_query_stats(
+    cursor=Depends(get_admin_cursor), current_user: dict = Depends(get_current_user)
+):
+    """Start a new measurement window (e.g. after deploying a query change)."""
+    await _ensure_admin(cursor, current_user)
+    reset_sql_stats()
+    return {"reset": True}
+
+
 @router.get("/admin/db/deletion-order")
 async def deletion_order(
-    cursor=Depends(get_cursor), current_user: dict = Depends(get_current_user)
+    cursor=Depends(get_admin_cursor), current_user: dict = Depends(get_current_user)
 ):
     await _ensure_admin(cursor, current_user)
     db = await _get_db_name(cursor)
@@ -156,7 +246,7 @@ async def _table_exists(cursor, db: str, table: str) -> bool:
 async def get_rows(
     table: str,
     request: Request,
-    cursor=Depends(get_cursor),
+    cursor=Depends(get_admin_cursor),
     current_user: dict = Depends(get_current_user),
 ):
     await _ensure_admin(cursor, current_user)
@@ -206,7 +296,7 @@ async def get_rows(
 async def delete_rows_endpoint(
     table: str,
     body: Dict[str, Any],
-    cursor=Depends(get_cursor),
+    cursor=Depends(get_admin_cursor),
     current_user: dict = Depends(get_current_user),
 ):
     await _ensure_admin(cursor, current_user)
@@ -215,6 +305,11 @@ async def delete_rows_endpoint(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Table not found"
         )
+    if table.lower() in _PROTECTED_TABLES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Rows of this table cannot be deleted here (they keep tokens revoked)",
+        )
 
     ids = body.get("ids")
     if not isinstance(ids, list) or len(ids) == 0:
@@ -252,11 +347,31 @@ async def delete_rows_endpoint(
                 if isinstance(ref, str) and ref.startswith(("http://", "https://")):
                     urls_to_delete.append(ref)
 
+    # Users whose principal or roles the deletion changes (caches, self-contained tokens)
+    affected_users: list = []
+    if t_lower == "users":
+        affected_users = list(ids)
+    elif t_lower == "role_attribution":
+        await cursor.execute(
+            f"SELECT users_id FROM role_attribution WHERE `{pk}` IN ({placeholders})",
+            tuple(ids),
+        )
+        affected_users = [r["users_id"] for r in (await cursor.fetchall() or [])]
+    elif t_lower == "roles":
+        await cursor.execute(
+            f"SELECT users_id FROM role_attribution WHERE roles_id IN ({placeholders})",
+            tuple(ids),
+        )
+        affected_users = [r["users_id"] for r in (await cursor.fetchall() or [])]
+
     # Delete rows
     sql = f"DELETE FROM `{table}` WHERE `{pk}` IN ({placeholders})"
 
     try:
         await cursor.execute(sql, tuple(ids))
+        deleted = cursor.rowcount
+        if t_lower in {"users", "role_attribution", "roles"}:
+            await bump_token_generations(cursor, affected_users)
         await cursor.commit()
     except Exception as e:
         # MySQL FK constraint error typically 1451
@@ -270,13 +385,21 @@ async def delete_rows_endpoint(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Delete failed"
         )
+    if t_lower == "users":
+        invalidate_principals(*affected_users)
+        invalidate_roles(*affected_users)
+    elif t_lower == "role_attribution":
+        invalidate_roles(*affected_users)
+    elif t_lower == "roles":
+        clear_role_cache()
+
     # After successful DB deletion, best-effort delete AWS images
     if urls_to_delete:
         try:
             aws = AwsFile(settings)
             for url in urls_to_delete:
                 try:
-                    ok = aws.delete_image(url)
+                    ok = await blob_executor.run(aws.delete_image, url)
                     if not ok:
                         logger.warning(f"[admin_db] AWS delete failed for url={url}")
                 except Exception:
@@ -285,4 +408,4 @@ async def delete_rows_endpoint(
             # Do not fail the endpoint if AWS setup has issues; just log
             logger.exception("[admin_db] AWS client initialization failed; skipping image deletions")
 
-    return {"deleted": cursor.rowcount}
+    return {"deleted": deleted}
@@ -8,6 +8,11 @@ import logging
 from models import TokenResponse
 from auth_utils import verify_password, create_access_token, hash_password
 from settings import settings
+from executors import cpu_executor
+from revocations import revoke_token
+from principals import invalidate_principals
+from identity_map import load_row
+from token_generations import read_token_generation, bump_token_generations, token_claims
 import asyncio
 
 router = APIRouter()
@@ -77,7 +82,7 @@ async def login(request: Request, cursor = Depends(get_cursor)):
         logging.error(f"[auth] Login failed for identifier: {identifier} (user not found)")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Informations de connexion incorrectes")
 
-    if not verify_password(password, user.get("password", "")):
+    if not await cpu_executor.run(verify_password, password, user.get("password", "")):
         logging.error(f"[auth] Login failed for identifier: {identifier} (invalid password)")
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Informations de connexion incorrectes")
 
@@ -114,7 +119,14 @@ async def login(request: Request, cursor = Depends(get_cursor)):
             },
         )
 
-    token = create_access_token({"sub": str(user["id"]), "username": user.get("username")})
+    claims = {"sub": str(user["id"]), "username": user.get("username")}
+    if settings.jwt_self_contained:
+        # Generation before roles: a role change landing in between leaves the token outdated, never wrong
+        generation = await read_token_generation(cursor, user["id"])
+        roles = await load_row(cursor, "roles", user["id"]) or []
+        token = create_access_token(claims, roles=roles, generation=generation)
+    else:
+        token = create_access_token(claims)
     return TokenResponse(access_token=token)
 
 @router.post("/change-password-first-login")
@@ -175,11 +187,11 @@ async def change_password_first_login(request: Request, cursor = Depends(get_cur
     await check_majority(user)
 
     # Verify old (current) password
-    if not verify_password(old_password, user.get("password", "")):
+    if not await cpu_executor.run(verify_password, old_password, user.get("password", "")):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Informations de connexion incorrectes")
 
     # Update password and clear first-login flag
-    new_hashed = hash_password(new_password)
+    new_hashed = await cpu_executor.run(hash_password, new_password)
     await cursor.execute(
         "UPDATE users SET password = %s, isfirstlogin = %s, updatedat = CURRENT_TIMESTAMP WHERE id = %s",
         (new_hashed, 0, user["id"]),
@@ -189,6 +201,8 @@ async def change_password_first_login(request: Request, cursor = Depends(get_cur
     except Exception:
         logger.exception("[auth] Commit failed during change_password_first_login")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Database commit failed")
+    # isfirstlogin is part of the cached principal
+    invalidate_principals(user["id"])
 
     return {"status": "ok"}
 
@@ -208,22 +222,17 @@ async def logout(request: Request, token: Optional[str] = Depends(oauth2_scheme)
         exp: Optional[int] = payload.get("exp")
         expires_dt = datetime.fromtimestamp(exp, tz=timezone.utc) if exp else datetime.now(timezone.utc)
 
-        # Ideally, schemas are created at startup or migration, not here.
-        await cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS revoked_tokens (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                jti VARCHAR(36),
-                token TEXT,
-                expires DATETIME,
-                INDEX idx_jti (jti)
-            ) ENGINE=InnoDB;
-            """
-        )
-        await cursor.execute(
-            "INSERT INTO revoked_tokens (jti, token, expires) VALUES (%s, %s, %s)",
-            (jti, token if not jti else None, expires_dt.replace(tzinfo=None)),
-        )
+        if not jti:
+            # Revocations are checked by jti only: there is nothing to store for this token
+            logger.warning("[auth] Logout with a token without jti, not revoked")
+            return {"status": "ok"}
+
+        # Table is created at startup (lifespan)
+        # Rejected by this worker from now on; other workers pick it up on their next refresh
+        await revoke_token(cursor, jti, expires_dt)
+        if token_claims(payload) is not None:
+            # Self-contained tokens are checked by generation: this ends all of the user's sessions
+            await bump_token_generations(cursor, [payload["sub"]])
         
         # Auto-commit dependent
         try:
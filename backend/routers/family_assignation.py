@@ -3,13 +3,15 @@ from typing import List
 import logging
 
 from dependencies import get_cursor, get_current_user, has_role
+from query_budget import query_budget
+from id_allocator import next_ids
 from models import FamilyAssignationBulkCreate
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.post("/family-assignations/bulk")
+@router.post("/family-assignations/bulk", dependencies=[Depends(query_budget(500))])
 async def assign_family_bulk(
     body: FamilyAssignationBulkCreate,
     cursor=Depends(get_cursor),
@@ -44,22 +46,13 @@ async def assign_family_bulk(
     if not to_insert:
         return {"count": 0}
 
-    # Compute next ids since table id is not AUTO_INCREMENT in schema
-    await cursor.execute(
-        "SELECT COALESCE(MAX(id), 0) AS max_id FROM family_assignation"
-    )
-    row_max = await cursor.fetchone() or {"max_id": 0}
-    next_id = int(row_max.get("max_id") or 0) + 1
-
+    # Table id is not AUTO_INCREMENT in schema: ids come from the allocator
+    fa_ids = await next_ids("family_assignation", len(to_insert))
     insert_sql = "INSERT INTO family_assignation (id, users_assigned_id, users_responsable_id) VALUES (%s, %s, %s)"
-    data = []
-    for uid in to_insert:
-        data.append((next_id, uid, body.responsable_id))
-        next_id += 1
+    data = [(fa_id, uid, body.responsable_id) for fa_id, uid in zip(fa_ids, to_insert)]
 
     try:
-        await cursor.executemany(insert_sql, data)
-        await cursor.commit()
+        await cursor.execute_many_and_commit(insert_sql, data)
     except Exception:
         # Likely constraint issues
         raise HTTPException(
@@ -70,7 +63,7 @@ async def assign_family_bulk(
     return {"count": len(to_insert)}
 
 
-@router.post("/family-assignations/bulk-delete")
+@router.post("/family-assignations/bulk-delete", dependencies=[Depends(query_budget(500))])
 async def remove_family_bulk(
     body: FamilyAssignationBulkCreate,
     cursor=Depends(get_cursor),
@@ -171,7 +164,7 @@ async def list_members_by_responsable(
     return rows
 
 
-@router.post("/family-assignations/copy")
+@router.post("/family-assignations/copy", dependencies=[Depends(query_budget(500))])
 async def copy_family_assignations(
     body: dict,
     cursor=Depends(get_cursor),
@@ -245,12 +238,12 @@ async def copy_family_assignations(
         f"[family-assignations/copy] Copying {len(to_insert)} assignments from responsable {from_id} to {to_id}"
     )
     # insert missing assignments
-    insert_sql = "INSERT INTO family_assignation (users_assigned_id, users_responsable_id) VALUES (%s, %s)"
-    data = [(uid, to_id) for uid in to_insert]
+    fa_ids = await next_ids("family_assignation", len(to_insert))
+    insert_sql = "INSERT INTO family_assignation (id, users_assigned_id, users_responsable_id) VALUES (%s, %s, %s)"
+    data = [(fa_id, uid, to_id) for fa_id, uid in zip(fa_ids, to_insert)]
 
     try:
-        await cursor.executemany(insert_sql, data)
-        await cursor.commit()
+        await cursor.execute_many_and_commit(insert_sql, data)
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -264,7 +257,7 @@ async def copy_family_assignations(
     }
 
 
-@router.post("/family-assignations/transfer")
+@router.post("/family-assignations/transfer", dependencies=[Depends(query_budget(500))])
 async def transfer_family_assignations(
     body: dict,
     cursor=Depends(get_cursor),
@@ -329,16 +322,9 @@ async def transfer_family_assignations(
 
     try:
         if to_insert:
-            await cursor.execute(
-                "SELECT COALESCE(MAX(id), 0) AS max_id FROM family_assignation"
-            )
-            row_max = await cursor.fetchone() or {"max_id": 0}
-            next_id = int(row_max.get("max_id") or 0) + 1
+            fa_ids = await next_ids("family_assignation", len(to_insert))
             insert_sql = "INSERT INTO family_assignation (id, users_assigned_id, users_responsable_id) VALUES (%s, %s, %s)"
-            data = []
-            for uid in to_insert:
-                data.append((next_id, uid, to_id))
-                next_id += 1
+            data = [(fa_id, uid, to_id) for fa_id, uid in zip(fa_ids, to_insert)]
             await cursor.executemany(insert_sql, data)
 
         # delete all assignments from source for these users (or delete all for from_id)
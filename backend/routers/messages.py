@@ -3,6 +3,7 @@ from typing import List, Optional
 from datetime import datetime
 import httpx
 from dependencies import get_cursor, get_current_user
+from id_allocator import next_ids
 from models import Message, MessageCreate, MessageUserInfo
 from settings import settings
 
@@ -166,27 +167,22 @@ async def send_message(msg: MessageCreate, cursor = Depends(get_cursor), current
         INSERT INTO messages (message, message_type, received_at)
         VALUES (%s, %s, %s)
     """, (msg.message, message_type, created_at))
-    
-    # Get the last inserted ID
-    await cursor.execute("SELECT LAST_INSERT_ID() as id")
-    res = await cursor.fetchone()
-    new_message_id = res['id']
-
-    # We need to manually generate IDs for messages_recipients because it lacks AUTO_INCREMENT in the provided schema
-    # Ideally should be fixed in DB schema. Here we do a best-effort approach:
-    # Get max id
-    await cursor.execute("SELECT MAX(id) as max_id FROM messages_recipients")
-    row = await cursor.fetchone()
-    next_id = (row['max_id'] or 0) + 1
-
-    for dest_id in target_users_ids:
-        await cursor.execute("""
+    new_message_id = cursor.lastrowid
+
+    # One multi-row INSERT for all recipients (executemany batches INSERT ... VALUES);
+    # messages_recipients has no AUTO_INCREMENT, ids come from the allocator.
+    # The insert and the commit (of the message too) share one executor hop
+    if target_users_ids:
+        rec_ids = await next_ids("messages_recipients", len(target_users_ids))
+        await cursor.execute_many_and_commit("""
             INSERT INTO messages_recipients (id, isreaded, sender_id, receiver_id, messages_id)
             VALUES (%s, 0, %s, %s, %s)
-        """, (next_id, user_id, dest_id, new_message_id))
-        next_id += 1
-    
-    await cursor.commit()
+        """, [
+            (rec_id, user_id, dest_id, new_message_id)
+            for rec_id, dest_id in zip(rec_ids, target_users_ids)
+        ])
+    else:
+        await cursor.commit()
     return {"status": "success", "count": len(target_users_ids)}
 
 
@@ -3,7 +3,11 @@ import logging
 import mysql.connector
 
 from dependencies import get_cursor, get_current_user, has_role
+from query_budget import query_budget
+from id_allocator import next_id
 from models import Role, RoleAttributionCreate, RoleAttributionBulkCreate
+from role_cache import invalidate_roles, clear_role_cache
+from token_generations import bump_token_generations, role_holders
 
 router = APIRouter()
 logger = logging.getLogger("roles")
@@ -43,9 +47,7 @@ async def create_role(
             status_code=status.HTTP_403_FORBIDDEN, detail="Only admin can create roles"
         )
     if body.id is None:
-        await cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM roles")
-        next_id = (await cursor.fetchone())["next_id"]
-        body.id = int(next_id)
+        body.id = await next_id("roles")
     await cursor.execute(
         "INSERT INTO roles (id, role) VALUES (%s, %s)", (body.id, body.role)
     )
@@ -77,6 +79,8 @@ async def update_role(
     await cursor.execute(
         "UPDATE roles SET role = %s WHERE id = %s", (body.role, role_id)
     )
+    # Tokens carrying the old name
+    await bump_token_generations(cursor, await role_holders(cursor, role_id))
     try:
         await cursor.commit()
     except Exception:
@@ -87,6 +91,8 @@ async def update_role(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
+    # Cached role sets hold names: every holder of this role is stale
+    clear_role_cache()
     await cursor.execute("SELECT * FROM roles WHERE id = %s", (role_id,))
     role = await cursor.fetchone()
     if not role:
@@ -106,8 +112,10 @@ async def delete_role(
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Only admin can delete roles"
         )
+    holders = await role_holders(cursor, role_id)
     await cursor.execute("DELETE FROM role_attribution WHERE roles_id = %s", (role_id,))
     await cursor.execute("DELETE FROM roles WHERE id = %s", (role_id,))
+    await bump_token_generations(cursor, holders)
     try:
         await cursor.commit()
     except Exception:
@@ -118,6 +126,7 @@ async def delete_role(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
+    clear_role_cache()
     return {"status": "deleted", "id": role_id}
 
 
@@ -235,6 +244,8 @@ async def assign_role(
             "INSERT INTO role_attribution (users_id, roles_id) VALUES (%s, %s)",
             (body.users_id, body.roles_id),
         )
+        new_id = cursor.lastrowid
+        await bump_token_generations(cursor, [body.users_id])
         await cursor.commit()
     except mysql.connector.Error as e:
         # Handle duplicate key error from DB-level unique constraint
@@ -253,12 +264,12 @@ async def assign_role(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
-    new_id = cursor.lastrowid
+    invalidate_roles(body.users_id)
     await cursor.execute("SELECT * FROM role_attribution WHERE id = %s", (new_id,))
     return await cursor.fetchone()
 
 
-@router.post("/role-attributions/bulk")
+@router.post("/role-attributions/bulk", dependencies=[Depends(query_budget(500))])
 async def assign_role_bulk(
     body: RoleAttributionBulkCreate,
     cursor=Depends(get_cursor),
@@ -337,19 +348,21 @@ async def assign_role_bulk(
     insert_data = [(uid, body.roles_id) for uid in to_insert]
 
     try:
-        await cursor.executemany(insert_query, insert_data)
-        await cursor.commit()
+        # The bump commits together with the inserts
+        await bump_token_generations(cursor, to_insert)
+        await cursor.execute_many_and_commit(insert_query, insert_data)
     except Exception:
         logger.exception("[roles] Commit failed during assign_role_bulk")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
+    invalidate_roles(*to_insert)
 
     return {"count": len(to_insert)}
 
 
-@router.post("/role-attributions/bulk-delete")
+@router.post("/role-attributions/bulk-delete", dependencies=[Depends(query_budget(500))])
 async def remove_role_bulk(
     body: RoleAttributionBulkCreate,
     cursor=Depends(get_cursor),
@@ -417,6 +430,8 @@ async def remove_role_bulk(
 
     try:
         await cursor.execute(delete_query, tuple(params))
+        deleted = cursor.rowcount
+        await bump_token_generations(cursor, body.users_ids)
         await cursor.commit()
     except Exception:
         logger.exception("[roles] Commit failed during remove_role_bulk")
@@ -424,8 +439,9 @@ async def remove_role_bulk(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
+    invalidate_roles(*body.users_ids)
 
-    return {"count": cursor.rowcount}
+    return {"count": deleted}
 
 
 @router.delete("/role-attributions/{attrib_id}")
@@ -466,7 +482,12 @@ async def remove_role_attribution(
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden"
             )
+    # The user whose roles change, for the role cache
+    await cursor.execute("SELECT users_id FROM role_attribution WHERE id = %s", (attrib_id,))
+    target = await cursor.fetchone()
     await cursor.execute("DELETE FROM role_attribution WHERE id = %s", (attrib_id,))
+    if target:
+        await bump_token_generations(cursor, [target["users_id"]])
     try:
         await cursor.commit()
     except Exception:
@@ -477,6 +498,8 @@ async def remove_role_attribution(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
+    if target:
+        invalidate_roles(target["users_id"])
     return {"status": "deleted", "id": attrib_id}
 
 
@@ -517,6 +540,7 @@ async def remove_role_from_user(
         "DELETE FROM role_attribution WHERE users_id = %s AND roles_id = %s",
         (user_id, role_id),
     )
+    await bump_token_generations(cursor, [user_id])
     try:
         await cursor.commit()
     except Exception:
@@ -525,4 +549,5 @@ async def remove_role_from_user(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
+    invalidate_roles(user_id)
     return {"status": "deleted", "user_id": user_id, "role_id": role_id}
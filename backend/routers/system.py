@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, status, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 import logging
-from dependencies import get_db_connection, get_cursor, get_current_user, AsyncCursor
+from dependencies import open_cursor, get_cursor, get_admin_cursor, get_current_user, AsyncCursor, ADMIN_POOL
+from query_budget import query_budget
 from settings import settings
+from database import get_db_pool_stats
+from revocations import is_token_revoked
+from principals import load_principal
+from role_cache import clear_role_cache
+from token_generations import bump_token_generations, role_holders
 from auth_utils import hash_password
+from executors import cpu_executor
 from jose import jwt, JWTError, ExpiredSignatureError
 import asyncio
 import psutil
@@ -11,6 +19,35 @@ from datetime import datetime
 router = APIRouter()
 logger = logging.getLogger("system")
 
+@router.get("/healthz")
+async def healthz():
+    """Liveness: the process and event loop answer. Never touches the DB."""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readyz(request: Request):
+    """Readiness: pools warmed, tables ensured and users graph built (see api.lifespan)."""
+    state = request.app.state
+    db_ready = bool(getattr(state, "db_ready", False))
+    graph_ready = getattr(state, "users_graph", None) is not None
+    ready = db_ready and graph_ready and bool(getattr(state, "startup_complete", False))
+    pools = {
+        name: {k: stats.get(k) for k in ("size", "in_use", "idle", "waiting")}
+        for name, stats in get_db_pool_stats().items()
+    }
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "starting",
+            "db": db_ready,
+            "graph": graph_ready,
+            "graph_version": getattr(state, "users_graph_version", None),
+            "pools": pools,
+        },
+    )
+
+
 @router.get("/info-base")
 async def check_db(cursor = Depends(get_cursor), current_user: dict = Depends(get_current_user)):
     await cursor.execute("SELECT DATABASE();")
@@ -38,7 +75,6 @@ async def memory_ws(websocket: WebSocket):
         return
 
     # Validate token and ensure admin role
-    conn = None
     acursor: AsyncCursor | None = None
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
@@ -52,14 +88,11 @@ async def memory_ws(websocket: WebSocket):
             await websocket.close(code=4401)
             return
 
-        conn = get_db_connection()
-        acursor = AsyncCursor(conn)
+        acursor = await open_cursor(ADMIN_POOL, f"WS {websocket.url.path}")
 
-        if jti:
-            await acursor.execute("SELECT id FROM revoked_tokens WHERE jti = %s", (jti,))
-            if await acursor.fetchone():
-                await websocket.close(code=4401)
-                return
+        if await is_token_revoked(acursor, jti) or not await load_principal(acursor, user_id):
+            await websocket.close(code=4401)
+            return
 
         await acursor.execute(
             """
@@ -92,8 +125,6 @@ async def memory_ws(websocket: WebSocket):
         try:
             if acursor:
                 await acursor.close()
-            elif conn:
-                conn.close()
         except Exception:
             pass
 
@@ -175,167 +206,170 @@ async def memory_ws(websocket: WebSocket):
         except Exception:
             pass
 
-@router.get("/setup-database")
-async def setup_database(cursor = Depends(get_cursor), current_user: dict = Depends(get_current_user)):
+@router.get("/setup-database", dependencies=[Depends(query_budget(500))])
+async def setup_database(cursor = Depends(get_admin_cursor), current_user: dict = Depends(get_current_user)):
     try:
-        # Ensure transactional behavior
-        try:
-            # Disable autocommit for this transactional route
-            cursor._conn.autocommit = False
-        except Exception:
-            pass
-
-        # Insert father (ID 1)
-        sql_father = (
-            "INSERT INTO users (id, firstname, lastname, username, password, isfirstlogin) "
-            "VALUES (1, %s, %s, %s, %s, %s) "
-            "ON DUPLICATE KEY UPDATE id=id"
-        )
-        await cursor.execute(
-            sql_father,
-            (
-                "Kassa",
-                "Famille",
-                "kassa",
-                hash_password(settings.user_password_default),
-                0,
-            ),
-        )
-
-        # Insert admin (ID 2)
-        sql_admin = (
-            "INSERT INTO users (id, firstname, lastname, username, password, email, telephone, birthday, isfirstlogin, isactive) "
-            "VALUES (2, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
-            "ON DUPLICATE KEY UPDATE id=id"
-        )
-        await cursor.execute(
-            sql_admin,
-            (
-                "admin",
-                "admin",
-                settings.admin_username,
-                hash_password(settings.admin_password),
-                settings.admin_email,
-                settings.admin_telephone,
-                settings.admin_birthday,
-                0,
-                1,
-            ),
+        # Hashed off the event loop, before the transaction holds a connection
+        # (one hash per seeded user, each with its own salt)
+        admin_hash, *default_hashes = await asyncio.gather(
+            cpu_executor.run(hash_password, settings.admin_password),
+            *(cpu_executor.run(hash_password, settings.user_password_default) for _ in range(5)),
         )
 
-        children = [
-            (
-                3,
-                "Thierno Mamoudou Foulah",
-                "Barry",
-                "thierno",
-                hash_password(settings.user_password_default),
-                1,
-                0,
-            ),
-            (
-                4,
-                "Mamadou Kindy",
-                "Barry",
-                "mamadou",
-                hash_password(settings.user_password_default),
-                1,
-                0,
-            ),
-        ]
-        sql_child = (
-            "INSERT INTO users (id, firstname, lastname, username, password, id_father, isfirstlogin) "
-            "VALUES (%s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE id=id"
-        )
-        # executemany is blocking; run in threadpool
-        await asyncio.to_thread(cursor._cursor.executemany, sql_child, children)
+        # All seed rows commit together (rolled back on any failure)
+        async with cursor.transaction():
+            # Insert father (ID 1)
+            sql_father = (
+                "INSERT INTO users (id, firstname, lastname, username, password, isfirstlogin) "
+                "VALUES (1, %s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE id=id"
+            )
+            await cursor.execute(
+                sql_father,
+                (
+                    "Kassa",
+                    "Famille",
+                    "kassa",
+                    default_hashes[0],
+                    0,
+                ),
+            )
 
-        # Roles
-        await cursor.execute(
-            "INSERT INTO roles (id, role) VALUES (1, 'admin') "
-            "ON DUPLICATE KEY UPDATE role='admin'"
-        )
-        await cursor.execute(
-            "INSERT INTO roles (id, role) VALUES (2, 'user') "
-            "ON DUPLICATE KEY UPDATE role='user'"
-        )
-        await cursor.execute(
-            "INSERT INTO roles (id, role) VALUES (3, 'guest') "
-            "ON DUPLICATE KEY UPDATE role='guest'"
-        )
-        await cursor.execute(
-            "INSERT INTO roles (id, role) VALUES (4, 'norole') "
-            "ON DUPLICATE KEY UPDATE role='norole'"
-        )
-        await cursor.execute(
-            "INSERT INTO roles (id, role) VALUES (5, 'admingroup') "
-            "ON DUPLICATE KEY UPDATE role='admingroup'"
-        )
+            # Insert admin (ID 2)
+            sql_admin = (
+                "INSERT INTO users (id, firstname, lastname, username, password, email, telephone, birthday, isfirstlogin, isactive) "
+                "VALUES (2, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE id=id"
+            )
+            await cursor.execute(
+                sql_admin,
+                (
+                    "admin",
+                    "admin",
+                    settings.admin_username,
+                    admin_hash,
+                    settings.admin_email,
+                    settings.admin_telephone,
+                    settings.admin_birthday,
+                    0,
+                    1,
+                ),
+            )
 
-        # Create users for each role
-        # Guest user (ID 5)
-        sql_role_user = (
-            "INSERT INTO users (id, firstname, lastname, username, password, isfirstlogin) "
-            "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE id=id"
-        )
-        await cursor.execute(
-            sql_role_user,
-            (
-                5,
-                "Guest",
-                "User",
-                "guest",
-                hash_password(settings.user_password_default),
-                0,
-            ),
-        )
-        # Norole user (ID 6)
-        await cursor.execute(
-            sql_role_user,
-            (
-                6,
-                "No",
-                "Role",
-                "norole",
-                hash_password(settings.user_password_default),
-                0,
-            ),
-        )
+            children = [
+                (
+                    3,
+                    "Thierno Mamoudou Foulah",
+                    "Barry",
+                    "thierno",
+                    default_hashes[1],
+                    1,
+                    0,
+                ),
+                (
+                    4,
+                    "Mamadou Kindy",
+                    "Barry",
+                    "mamadou",
+                    default_hashes[2],
+                    1,
+                    0,
+                ),
+            ]
+            sql_child = (
+                "INSERT INTO users (id, firstname, lastname, username, password, id_father, isfirstlogin) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE id=id"
+            )
+            await cursor.executemany(sql_child, children)
 
-        # Role assignments
-        # Admin gets everything
-        for rid in (1, 2, 3):
+            # Roles
+            await cursor.execute(
+                "INSERT INTO roles (id, role) VALUES (1, 'admin') "
+                "ON DUPLICATE KEY UPDATE role='admin'"
+            )
+            await cursor.execute(
+                "INSERT INTO roles (id, role) VALUES (2, 'user') "
+                "ON DUPLICATE KEY UPDATE role='user'"
+            )
             await cursor.execute(
-                "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (2, %s)",
-                (rid,),
+                "INSERT INTO roles (id, role) VALUES (3, 'guest') "
+                "ON DUPLICATE KEY UPDATE role='guest'"
+            )
+            await cursor.execute(
+                "INSERT INTO roles (id, role) VALUES (4, 'norole') "
+                "ON DUPLICATE KEY UPDATE role='norole'"
+            )
+            await cursor.execute(
+                "INSERT INTO roles (id, role) VALUES (5, 'admingroup') "
+                "ON DUPLICATE KEY UPDATE role='admingroup'"
             )
 
-        # No user add norole for kassa, father and mother
-        for uid in (1, 3, 4):
+            # Create users for each role
+            # Guest user (ID 5)
+            sql_role_user = (
+                "INSERT INTO users (id, firstname, lastname, username, password, isfirstlogin) "
+                "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE id=id"
+            )
+            await cursor.execute(
+                sql_role_user,
+                (
+                    5,
+                    "Guest",
+                    "User",
+                    "guest",
+                    default_hashes[3],
+                    0,
+                ),
+            )
+            # Norole user (ID 6)
             await cursor.execute(
-                "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (%s, 4)",
-                (uid,),
+                sql_role_user,
+                (
+                    6,
+                    "No",
+                    "Role",
+                    "norole",
+                    default_hashes[4],
+                    0,
+                ),
             )
 
-        # Guest gets guest role
-        await cursor.execute(
-            "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (5, 3)"
-        )
+            # Role assignments
+            # Admin gets everything
+            for rid in (1, 2, 3):
+                await cursor.execute(
+                    "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (2, %s)",
+                    (rid,),
+                )
 
-        # Norole gets norole role
-        await cursor.execute(
-            "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (6, 4)"
-        )
+            # No user add norole for kassa, father and mother
+            for uid in (1, 3, 4):
+                await cursor.execute(
+                    "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (%s, 4)",
+                    (uid,),
+                )
 
-        await cursor.commit()
+            # Guest gets guest role
+            await cursor.execute(
+                "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (5, 3)"
+            )
+
+            # Norole gets norole role
+            await cursor.execute(
+                "INSERT IGNORE INTO role_attribution (users_id, roles_id) VALUES (6, 4)"
+            )
+
+            # Seeded roles may have been renamed back and users given roles:
+            # end the self-contained tokens that name the old ones
+            holders = []
+            for rid in (1, 2, 3, 4, 5):
+                holders += await role_holders(cursor, rid)
+            await bump_token_generations(cursor, holders)
+        clear_role_cache()
 
         return {"status": "Success", "message": "Ensure initial data exists"}
     
     except Exception as e:
-        try:
-            await cursor.rollback()
-        except Exception:
-            pass
         logger.exception("[system] setup_database failed")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
     finally:
@@ -13,11 +13,16 @@ from pydantic import BaseModel, field_validator
 from typing import Optional, List
 from datetime import datetime
 import logging
-from dependencies import get_cursor, get_current_user, has_role, get_user_roles
+from dependencies import get_cursor, get_read_cursor, get_current_user, has_role, get_user_roles, db_deadline, gather_queries
+from query_budget import query_budget
+from identity_map import load_row, load_rows
+from streaming import stream_json_array
 from settings import settings
 from aws_file import AwsFile
+from executors import blob_executor
 import uuid
 from utils import send_notification
+from id_allocator import next_id
 
 
 router = APIRouter()
@@ -424,10 +429,10 @@ async def update_payment_method(
 # -----------------------------
 
 
-@router.get("/transactions")
+@router.get("/transactions", dependencies=[Depends(db_deadline(10))])
 async def list_transactions(
     request: Request,
-    cursor=Depends(get_cursor),
+    cursor=Depends(get_read_cursor),
     current_user: dict = Depends(get_current_user),
 ):
     """List transactions with optional filters via query params."""
@@ -478,56 +483,59 @@ async def list_transactions(
             vals.append(current_user["id"])
 
     clause = ("WHERE " + " AND ".join(where)) if where else ""
+    # Approvals are joined in (one row per approval) so the list streams in a single
+    # pass; rows of a transaction are adjacent thanks to the t.id tie-breaker
     sql = f"""
         SELECT t.*, 
             u.username AS user_username, u.firstname AS user_firstname, u.lastname AS user_lastname, u.image_url AS user_image_url,
             rb.username AS recorded_by_username, rb.firstname AS recorded_by_firstname, rb.lastname AS recorded_by_lastname,
-            pm.name AS payment_method_name, pm.type_of_proof AS payment_method_type_of_proof, pm.account_number AS payment_method_account_number
+            pm.name AS payment_method_name, pm.type_of_proof AS payment_method_type_of_proof, pm.account_number AS payment_method_account_number,
+            ta.id AS ta_id, ta.role_at_approval AS ta_role_at_approval, ta.approved_at AS ta_approved_at, ta.note AS ta_note,
+            ta.transactions_id AS ta_transactions_id, ta.users_id AS ta_users_id,
+            au.username AS ta_approved_by_username, au.firstname AS ta_approved_by_firstname, au.lastname AS ta_approved_by_lastname
         FROM transactions t
         JOIN users u ON u.id = t.users_id
         JOIN users rb ON rb.id = t.recorded_by_id
         JOIN payment_methods pm ON pm.id = t.payment_methods_id
+        LEFT JOIN transaction_approvals ta ON ta.transactions_id = t.id
+        LEFT JOIN users au ON au.id = ta.users_id
         {clause}
-        ORDER BY t.created_at DESC
+        ORDER BY t.created_at DESC, t.id DESC, ta.approved_at ASC
     """
-    await cursor.execute(sql, tuple(vals))
-    transactions = await cursor.fetchall()
+    return await stream_json_array(_group_transaction_rows(cursor.stream(sql, tuple(vals), records=True)))
+
+
+_APPROVAL_COLUMNS = (
+    "id",
+    "role_at_approval",
+    "approved_at",
+    "note",
+    "transactions_id",
+    "users_id",
+    "approved_by_username",
+    "approved_by_firstname",
+    "approved_by_lastname",
+)
 
-    if transactions:
-        # Fetch approvals for these transactions
-        tx_ids = [t["id"] for t in transactions]
-        # Depending on list size, IN clause might optionally need chunking, but for now assuming reasonable page size
-        format_strings = ",".join(["%s"] * len(tx_ids))
-        await cursor.execute(
-            f"""
-            SELECT ta.*, u.username as approved_by_username, u.firstname as approved_by_firstname, u.lastname as approved_by_lastname
-            FROM transaction_approvals ta
-            JOIN users u ON u.id = ta.users_id
-            WHERE ta.transactions_id IN ({format_strings})
-            ORDER BY ta.approved_at ASC
-            """,
-            tuple(tx_ids),
-        )
-        all_approvals = await cursor.fetchall()
-
-        # Map approvals to transactions
-        approval_map = {}
-        for app in all_approvals:
-            tid = app["transactions_id"]
-            if tid not in approval_map:
-                approval_map[tid] = []
-            approval_map[tid].append(app)
-
-        for tx in transactions:
-            tx["approvals"] = approval_map.get(tx["id"], [])
+
+async def _group_transaction_rows(rows):
+    tx = None
+    async for row in rows:
+        if tx is None or row["id"] != tx["id"]:
+            if tx is not None:
+                yield tx
+            tx = {k: v for k, v in row.items() if not k.startswith("ta_")}
+            tx["approvals"] = []
             # Add account_number for Orange money or Virement bancaire
-            pm_name = tx.get("payment_method_name", "").lower()
+            pm_name = (tx.get("payment_method_name") or "").lower()
             if pm_name in ["orange money", "virement bancaire"]:
                 tx["account_number"] = tx.get("payment_method_account_number")
             else:
                 tx["account_number"] = None
-
-    return transactions
+        if row.get("ta_id") is not None:
+            tx["approvals"].append({c: row.get(f"ta_{c}") for c in _APPROVAL_COLUMNS})
+    if tx is not None:
+        yield tx
 
 
 @router.post("/transactions")
@@ -670,8 +678,7 @@ async def create_transaction(
         except Exception:
             logger.exception("[transactions] Commit failed during create_transaction")
             raise HTTPException(status_code=500, detail="Database commit failed")
-        await cursor.execute("SELECT * FROM transactions WHERE id = %s", (new_id,))
-        return await cursor.fetchone()
+        return await load_row(cursor, "transactions", new_id)
 
 
 @router.post("/transactions/proof-upload")
@@ -682,8 +689,9 @@ async def upload_transaction_proof(
     current_user: dict = Depends(get_current_user),
 ):
     """Upload an image proof to S3 under the 'transactions' folder.
-    The file will be named using the next id from `transactions`:
-    `transaction_{next_id}` to ensure the image name matches the eventual transaction id.
+    The proof of an existing transaction (`tx_id`) is named `transaction_{tx_id}`; one
+    uploaded before its transaction exists gets a unique `transaction_proof_{n}` from
+    the id allocator (the transaction stores the URL, so names need not match ids).
     Returns the public URL and the S3 key.
     """
     # Require elevated role to upload proofs (same as creating transactions)
@@ -700,19 +708,12 @@ async def upload_transaction_proof(
     if tx_id:
         filename = f"transaction_{tx_id}"
     else:
-        # Determine next id from transactions for deterministic file naming
-        await cursor.execute("SELECT IFNULL(MAX(id), 0) + 1 AS next_id FROM transactions")
-        row = await cursor.fetchone()
-        if isinstance(row, dict):
-            next_id = int(row.get("next_id") or 1)
-        else:
-            next_id = int(row[0] if row and len(row) > 0 else 1)
-        filename = f"transaction_{next_id}"
+        # Own prefix: never overwrites the proof of an existing transaction_{id}
+        filename = f"transaction_proof_{await next_id('transaction_proofs')}"
 
     aws = AwsFile(settings)
     try:
-        # Determine filename: transactions/transaction_{next_id}
-        result = aws.add_image(file, folder="transactions", filename=filename)
+        result = await blob_executor.run(aws.add_image, file, folder="transactions", filename=filename)
         return {"url": result.get("url"), "key": result.get("key")}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -734,7 +735,7 @@ async def delete_transaction_proof(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
     aws = AwsFile(settings)
-    ok = aws.delete_image(url)
+    ok = await blob_executor.run(aws.delete_image, url)
     if not ok:
         raise HTTPException(status_code=400, detail="Delete failed")
     return {"status": "deleted"}
@@ -770,8 +771,7 @@ async def set_transaction_proof(
     except Exception:
         logger.exception("[transactions] Commit failed during set_transaction_proof")
         raise HTTPException(status_code=500, detail="Database commit failed")
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    return await cursor.fetchone()
+    return await load_row(cursor, "transactions", tx_id)
 
 
 @router.patch("/transactions/{tx_id}")
@@ -789,8 +789,7 @@ async def update_transaction(
     Member (users_id) cannot be changed via this endpoint.
     """
     # Fetch transaction
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    tx = await cursor.fetchone()
+    tx = await load_row(cursor, "transactions", tx_id)
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
@@ -860,8 +859,7 @@ async def update_transaction(
 
     if not [f for f in fields if not f.startswith("updated_")]:
         # Nothing to update besides metadata
-        await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-        return await cursor.fetchone()
+        return await load_row(cursor, "transactions", tx_id)
 
     sql = f"UPDATE transactions SET {', '.join(fields)} WHERE id = %s"
     vals.append(tx_id)
@@ -872,8 +870,7 @@ async def update_transaction(
         logger.exception("[transactions] Commit failed during update_transaction")
         raise HTTPException(status_code=500, detail="Database commit failed")
 
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    return await cursor.fetchone()
+    return await load_row(cursor, "transactions", tx_id)
 
 
 @router.patch("/transactions/{tx_id}/status")
@@ -887,8 +884,7 @@ async def update_transaction_status(
     if not await has_role(cursor, current_user["id"], "treasury"):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
 
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    if not await cursor.fetchone():
+    if not await load_row(cursor, "transactions", tx_id):
         raise HTTPException(status_code=404, detail="Transaction not found")
 
     fields = ["status = %s", "updated_by = %s", "updated_at = %s"]
@@ -918,8 +914,7 @@ async def update_transaction_status(
         except Exception as e:
             logger.warning(f"Failed to notify validation: {e}")
 
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    return await cursor.fetchone()
+    return await load_row(cursor, "transactions", tx_id)
 
 
 @router.get("/transactions/{tx_id}")
@@ -929,8 +924,11 @@ async def get_transaction_by_id(
     current_user: dict = Depends(get_current_user),
 ):
     """Fetch a single transaction by id."""
-    await cursor.execute(
-        """
+    # The transaction and the caller's roles do not depend on each other: read them concurrently
+    tx, roles = await gather_queries(
+        cursor,
+        lambda c: c.fetch_one(
+            """
 		SELECT t.*, u.username AS user_username, rb.username AS recorded_by_username,
 			pm.name AS payment_method_name, u.firstname AS user_firstname, u.lastname AS user_lastname
 		FROM transactions t
@@ -939,13 +937,14 @@ async def get_transaction_by_id(
 		JOIN payment_methods pm ON pm.id = t.payment_methods_id
 		WHERE t.id = %s
 		""",
-        (tx_id,),
+            (tx_id,),
+        ),
+        lambda c: get_user_roles(c, current_user["id"]),
     )
-    tx = await cursor.fetchone()
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
     # Role-based access: admin/treasury any; admingroup only for assigned users (or self); members only self
-    roles = await get_user_roles(cursor, current_user["id"]) or []
+    roles = roles or []
     lowered = [r.lower() for r in roles]
     is_admin = "admin" in lowered
     is_treasury = "treasury" in lowered
@@ -979,8 +978,7 @@ async def submit_transaction(
     current_user: dict = Depends(get_current_user),
 ):
     """Submit a SAVED transaction. Changes status to PENDING and issubmitted to 1."""
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    tx = await cursor.fetchone()
+    tx = await load_row(cursor, "transactions", tx_id)
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
@@ -1041,8 +1039,7 @@ async def submit_transaction(
         logger.exception("[transactions] Commit failed during submit_transaction")
         raise HTTPException(status_code=500, detail="Database commit failed")
 
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    return await cursor.fetchone()
+    return await load_row(cursor, "transactions", tx_id)
 
 
 @router.post("/transactions/{tx_id}/reject")
@@ -1053,8 +1050,7 @@ async def reject_transaction(
     current_user: dict = Depends(get_current_user),
 ):
     """Reject a transaction."""
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    tx = await cursor.fetchone()
+    tx = await load_row(cursor, "transactions", tx_id)
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
@@ -1098,11 +1094,10 @@ async def reject_transaction(
     )
     await cursor.commit()
     
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    return await cursor.fetchone()
+    return await load_row(cursor, "transactions", tx_id)
 
 
-@router.post("/transactions/bulk-submit")
+@router.post("/transactions/bulk-submit", dependencies=[Depends(query_budget(500))])
 async def bulk_submit_transactions(
     body: TransactionBulkSubmit,
     cursor=Depends(get_cursor),
@@ -1144,7 +1139,7 @@ async def bulk_submit_transactions(
     return {"count": len(valid_ids)}
 
 
-@router.post("/transactions/bulk-approve")
+@router.post("/transactions/bulk-approve", dependencies=[Depends(query_budget(500))])
 async def bulk_approve_transactions(
     body: TransactionBulkApprove,
     cursor=Depends(get_cursor),
@@ -1172,73 +1167,94 @@ async def bulk_approve_transactions(
     row_board = await cursor.fetchone()
     total_board = row_board["total"] if row_board else 0
 
-    for tx_id in ids:
-        # Fetch tx
-        await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-        tx = await cursor.fetchone()
-        if not tx: continue
+    # One query for the whole batch; the loop reads from the identity map
+    ids = list(dict.fromkeys(ids))
+    await load_rows(cursor, "transactions", ids)
+
+    # All approvals of the batch are one unit of work, with a fixed number of
+    # statements whatever the batch size (no per-transaction queries)
+    async with cursor.transaction():
+        placeholders = ",".join(["%s"] * len(ids))
+        await cursor.execute(
+            f"""
+            SELECT transactions_id, COUNT(DISTINCT users_id) AS cnt, SUM(users_id = %s) AS mine
+            FROM transaction_approvals
+            WHERE transactions_id IN ({placeholders})
+            GROUP BY transactions_id
+            """,
+            (current_user["id"], *ids),
+        )
+        approvals = {int(r["transactions_id"]): r for r in (await cursor.fetchall() or [])}
+
+        now = datetime.now()
+        approval_rows = []
+        partial_ids = []
+        for tx_id in ids:
+            # Fetch tx
+            tx = await load_row(cursor, "transactions", tx_id)
+            if not tx: continue
         
-        if tx["status"] not in ("PENDING", "PARTIALLY_APPROVED"): continue
+            if tx["status"] not in ("PENDING", "PARTIALLY_APPROVED"): continue
         
-        tx_type = (tx["transaction_type"] or "").upper()
+            tx_type = (tx["transaction_type"] or "").upper()
         
-        # Access control
-        rec_role = None
-        allowed = False
-        if tx_type == "EXPENSE":
-            if "board" in user_roles: rec_role, allowed = "board", True
-            elif "admin" in user_roles: rec_role, allowed = "admin", True
-        elif tx_type in ("CONTRIBUTION", "DONATIONS"):
-            if "treasury" in user_roles: rec_role, allowed = "treasury", True
-            elif "admin" in user_roles: rec_role, allowed = "admin", True
-        else:
-            if "admin" in user_roles: rec_role = "admin", True
+            # Access control
+            rec_role = None
+            allowed = False
+            if tx_type == "EXPENSE":
+                if "board" in user_roles: rec_role, allowed = "board", True
+                elif "admin" in user_roles: rec_role, allowed = "admin", True
+            elif tx_type in ("CONTRIBUTION", "DONATIONS"):
+                if "treasury" in user_roles: rec_role, allowed = "treasury", True
+                elif "admin" in user_roles: rec_role, allowed = "admin", True
+            else:
+                if "admin" in user_roles: rec_role = "admin", True
         
-        if not allowed or not rec_role: continue
+            if not allowed or not rec_role: continue
 
-        # Duplicate check
-        await cursor.execute("SELECT 1 FROM transaction_approvals WHERE transactions_id = %s AND users_id = %s", (tx_id, current_user["id"]))
-        if await cursor.fetchone(): continue
+            # Duplicate check
+            existing = approvals.get(int(tx_id))
+            if existing and existing["mine"]: continue
         
-        # Insert approval
-        now = datetime.now()
-        await cursor.execute(
-            """INSERT INTO transaction_approvals (role_at_approval, approved_at, note, transactions_id, users_id)
-               VALUES (%s, %s, %s, %s, %s)""",
-            (rec_role, now, body.note, tx_id, current_user["id"])
-        )
-        processed_count += 1
+            approval_rows.append((rec_role, now, body.note, tx_id, current_user["id"]))
+            processed_count += 1
         
-        # Check threshold
-        await cursor.execute(
-            "SELECT COUNT(DISTINCT users_id) as cnt FROM transaction_approvals WHERE transactions_id = %s",
-            (tx_id,),
-        )
-        row = await cursor.fetchone()
-        cnt = row["cnt"] if row else 0
+            # Check threshold (distinct approvers, including this one)
+            cnt = (int(existing["cnt"]) if existing else 0) + 1
 
-        validated = False
+            validated = False
 
-        if tx_type == "EXPENSE":
-            if total_board > 0 and cnt >= total_board:
-                validated = True
-        elif tx_type in ("CONTRIBUTION", "DONATIONS"):
-            if cnt >= 2:
-                validated = True
+            if tx_type == "EXPENSE":
+                if total_board > 0 and cnt >= total_board:
+                    validated = True
+            elif tx_type in ("CONTRIBUTION", "DONATIONS"):
+                if cnt >= 2:
+                    validated = True
 
-        if validated:
+            if validated:
+                validated_ids.append(tx_id)
+            else:
+                partial_ids.append(tx_id)
+
+        if approval_rows:
+            await cursor.executemany(
+                """INSERT INTO transaction_approvals (role_at_approval, approved_at, note, transactions_id, users_id)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                approval_rows,
+            )
+        if validated_ids:
             await cursor.execute(
-                "UPDATE transactions SET status = %s, validated_at = %s, updated_by = %s, updated_at = %s WHERE id = %s",
-                ("VALIDATED", now, current_user["id"], now, tx_id),
+                f"UPDATE transactions SET status = %s, validated_at = %s, updated_by = %s, updated_at = %s "
+                f"WHERE id IN ({','.join(['%s'] * len(validated_ids))})",
+                ("VALIDATED", now, current_user["id"], now, *validated_ids),
             )
-            validated_ids.append(tx_id)
-        else:
+        if partial_ids:
             await cursor.execute(
-                "UPDATE transactions SET status = %s, updated_by = %s, updated_at = %s WHERE id = %s",
-                ("PARTIALLY_APPROVED", current_user["id"], now, tx_id),
+                f"UPDATE transactions SET status = %s, updated_by = %s, updated_at = %s "
+                f"WHERE id IN ({','.join(['%s'] * len(partial_ids))})",
+                ("PARTIALLY_APPROVED", current_user["id"], now, *partial_ids),
             )
         
-    await cursor.commit()
     
     if validated_ids:
         try:
@@ -1324,7 +1340,7 @@ async def delete_transaction(
     ):
         try:
             aws = AwsFile(settings)
-            aws.delete_image(proof_ref)
+            await blob_executor.run(aws.delete_image, proof_ref)
         except Exception:
             logger.warning(
                 f"Failed to delete proof image for transaction {tx_id}", exc_info=True
@@ -1370,8 +1386,7 @@ async def approve_transaction(
     - Contribution/Donations: Treasury (or Admin) can approve. Validation requires 2 approvals.
     - Expense: Board (or Admin) can approve. Validation requires ALL board members.
     """
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
-    tx = await cursor.fetchone()
+    tx = await load_row(cursor, "transactions", tx_id)
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
@@ -1438,59 +1453,62 @@ async def approve_transaction(
             status_code=409, detail="You have already approved this transaction"
         )
 
-    now = datetime.now()
-    await cursor.execute(
-        """
-		INSERT INTO transaction_approvals (role_at_approval, approved_at, note, transactions_id, users_id)
-		VALUES (%s, %s, %s, %s, %s)
-		""",
-        (rec_role, now, body.note, tx_id, current_user["id"]),
-    )
-
-    # 3. Check Validation Threshold
-    await cursor.execute(
-        "SELECT COUNT(DISTINCT users_id) as cnt FROM transaction_approvals WHERE transactions_id = %s",
-        (tx_id,),
-    )
-    row = await cursor.fetchone()
-    cnt = row["cnt"] if row else 0
-
-    validated = False
-
-    if tx_type == "EXPENSE":
-        # "tous les membres du conseils d'administration"
-        await cursor.execute(
-            """
-            SELECT COUNT(DISTINCT ra.users_id) as total 
-            FROM role_attribution ra 
-            JOIN roles r ON ra.roles_id = r.id
-            WHERE r.role = 'board'
-        """
-        )
-        row_board = await cursor.fetchone()
-        total_board = row_board["total"] if row_board else 0
+    # Approval row and status update commit together
+    try:
+        async with cursor.transaction():
+            now = datetime.now()
+            await cursor.execute(
+                """
+        		INSERT INTO transaction_approvals (role_at_approval, approved_at, note, transactions_id, users_id)
+        		VALUES (%s, %s, %s, %s, %s)
+        		""",
+                (rec_role, now, body.note, tx_id, current_user["id"]),
+            )
 
-        if total_board > 0 and cnt >= total_board:
-            validated = True
+            # 3. Check Validation Threshold
+            await cursor.execute(
+                "SELECT COUNT(DISTINCT users_id) as cnt FROM transaction_approvals WHERE transactions_id = %s",
+                (tx_id,),
+            )
+            row = await cursor.fetchone()
+            cnt = row["cnt"] if row else 0
+
+            validated = False
+
+            if tx_type == "EXPENSE":
+                # "tous les membres du conseils d'administration"
+                await cursor.execute(
+                    """
+                    SELECT COUNT(DISTINCT ra.users_id) as total 
+                    FROM role_attribution ra 
+                    JOIN roles r ON ra.roles_id = r.id
+                    WHERE r.role = 'board'
+                """
+                )
+                row_board = await cursor.fetchone()
+                total_board = row_board["total"] if row_board else 0
 
-    elif tx_type in ("CONTRIBUTION", "DONATIONS"):
-        # "c'est deux personnes"
-        if cnt >= 2:
-            validated = True
+                if total_board > 0 and cnt >= total_board:
+                    validated = True
 
-    if validated:
-        await cursor.execute(
-            "UPDATE transactions SET status = %s, validated_at = %s, updated_by = %s, updated_at = %s WHERE id = %s",
-            ("VALIDATED", now, current_user["id"], now, tx_id),
-        )
-    else:
-        await cursor.execute(
-            "UPDATE transactions SET status = %s, updated_by = %s, updated_at = %s WHERE id = %s",
-            ("PARTIALLY_APPROVED", current_user["id"], now, tx_id),
-        )
+            elif tx_type in ("CONTRIBUTION", "DONATIONS"):
+                # "c'est deux personnes"
+                if cnt >= 2:
+                    validated = True
 
-    try:
-        await cursor.commit()
+            if validated:
+                await cursor.execute(
+                    "UPDATE transactions SET status = %s, validated_at = %s, updated_by = %s, updated_at = %s WHERE id = %s",
+                    ("VALIDATED", now, current_user["id"], now, tx_id),
+                )
+            else:
+                await cursor.execute(
+                    "UPDATE transactions SET status = %s, updated_by = %s, updated_at = %s WHERE id = %s",
+                    ("PARTIALLY_APPROVED", current_user["id"], now, tx_id),
+                )
+    except HTTPException:
+        # e.g. 504 once the request's DB deadline is exceeded; the block rolled back
+        raise
     except Exception:
         logger.exception("[transactions] Commit failed during approve_transaction")
         raise HTTPException(status_code=500, detail="Database commit failed")
@@ -1501,8 +1519,7 @@ async def approve_transaction(
         except Exception as e:
             logger.warning(f"Failed to notify validation: {e}")
 
-    await cursor.execute("SELECT * FROM transactions WHERE id = %s", (tx_id,))
     return {
-        "transaction": await cursor.fetchone(),
+        "transaction": await load_row(cursor, "transactions", tx_id),
         "approver_role": rec_role,
     }
@@ -3,9 +3,14 @@ from typing import List
 import logging
 import re
 from datetime import datetime
-import asyncio
 
-from dependencies import get_cursor, get_current_user, has_role
+from dependencies import get_cursor, get_read_cursor, get_current_user, has_role, get_user_roles, db_deadline
+from query_budget import query_budget
+from identity_map import load_row, load_rows
+from id_allocator import next_ids
+from principals import invalidate_principals
+from role_cache import invalidate_roles
+from streaming import stream_json_array
 from models import UserCreate, UserAdminUpdate, UserUpdate, UserBulkTierUpdate, UserSchema
 from utils import (
     parse_create_request,
@@ -20,6 +25,7 @@ from utils import (
 from auth_utils import hash_password
 from settings import settings
 from aws_file import AwsFile
+from executors import blob_executor, cpu_executor
 
 
 router = APIRouter()
@@ -55,8 +61,7 @@ async def get_user_by_id(
     cursor=Depends(get_cursor),
     current_user: dict = Depends(get_current_user),
 ):
-    await cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-    user = await cursor.fetchone()
+    user = await load_row(cursor, "users", user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -90,16 +95,17 @@ async def get_user_by_id(
     return user
 
 
-@router.get("/users")
+@router.get("/users", dependencies=[Depends(db_deadline(10))])
 async def get_members(
     request: Request,
-    cursor=Depends(get_cursor),
+    cursor=Depends(get_read_cursor),
     current_user: dict = Depends(get_current_user),
 ):
     # Admin and treasury see all; group admin sees only assigned users via family_assignation (plus themselves)
-    is_admin = await has_role(cursor, current_user["id"], "admin")
-    is_treasury = await has_role(cursor, current_user["id"], "treasury")
-    is_group_admin = await has_role(cursor, current_user["id"], "admingroup")
+    roles = await get_user_roles(cursor, current_user["id"])
+    is_admin = "admin" in roles
+    is_treasury = "treasury" in roles
+    is_group_admin = "admingroup" in roles
 
     # Query filters: status (active/inactive/all), first_login (yes/no/all), q (search)
     qp = request.query_params
@@ -181,7 +187,7 @@ async def get_members(
             ORDER BY u.id, r.id
             """
         where_clause = ("WHERE " + " AND ".join(extra_where)) if extra_where else ""
-        await cursor.execute(base_sql.format(where=where_clause), tuple(extra_vals))
+        rows = cursor.stream(base_sql.format(where=where_clause), tuple(extra_vals), records=True)
     elif is_group_admin:
         # Group admin: only users assigned to them via family_assignation, plus themselves
         base_sql = """
@@ -196,7 +202,7 @@ async def get_members(
             """
         and_extra = (" AND " + " AND ".join(extra_where)) if extra_where else ""
         vals = [current_user.get("id"), current_user.get("id")] + extra_vals
-        await cursor.execute(base_sql.format(and_extra=and_extra), tuple(vals))
+        rows = cursor.stream(base_sql.format(and_extra=and_extra), tuple(vals), records=True)
     else:
         # Regular users see only themselves
         base_sql = """
@@ -209,28 +215,33 @@ async def get_members(
             """
         and_extra = (" AND " + " AND ".join(extra_where)) if extra_where else ""
         vals = [current_user.get("id")] + extra_vals
-        await cursor.execute(base_sql.format(and_extra=and_extra), tuple(vals))
-
-    rows = await cursor.fetchall()
+        rows = cursor.stream(base_sql.format(and_extra=and_extra), tuple(vals), records=True)
 
     # Note: lineage/graph union removed for admingroup; scope now defined solely by family_assignation
-    users_by_id = {}
+    # Streamed: rows come ordered by user, so each user is complete when the id changes
+    return await stream_json_array(_group_member_rows(rows))
 
-    for row in rows:
+
+async def _group_member_rows(rows):
+    user_data = None
+    current_uid = None
+    async for row in rows:
         # Exclude super admin technically, but let's just mimic original logic
         uid = row["id"]
-        if uid not in users_by_id:
+        if uid != current_uid:
+            if user_data is not None:
+                yield user_data
             user_data = {k: v for k, v in row.items() if k != "password"}
             user_data["roles"] = []
-            users_by_id[uid] = user_data
+            current_uid = uid
 
         if row.get("role_id") is not None:
-            if not any(r["id"] == row["role_id"] for r in users_by_id[uid]["roles"]):
-                users_by_id[uid]["roles"].append(
+            if not any(r["id"] == row["role_id"] for r in user_data["roles"]):
+                user_data["roles"].append(
                     {"id": row["role_id"], "role": row["role_name"]}
                 )
-
-    return list(users_by_id.values())
+    if user_data is not None:
+        yield user_data
 
 
 @router.post("/users")
@@ -252,28 +263,24 @@ async def create_user(
 
     if not body.username or not body.username.strip():
         try:
-            # generate_username_logic is sync; run it in a thread using the raw cursor
-            body.username = await asyncio.to_thread(
-                generate_username_logic,
+            body.username = await generate_username_logic(
                 body.firstname,
                 body.lastname,
                 body.birthday,
-                cursor._cursor,
+                cursor,
             )
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     else:
         try:
-            body.username = await asyncio.to_thread(
-                ensure_unique_username, body.username, cursor._cursor
-            )
+            body.username = await ensure_unique_username(body.username, cursor)
         except ValueError as e:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
 
     if upload is not None:
         try:
             service = AwsFile(settings)
-            up_res = await asyncio.to_thread(
+            up_res = await blob_executor.run(
                 service.add_image, upload, "users", body.username
             )
             body.image_url = up_res["url"]
@@ -283,14 +290,13 @@ async def create_user(
                 detail=f"Echec d'upload image: {e}",
             )
 
-    # Validate parents
-    if body.id_father:
-        await cursor.execute("SELECT id FROM users WHERE id = %s", (body.id_father,))
-        if not await cursor.fetchone():
+    # Validate parents (both looked up in one query)
+    parent_ids = [pid for pid in (body.id_father, body.id_mother) if pid]
+    if parent_ids:
+        parents = await load_rows(cursor, "users", parent_ids)
+        if body.id_father and not parents.get(int(body.id_father)):
             body.id_father = None
-    if body.id_mother:
-        await cursor.execute("SELECT id FROM users WHERE id = %s", (body.id_mother,))
-        if not await cursor.fetchone():
+        if body.id_mother and not parents.get(int(body.id_mother)):
             body.id_mother = None
 
     if body.id_father and body.id_mother and body.id_father == body.id_mother:
@@ -313,7 +319,7 @@ async def create_user(
             if age < 18:
                 body.isactive = 0
 
-    default_hashed = hash_password(settings.user_password_default)
+    default_hashed = await cpu_executor.run(hash_password, settings.user_password_default)
     # Authorization for creation: admin anytime; group admin allowed; others forbidden
     if not await has_role(cursor, current_user["id"], "admin"):
         if not await has_role(cursor, current_user["id"], "admingroup"):
@@ -321,12 +327,8 @@ async def create_user(
                 status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden"
             )
 
-    await cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM users")
-    row_next = await cursor.fetchone()
-    next_user_id = row_next["next_id"] if isinstance(row_next, dict) else row_next[0]
-
+    # users.id is AUTO_INCREMENT: the insert assigns it
     fields = [
-        "id",
         "firstname",
         "lastname",
         "username",
@@ -350,7 +352,6 @@ async def create_user(
     clean_tel = re.sub(r"[\s-]", "", body.telephone) if body.telephone else None
 
     values = [
-        next_user_id,
         body.firstname,
         body.lastname,
         body.username,
@@ -374,128 +375,118 @@ async def create_user(
     placeholders = ", ".join(["%s"] * len(values))
     sql = f"INSERT INTO users ({', '.join(fields)}) VALUES ({placeholders})"
 
-    await cursor.execute(sql, tuple(values))
+    # One commit for the user row, its role and the group-admin assignments;
+    # the optional parts run in savepoints so their failure keeps the user
     try:
-        await cursor.commit()
-        
-    except Exception as e:
+        async with cursor.transaction():
+            await cursor.execute(sql, tuple(values))
+            new_id = cursor.lastrowid
+
+            # Handle optional role assignment on creation
+            input_role = data.get("role")
+            if input_role:
+                r_str = str(input_role).lower().strip()
+                if r_str != "norole":
+                    # Check if role exists
+                    await cursor.execute("SELECT id FROM roles WHERE role = %s", (r_str,))
+                    r_row = await cursor.fetchone()
+                    if r_row:
+                        rid = r_row["id"] if isinstance(r_row, dict) else r_row[0]
+                        # Permission check
+                        is_adm = await has_role(cursor, current_user["id"], "admin")
+                        is_grp = await has_role(cursor, current_user["id"], "admingroup")
+
+                        allowed = False
+                        if is_adm:
+                            allowed = True
+                        elif is_grp and r_str in ("admingroup", "user", "member"):
+                            allowed = True
+
+                        if allowed:
+                            try:
+                                async with cursor.transaction():
+                                    await cursor.execute(
+                                        "INSERT INTO role_attribution (users_id, roles_id) VALUES (%s, %s)",
+                                        (new_id, rid),
+                                    )
+                            except Exception:
+                                logger.error(
+                                    f"[users] Failed to assign role {r_str} to {new_id}"
+                                )
+
+            # Auto-assignments when created by a group admin
+            try:
+                if await has_role(cursor, current_user["id"], "admingroup"):
+                    assignments_to_insert = []
+
+                    # Find co-responsables (role admingroup) who share at least one assigned user with current admingroup
+                    await cursor.execute(
+                        """
+                        SELECT DISTINCT fa2.users_responsable_id AS rid
+                        FROM family_assignation fa1
+                        JOIN family_assignation fa2 ON fa1.users_assigned_id = fa2.users_assigned_id
+                        JOIN role_attribution ra ON ra.users_id = fa2.users_responsable_id
+                        JOIN roles r ON r.id = ra.roles_id
+                        WHERE fa1.users_responsable_id = %s
+                        AND fa2.users_responsable_id <> %s
+                        AND r.role = 'admingroup'
+                        """,
+                        (current_user["id"], current_user["id"]),
+                    )
+                    co_rows = await cursor.fetchall() or []
+                    co_ids = []
+                    for r in co_rows:
+                        try:
+                            rid = int(r.get("rid") if isinstance(r, dict) else r[0])
+                        except Exception:
+                            continue
+                        if rid != int(current_user["id"]):
+                            co_ids.append(rid)
+
+                    # Existing assignments of the new user, for the current admingroup
+                    # and its co-responsables alike, in one query
+                    responsables = [int(current_user["id"])] + co_ids
+                    await cursor.execute(
+                        f"""
+                        SELECT users_responsable_id FROM family_assignation
+                        WHERE users_assigned_id = %s
+                        AND users_responsable_id IN ({", ".join(["%s"] * len(responsables))})
+                        """,
+                        (new_id, *responsables),
+                    )
+                    already = {int(r["users_responsable_id"]) for r in (await cursor.fetchall() or [])}
+                    missing = [rid for rid in dict.fromkeys(responsables) if rid not in already]
+                    # family_assignation has no AUTO_INCREMENT: ids come from the allocator
+                    fa_ids = await next_ids("family_assignation", len(missing))
+                    for fa_id, rid in zip(fa_ids, missing):
+                        assignments_to_insert.append((fa_id, new_id, rid))
+
+                    if assignments_to_insert:
+                        try:
+                            async with cursor.transaction():
+                                await cursor.executemany(
+                                    "INSERT INTO family_assignation (id, users_assigned_id, users_responsable_id) VALUES (%s, %s, %s)",
+                                    assignments_to_insert,
+                                )
+                        except Exception:
+                            logger.exception(
+                                "[users] Failed to auto-assign family_assignation for new user %s",
+                                new_id,
+                            )
+            except Exception:
+                logger.exception(
+                    "[users] Unexpected error during admingroup auto-assign for new user %s",
+                    new_id,
+                )
+    except Exception:
         logger.exception("[users] Commit failed during create_user")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Database commit failed",
         )
 
-    new_id = cursor.lastrowid or next_user_id
-
-    # Handle optional role assignment on creation
-    input_role = data.get("role")
-    if input_role:
-        r_str = str(input_role).lower().strip()
-        if r_str != "norole":
-            # Check if role exists
-            await cursor.execute("SELECT id FROM roles WHERE role = %s", (r_str,))
-            r_row = await cursor.fetchone()
-            if r_row:
-                rid = r_row["id"] if isinstance(r_row, dict) else r_row[0]
-                # Permission check
-                is_adm = await has_role(cursor, current_user["id"], "admin")
-                is_grp = await has_role(cursor, current_user["id"], "admingroup")
-
-                allowed = False
-                if is_adm:
-                    allowed = True
-                elif is_grp and r_str in ("admingroup", "user", "member"):
-                    allowed = True
-
-                if allowed:
-                    try:
-                        await cursor.execute(
-                            "INSERT INTO role_attribution (users_id, roles_id) VALUES (%s, %s)",
-                            (new_id, rid),
-                        )
-                        await cursor.commit()
-                    except Exception:
-                        logger.error(
-                            f"[users] Failed to assign role {r_str} to {new_id}"
-                        )
-
-    # Auto-assignments when created by a group admin
-    try:
-        if await has_role(cursor, current_user["id"], "admingroup"):
-            assignments_to_insert = []
-
-            # Check if assignment to current admingroup already exists
-            await cursor.execute(
-                "SELECT 1 FROM family_assignation WHERE users_responsable_id = %s AND users_assigned_id = %s",
-                (current_user["id"], new_id),
-            )
-            exists_self = await cursor.fetchone()
-
-            # Determine next id for family_assignation (schema may not auto-increment)
-            await cursor.execute(
-                "SELECT COALESCE(MAX(id), 0) AS max_id FROM family_assignation"
-            )
-            row_max = await cursor.fetchone() or {"max_id": 0}
-            next_fa_id = int(row_max.get("max_id") or 0) + 1
-
-            if not exists_self:
-                assignments_to_insert.append(
-                    (next_fa_id, new_id, int(current_user["id"]))
-                )
-                next_fa_id += 1
-
-            # Find co-responsables (role admingroup) who share at least one assigned user with current admingroup
-            await cursor.execute(
-                """
-                SELECT DISTINCT fa2.users_responsable_id AS rid
-                FROM family_assignation fa1
-                JOIN family_assignation fa2 ON fa1.users_assigned_id = fa2.users_assigned_id
-                JOIN role_attribution ra ON ra.users_id = fa2.users_responsable_id
-                JOIN roles r ON r.id = ra.roles_id
-                WHERE fa1.users_responsable_id = %s
-                AND fa2.users_responsable_id <> %s
-                AND r.role = 'admingroup'
-                """,
-                (current_user["id"], current_user["id"]),
-            )
-            co_rows = await cursor.fetchall() or []
-            co_ids = []
-            for r in co_rows:
-                try:
-                    rid = int(r.get("rid") if isinstance(r, dict) else r[0])
-                except Exception:
-                    continue
-                if rid != int(current_user["id"]):
-                    co_ids.append(rid)
-
-            for rid in co_ids:
-                await cursor.execute(
-                    "SELECT 1 FROM family_assignation WHERE users_responsable_id = %s AND users_assigned_id = %s",
-                    (rid, new_id),
-                )
-                if not await cursor.fetchone():
-                    assignments_to_insert.append((next_fa_id, new_id, rid))
-                    next_fa_id += 1
-
-            if assignments_to_insert:
-                try:
-                    await cursor.executemany(
-                        "INSERT INTO family_assignation (id, users_assigned_id, users_responsable_id) VALUES (%s, %s, %s)",
-                        assignments_to_insert,
-                    )
-                    await cursor.commit()
-                except Exception:
-                    logger.exception(
-                        "[users] Failed to auto-assign family_assignation for new user %s",
-                        new_id,
-                    )
-    except Exception:
-        logger.exception(
-            "[users] Unexpected error during admingroup auto-assign for new user %s",
-            new_id,
-        )
-    await cursor.execute("SELECT * FROM users WHERE id = %s", (new_id,))
-    user = await cursor.fetchone()
+    invalidate_roles(new_id)
+    user = await load_row(cursor, "users", new_id)
 
     # Notify admins about new user
     try:
@@ -527,7 +518,7 @@ async def create_user(
     return user
 
 
-@router.patch("/users/bulk-tier")
+@router.patch("/users/bulk-tier", dependencies=[Depends(query_budget(500))])
 async def bulk_update_user_tier(
     request: Request,
     cursor=Depends(get_cursor),
@@ -557,6 +548,7 @@ async def bulk_update_user_tier(
     await cursor.execute(sql, tuple(vals))
     try:
         await cursor.commit()
+        invalidate_principals(*body.user_ids)
         try:
             await update_users_graph(request.app, cursor)
         except Exception:
@@ -595,8 +587,7 @@ async def update_user_by_id(
 
     body = UserAdminUpdate(**data)
 
-    await cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-    row_curr = await cursor.fetchone()
+    row_curr = await load_row(cursor, "users", user_id)
     if not row_curr:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -618,10 +609,9 @@ async def update_user_by_id(
         from utils import ensure_unique_username
 
         try:
-            unique_uname = await asyncio.to_thread(
-                ensure_unique_username,
+            unique_uname = await ensure_unique_username(
                 body.username,
-                cursor._cursor,
+                cursor,
                 exclude_user_id=user_id,
             )
         except ValueError as e:
@@ -715,7 +705,7 @@ async def update_user_by_id(
         if old_url:
             try:
                 service = AwsFile(settings)
-                await asyncio.to_thread(service.delete_image, old_url)
+                await blob_executor.run(service.delete_image, old_url)
             except Exception as exc:
                 logger.warning(
                     "[users] Impossible de supprimer l'image existante (id=%s): %s",
@@ -740,7 +730,7 @@ async def update_user_by_id(
         if body.isfirstlogin == 1:
             from auth_utils import hash_password
 
-            new_pass_hash = hash_password(settings.user_password_default)
+            new_pass_hash = await cpu_executor.run(hash_password, settings.user_password_default)
             fields.append("password = %s")
             values.append(new_pass_hash)
 
@@ -762,7 +752,7 @@ async def update_user_by_id(
         try:
             service = AwsFile(settings)
             old_url = row_curr.get("image_url")
-            up_res = await asyncio.to_thread(
+            up_res = await blob_executor.run(
                 service.update_image, old_url, upload, "users", desired_username
             )
             fields.append("image_url = %s")
@@ -780,6 +770,7 @@ async def update_user_by_id(
     await cursor.execute(sql, tuple(values))
     try:
         await cursor.commit()
+        invalidate_principals(user_id)
         try:
             await update_users_graph(request.app, cursor)
         except Exception:
@@ -791,8 +782,7 @@ async def update_user_by_id(
             detail="Database commit failed",
         )
 
-    await cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-    u = await cursor.fetchone()
+    u = await load_row(cursor, "users", user_id)
     if u:
         u.pop("password", None)
     return u
@@ -853,6 +843,8 @@ async def delete_user_by_id(
             )
             await cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
             await cursor.commit()
+            invalidate_principals(user_id)
+            invalidate_roles(user_id)
             if request is not None:
                 try:
                     await update_users_graph(request.app, cursor)
@@ -878,6 +870,7 @@ async def delete_user_by_id(
         )
     try:
         await cursor.commit()
+        invalidate_principals(user_id)
         if request is not None:
             try:
                 await update_users_graph(request.app, cursor)
@@ -925,33 +918,30 @@ async def get_current_user_profile(
 
 
 @router.get("/tree", response_model=List[UserSchema])
-async def get_tree(cursor=Depends(get_cursor)):
+async def get_tree(cursor=Depends(get_read_cursor)):
     # Fetch users and gender to compute role from relationships (not from DB roles table)
     sql = """
         SELECT u.id, u.firstname, u.lastname, u.image_url, u.birthday, u.id_father, u.id_mother, u.gender
         FROM users u
         ORDER BY u.id
         """
-    await cursor.execute(sql)
-    rows = await cursor.fetchall()
+    # Compact records: one tuple per user, no intermediate dict per row
+    rows = await cursor.fetch_records(sql)
 
     users_map = {}
     # collect raw users and build children mapping
     children_map = {}
-    for row in rows:
-        uid = row["id"]
+    for uid, firstname, lastname, image_url, birthday, id_father, id_mother, gender in rows:
         users_map[uid] = {
             "id": uid,
-            "firstname": row.get("firstname"),
-            "lastname": row.get("lastname"),
-            "image_url": row.get("image_url"),
-            "birthday": (
-                str(row.get("birthday")) if row.get("birthday") is not None else None
-            ),
-            "id_father": row.get("id_father"),
-            "id_mother": row.get("id_mother"),
-            "gender": (row.get("gender") or "").strip().lower(),
-            "_fullname": f"{row.get('firstname') or ''} {row.get('lastname') or ''}".strip(),
+            "firstname": firstname,
+            "lastname": lastname,
+            "image_url": image_url,
+            "birthday": str(birthday) if birthday is not None else None,
+            "id_father": id_father,
+            "id_mother": id_mother,
+            "gender": (gender or "").strip().lower(),
+            "_fullname": f"{firstname or ''} {lastname or ''}".strip(),
         }
         # initialize children list
         children_map.setdefault(uid, [])
@@ -1048,6 +1038,7 @@ async def update_current_user_profile(
     await cursor.execute(sql, tuple(values))
     try:
         await cursor.commit()
+        invalidate_principals(current_user["id"])
         try:
             await update_users_graph(request.app, cursor)
         except Exception:
@@ -1061,8 +1052,7 @@ async def update_current_user_profile(
             detail="Database commit failed",
         )
 
-    await cursor.execute("SELECT * FROM users WHERE id = %s", (current_user["id"],))
-    updated = await cursor.fetchone()
+    updated = await load_row(cursor, "users", current_user["id"])
     updated.pop("password", None)
     return updated
 
@@ -1107,10 +1097,7 @@ async def get_parents_by_user_id(
     Public endpoint: returns father and mother for a given user id in a single call.
     Response: { father: User | null, mother: User | null }
     """
-    await cursor.execute(
-        "SELECT id_father, id_mother FROM users WHERE id = %s", (user_id,)
-    )
-    row = await cursor.fetchone()
+    row = await load_row(cursor, "users", user_id)
     if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -1122,15 +1109,15 @@ async def get_parents_by_user_id(
     father = None
     mother = None
 
+    # Both parents in one query
+    await load_rows(cursor, "users", [i for i in (fid, mid) if i is not None])
     if fid is not None:
-        await cursor.execute("SELECT * FROM users WHERE id = %s", (fid,))
-        f = await cursor.fetchone()
+        f = await load_row(cursor, "users", fid)
         if f:
             f.pop("password", None)
             father = f
     if mid is not None:
-        await cursor.execute("SELECT * FROM users WHERE id = %s", (mid,))
-        m = await cursor.fetchone()
+        m = await load_row(cursor, "users", mid)
         if m:
             m.pop("password", None)
             mother = m
@@ -0,0 +1,50 @@
+import collections
+import functools
+from typing import Any, Iterable, List, Sequence, Tuple
+
+
+@functools.lru_cache(maxsize=256)
+def record_type(columns: Tuple[str, ...]) -> type:
+    """Row class for a column list: a tuple subclass (no per-row dict, no repeated
+    key strings), created once per column list and shared by every row of it.
+
+    Rows read like the dict rows handlers already use (`row["id"]`, `row.get(...)`,
+    `row.items()`), by attribute (`row.id`) or by position (`row[0]`, unpacking).
+    Columns that are not identifiers (e.g. `COUNT(*)`) are only reachable by name
+    lookup or position.
+    """
+    base = collections.namedtuple("Record", columns, rename=True)
+    index = {name: i for i, name in enumerate(columns)}
+    item = tuple.__getitem__
+
+    class Record(base):
+        __slots__ = ()
+
+        def __getitem__(self, key):
+            if isinstance(key, str):
+                return item(self, index[key])
+            return item(self, key)
+
+        def get(self, key: str, default: Any = None) -> Any:
+            i = index.get(key)
+            return default if i is None else item(self, i)
+
+        def keys(self) -> Tuple[str, ...]:
+            return columns
+
+        def items(self):
+            return zip(columns, self)
+
+        def as_dict(self) -> dict:
+            return dict(zip(columns, self))
+
+    return Record
+
+
+def make_records(columns: Sequence[str], rows: Iterable[tuple]) -> List[Any]:
+    """Wrap driver tuples as records without copying them field by field.
+    FastAPI encodes records as JSON arrays: convert (as_dict or a model) before returning them.
+    """
+    cls = record_type(tuple(columns))
+    new = tuple.__new__
+    return [new(cls, row) for row in rows]
@@ -29,6 +29,81 @@ class Settings:
         self.db_port = int(os.getenv("BACKEND_LOCAL_DB_PORT", "3306"))
         # Optional: connection pool size for MySQL
         self.db_pool_size = int(os.getenv("BACKEND_DB_POOL_SIZE", "15"))
+        # Optional: connections opened per pool at startup, before the app reports ready
+        self.db_pool_warm = int(os.getenv("BACKEND_DB_POOL_WARM", "4"))
+        # Optional: how many callers may queue for a connection, and how long (seconds) each waits
+        self.db_pool_max_waiters = int(os.getenv("BACKEND_DB_POOL_MAX_WAITERS", "100"))
+        self.db_pool_timeout = float(os.getenv("BACKEND_DB_POOL_TIMEOUT", "5"))
+        # Optional: recycle connections older than this / idle longer than this (seconds, 0 = never)
+        self.db_pool_max_lifetime = float(os.getenv("BACKEND_DB_POOL_MAX_LIFETIME", "3600"))
+        self.db_pool_idle_timeout = float(os.getenv("BACKEND_DB_POOL_IDLE_TIMEOUT", "300"))
+        # Optional: only ping connections that sat idle at least this long (seconds) on checkout
+        self.db_pool_ping_after = float(os.getenv("BACKEND_DB_POOL_PING_AFTER", "30"))
+        # Optional: warn about connections checked out longer than this (seconds, 0 = off)
+        self.db_pool_leak_threshold = float(os.getenv("BACKEND_DB_POOL_LEAK_THRESHOLD", "60"))
+        # Optional: bulkhead partitions on the primary, each with its own size and checkout timeout
+        # (admin/reporting routes and background jobs cannot starve interactive traffic)
+        self.db_admin_pool_size = int(os.getenv("BACKEND_DB_ADMIN_POOL_SIZE", "3"))
+        self.db_admin_pool_timeout = float(os.getenv("BACKEND_DB_ADMIN_POOL_TIMEOUT", "15"))
+        self.db_background_pool_size = int(os.getenv("BACKEND_DB_BACKGROUND_POOL_SIZE", "2"))
+        self.db_background_pool_timeout = float(os.getenv("BACKEND_DB_BACKGROUND_POOL_TIMEOUT", "30"))
+        # Optional: read replica for heavy GET endpoints (unset = every read goes to the primary)
+        self.db_read_host = os.getenv("BACKEND_DB_READ_HOST")
+        self.db_read_port = int(os.getenv("BACKEND_DB_READ_PORT", str(self.db_port)))
+        self.db_read_user = os.getenv("BACKEND_DB_READ_USER", self.db_user)
+        self.db_read_pass = os.getenv("BACKEND_DB_READ_PASS", self.db_pass)
+        self.db_read_name = os.getenv("BACKEND_DB_READ_NAME", self.db_name)
+        self.db_read_pool_size = int(os.getenv("BACKEND_DB_READ_POOL_SIZE", str(self.db_pool_size)))
+        # Optional: after a user writes, keep their reads on the primary for this many seconds
+        self.db_read_sticky_seconds = float(os.getenv("BACKEND_DB_READ_STICKY_SECONDS", "5"))
+        # Optional: prepared statements cached per connection (mysql-connector driver, 0 = off)
+        self.db_stmt_cache_size = int(os.getenv("BACKEND_DB_STMT_CACHE_SIZE", "32"))
+        # Optional: DB time budget per request (seconds, 0 = none; routes may set their own).
+        # SELECTs carry it as a MAX_EXECUTION_TIME hint; statements still running past it are killed
+        self.db_request_timeout = float(os.getenv("BACKEND_DB_REQUEST_TIMEOUT", "30"))
+        # Optional: log statements slower than this (ms, 0 = off) with redacted parameters
+        self.db_slow_query_ms = float(os.getenv("BACKEND_DB_SLOW_QUERY_MS", "500"))
+        # Optional: statements one request may run (0 = unlimited), and how many runs of the same
+        # statement in one request are reported as an N+1 loop. Over budget the request fails
+        # when enforced (default outside production), otherwise it is only logged
+        self.db_request_max_queries = int(os.getenv("BACKEND_DB_REQUEST_MAX_QUERIES", "50"))
+        self.db_n_plus_one_threshold = int(os.getenv("BACKEND_DB_N_PLUS_ONE_THRESHOLD", "10"))
+        self.db_enforce_query_budget = str(
+            os.getenv("BACKEND_DB_ENFORCE_QUERY_BUDGET", "false" if self.is_production else "true")
+        ).strip().lower() in {"1", "true", "yes"}
+        # Optional: connections one request may use at once for independent reads (gather_queries, 1 = sequential)
+        self.db_fanout_max_connections = int(os.getenv("BACKEND_DB_FANOUT_MAX_CONNECTIONS", "3"))
+        # Optional: ids reserved per round trip to `id_sequences` for tables without AUTO_INCREMENT
+        self.db_id_block_size = int(os.getenv("BACKEND_DB_ID_BLOCK_SIZE", "20"))
+        # Optional: how often (seconds) each worker catches up on revoked tokens (logouts) from the DB;
+        # a logout on another worker is honoured within that delay (0 = query on every request)
+        self.revocation_refresh_seconds = float(os.getenv("BACKEND_REVOCATION_REFRESH_SECONDS", "5"))
+        # Optional: how often (seconds, 0 = never) expired rows are purged from revoked_tokens,
+        # and how many rows each DELETE removes
+        self.revoked_tokens_purge_interval = float(os.getenv("BACKEND_REVOKED_TOKENS_PURGE_INTERVAL", "3600"))
+        self.revoked_tokens_purge_batch = int(os.getenv("BACKEND_REVOKED_TOKENS_PURGE_BATCH", "1000"))
+        # Optional: authenticated users cached per worker (seconds to live, 0 = off, and max entries);
+        # user updates invalidate them on the worker that wrote, other workers within the TTL
+        self.principal_cache_ttl = float(os.getenv("BACKEND_PRINCIPAL_CACHE_TTL", "60"))
+        self.principal_cache_size = int(os.getenv("BACKEND_PRINCIPAL_CACHE_SIZE", "10000"))
+        # Optional: role sets of users cached per worker (seconds to live, 0 = off, and max entries);
+        # the role endpoints invalidate them on the worker that wrote, other workers within the TTL
+        self.role_cache_ttl = float(os.getenv("BACKEND_ROLE_CACHE_TTL", "60"))
+        self.role_cache_size = int(os.getenv("BACKEND_ROLE_CACHE_SIZE", "10000"))
+        # Optional: issue self-contained tokens (roles + token generation in the claims) at login,
+        # and how often (seconds) each worker re-reads the generations (0 = query on every request)
+        self.jwt_self_contained = str(os.getenv("BACKEND_JWT_SELF_CONTAINED", "false")).strip().lower() in {"1", "true", "yes"}
+        self.token_generation_refresh_seconds = float(os.getenv("BACKEND_TOKEN_GENERATION_REFRESH_SECONDS", "5"))
+        # Optional: thread pool sizes for blocking work (DB defaults to the pool size)
+        self.db_executor_workers = int(os.getenv("BACKEND_DB_EXECUTOR_WORKERS", "0"))
+        self.blob_executor_workers = int(os.getenv("BACKEND_BLOB_EXECUTOR_WORKERS", "4"))
+        self.cpu_executor_workers = int(os.getenv("BACKEND_CPU_EXECUTOR_WORKERS", "2"))
+        # Optional: DB driver behind AsyncCursor.
+        # "thread"  -> mysql-connector, each call runs in the threadpool (default)
+        # "aiomysql" -> native asyncio driver, no thread hop per call
+        self.db_driver = str(os.getenv("BACKEND_DB_DRIVER", "thread")).strip().lower()
+        if self.db_driver not in {"thread", "aiomysql"}:
+            raise ValueError(f"Unsupported BACKEND_DB_DRIVER: {self.db_driver}")
 
         # Optional: route DB via SSH tunnel (e.g., Lightsail with PEM)
         self.db_via_ssh = str(os.getenv("BACKEND_DB_VIA_SSH", 'false')).strip().lower() in {"1", "true", "yes"}
@@ -46,6 +121,9 @@ class Settings:
             # Where MySQL is listening on the remote host (usually 127.0.0.1:3306)
             self.ssh_remote_bind_host = os.getenv("BACKEND_SSH_REMOTE_BIND_HOST", "127.0.0.1")
             self.ssh_remote_bind_port = int(os.getenv("BACKEND_SSH_REMOTE_BIND_PORT", "3306"))
+            # Optional: parallel tunnels (connections are spread across them) and health check period (seconds)
+            self.ssh_tunnel_count = int(os.getenv("BACKEND_SSH_TUNNELS", "1"))
+            self.ssh_health_interval = float(os.getenv("BACKEND_SSH_HEALTH_INTERVAL", "10"))
         else:
             self.ssh_host = None
             self.ssh_port = 22
@@ -55,6 +133,8 @@ class Settings:
             self.ssh_password = None
             self.ssh_remote_bind_host = "127.0.0.1"
             self.ssh_remote_bind_port = 3306
+            self.ssh_tunnel_count = 1
+            self.ssh_health_interval = 10.0
 
         # JWT (required)
         self.jwt_secret = os.environ["BACKEND_JWT_SECRET"]
@@ -124,6 +204,18 @@ class Settings:
             "connect_timeout": 5,
         }
 
+    def get_db_read_config(self):
+        if not self.db_read_host:
+            return None
+        return {
+            "host": self.db_read_host,
+            "user": self.db_read_user,
+            "password": self.db_read_pass,
+            "database": self.db_read_name,
+            "port": self.db_read_port,
+            "connect_timeout": 5,
+        }
+
     def _resolve_path(self, path_str: str) -> str:
         """Resolve a potentially relative path to an absolute path.
         Tries current working directory, backend directory, and project root.
@@ -0,0 +1,260 @@
+import bisect
+import datetime
+import functools
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from settings import settings
+from query_budget import note_statement
+
+logger = logging.getLogger("db")
+
+# Latency histogram upper bounds (ms); one more bucket counts everything slower
+_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Distinct fingerprints kept; statements past that are counted under _OTHER
+_MAX_FINGERPRINTS = 1000
+_OTHER = "(other statements)"
+# Calling routes kept per fingerprint
+_MAX_ROUTES = 20
+
+# ------------------------------
+# Fingerprints
+# ------------------------------
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"", re.S)
+_COMMENT_RE = re.compile(r"/\*.*?\*/|--[^\n]*", re.S)
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+_VALUES_RE = re.compile(r"\bVALUES\s*\([^()]*\)(?:\s*,\s*\([^()]*\))*", re.I)
+_SPACE_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """Normalized statement text: literals and placeholders become `?`, IN lists and
+    multi-row VALUES collapse, comments (and optimizer hints) and extra whitespace go.
+    Statements that differ only in their values share a fingerprint."""
+    text = _STRING_RE.sub("?", sql)
+    text = _COMMENT_RE.sub(" ", text)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (...)", text)
+    text = _VALUES_RE.sub("VALUES (...)", text)
+    return _SPACE_RE.sub(" ", text).strip().rstrip(";").strip()
+
+
+# ------------------------------
+# Parameter redaction (slow query log)
+# ------------------------------
+
+_SENSITIVE_NAME_RE = re.compile(r"pass|pwd|token|secret|jti|hash|email|phone|birth|key", re.I)
+# bcrypt hashes, JWTs, e-mail addresses
+_SENSITIVE_VALUE_RE = re.compile(r"^\$2[aby]?\$|^eyJ[\w-]+\.|[^@\s]+@[^@\s]+\.\w+")
+_INSERT_COLUMNS_RE = re.compile(r"\bINTO\s+`?\w+`?\s*\(([^)]*)\)\s*VALUES\s*\(", re.I)
+_COLUMN_BEFORE_RE = re.compile(
+    r"`?(\w+)`?\s*(?:<=>|!=|<>|<=|>=|=|<|>|\bLIKE\b|\bIN\b)[\s(,%s]*$", re.I
+)
+_MAX_VALUE_CHARS = 64
+
+
+@functools.lru_cache(maxsize=1024)
+def _placeholder_columns(sql: str) -> tuple:
+    """Column each %s placeholder binds to, as far as it can be told (None if unknown)."""
+    positions = [m.start() for m in re.finditer(r"%s", sql)]
+    insert = _INSERT_COLUMNS_RE.search(sql)
+    if insert:
+        columns = [c.strip(" `") for c in insert.group(1).split(",")]
+        if len(columns) <= len(positions):
+            return tuple(columns) + (None,) * (len(positions) - len(columns))
+    names = []
+    for pos in positions:
+        m = _COLUMN_BEFORE_RE.search(sql[max(0, pos - 200):pos])
+        names.append(m.group(1) if m else None)
+    return tuple(names)
+
+
+def _show(value: Any, column: Optional[str]) -> str:
+    if value is None or isinstance(value, (bool, int, float)):
+        return repr(value)
+    if column and _SENSITIVE_NAME_RE.search(column):
+        return "'***'"
+    if isinstance(value, (bytes, bytearray)):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return repr(str(value))
+    text = str(value)
+    if _SENSITIVE_VALUE_RE.search(text):
+        return "'***'"
+    if len(text) > _MAX_VALUE_CHARS:
+        text = text[:_MAX_VALUE_CHARS] + "..."
+    return repr(text)
+
+
+def redact_params(sql: str, params: Any) -> str:
+    """Statement parameters for logs, with passwords, tokens, e-mails and the like masked."""
+    if not params:
+        return "()"
+    if isinstance(params, list) and isinstance(params[0], (tuple, list, dict)):
+        # executemany: the row count is enough to tell the calls apart
+        return f"<{len(params)} parameter rows>"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k!r}: {_show(v, str(k))}" for k, v in params.items()) + "}"
+    columns = _placeholder_columns(sql) if isinstance(sql, str) else ()
+    shown = [_show(v, columns[i] if i < len(columns) else None) for i, v in enumerate(params)]
+    return "(" + ", ".join(shown) + ")"
+
+
+# ------------------------------
+# Aggregates
+# ------------------------------
+
+class _Fingerprint:
+    __slots__ = ("calls", "errors", "total_ms", "max_ms", "rows", "buckets", "routes")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(_BUCKETS_MS) + 1)
+        self.routes: Dict[str, int] = {}
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound (ms) of the histogram bucket holding the q-th percentile."""
+        if not self.calls:
+            return None
+        target = q * self.calls
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return float(_BUCKETS_MS[i]) if i < len(_BUCKETS_MS) else round(self.max_ms, 2)
+        return round(self.max_ms, 2)
+
+
+# Per process, like the pool stats; cursors run on the event loop but background
+# jobs or scripts may record from other threads
+_lock = threading.Lock()
+_stats: Dict[str, _Fingerprint] = {}
+_since = time.time()
+
+
+def record(sql: Any, params: Any, elapsed: float, rows: int, route: Optional[str], failed: bool = False) -> None:
+    """Add one statement execution (elapsed in seconds) to its fingerprint's stats,
+    and log it when slower than BACKEND_DB_SLOW_QUERY_MS."""
+    fp = fingerprint(sql if isinstance(sql, str) else str(sql))
+    ms = elapsed * 1000
+    route = route or "-"
+    with _lock:
+        entry = _stats.get(fp)
+        if entry is None:
+            key = fp if len(_stats) < _MAX_FINGERPRINTS else _OTHER
+            entry = _stats.get(key)
+            if entry is None:
+                entry = _stats[key] = _Fingerprint()
+        entry.calls += 1
+        entry.total_ms += ms
+        entry.rows += rows
+        if failed:
+            entry.errors += 1
+        if ms > entry.max_ms:
+            entry.max_ms = ms
+        entry.buckets[bisect.bisect_left(_BUCKETS_MS, ms)] += 1
+        if route in entry.routes or len(entry.routes) < _MAX_ROUTES:
+            entry.routes[route] = entry.routes.get(route, 0) + 1
+    note_statement(fp, ms)
+
+    threshold = settings.db_slow_query_ms
+    if threshold > 0 and ms >= threshold:
+        logger.warning(
+            f"[db] Slow query ({ms:.0f} ms, {rows} rows{', failed' if failed else ''}) "
+            f"route={route}: {fp} params={redact_params(sql, params)}"
+        )
+
+
+class StatementSample:
+    """Timing of one statement: the execute call plus the fetches that read its result.
+    Recorded once, by finish()."""
+
+    __slots__ = ("sql", "params", "route", "elapsed", "rows", "failed", "done")
+
+    def __init__(self, sql: Any, params: Any, route: Optional[str]):
+        self.sql = sql
+        self.params = params
+        self.route = route
+        self.elapsed = 0.0
+        self.rows = 0
+        self.failed = False
+        self.done = False
+
+    async def timed(self, awaitable):
+        """Await a driver call, adding its duration; a failure finishes the sample."""
+        started = time.perf_counter()
+        try:
+            result = await awaitable
+        except BaseException:
+            self.elapsed += time.perf_counter() - started
+            self.failed = True
+            self.finish()
+            raise
+        self.elapsed += time.perf_counter() - started
+        return result
+
+    def finish(self, rows: int = 0) -> None:
+        if self.done:
+            return
+        self.done = True
+        self.rows += max(rows or 0, 0)
+        try:
+            record(self.sql, self.params, self.elapsed, self.rows, self.route, self.failed)
+        except Exception as e:
+            # Instrumentation must never fail a query
+            logger.debug(f"[db] Failed to record statement stats: {e}")
+
+
+def get_sql_stats(limit: int = 20, sort: str = "total_ms") -> Dict[str, Any]:
+    """Top fingerprints by `sort` (total_ms, calls, mean_ms, max_ms, rows or errors)."""
+    with _lock:
+        items = [
+            {
+                "fingerprint": fp,
+                "calls": e.calls,
+                "errors": e.errors,
+                "total_ms": round(e.total_ms, 2),
+                "mean_ms": round(e.total_ms / e.calls, 3) if e.calls else 0.0,
+                "max_ms": round(e.max_ms, 2),
+                "p50_ms": e.percentile(0.50),
+                "p95_ms": e.percentile(0.95),
+                "p99_ms": e.percentile(0.99),
+                "rows": e.rows,
+                "rows_per_call": round(e.rows / e.calls, 2) if e.calls else 0.0,
+                "histogram": {
+                    (f"<={b}ms" if i < len(_BUCKETS_MS) else f">{_BUCKETS_MS[-1]}ms"): n
+                    for i, (b, n) in enumerate(zip(_BUCKETS_MS + (None,), e.buckets))
+                    if n
+                },
+                "routes": dict(sorted(e.routes.items(), key=lambda kv: kv[1], reverse=True)),
+            }
+            for fp, e in _stats.items()
+        ]
+        since = _since
+    items.sort(key=lambda item: item.get(sort) or 0, reverse=True)
+    return {
+        "since": datetime.datetime.fromtimestamp(since, datetime.timezone.utc).isoformat(),
+        "fingerprints": len(items),
+        "total_ms": round(sum(item["total_ms"] for item in items), 2),
+        "slow_query_ms": settings.db_slow_query_ms,
+        "statements": items[: max(limit, 0)],
+    }
+
+
+def reset_sql_stats() -> None:
+    global _since
+    with _lock:
+        _stats.clear()
+        _since = time.time()
@@ -0,0 +1,218 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from sshtunnel import SSHTunnelForwarder
+except Exception:  # pragma: no cover
+    SSHTunnelForwarder = None  # type: ignore
+try:
+    import paramiko
+except Exception:
+    paramiko = None
+
+logger = logging.getLogger("db")
+
+
+def _load_private_key(key_path: Optional[str], password: Optional[str]):
+    """Load the PEM key once with Paramiko, trying each key type; None if not loadable."""
+    if paramiko is None or not os.path.exists(key_path or ""):
+        return None
+    for KeyCls in (
+        getattr(paramiko, "RSAKey", None),
+        getattr(paramiko, "Ed25519Key", None),
+        getattr(paramiko, "ECDSAKey", None),
+        getattr(paramiko, "DSSKey", None),
+    ):
+        if KeyCls is None:
+            continue
+        try:
+            return KeyCls.from_private_key_file(key_path, password=password)
+        except Exception:
+            # Try next key type
+            pass
+    return None
+
+
+class _Tunnel:
+    __slots__ = ("index", "forwarder", "local_port", "healthy", "reconnects", "failures",
+                 "next_attempt", "last_error", "last_check", "up_since")
+
+    def __init__(self, index: int):
+        self.index = index
+        self.forwarder = None
+        self.local_port: Optional[int] = None
+        self.healthy = False
+        self.reconnects = 0
+        self.failures = 0
+        self.next_attempt = 0.0
+        self.last_error: Optional[str] = None
+        self.last_check: Optional[float] = None
+        self.up_since: Optional[float] = None
+
+
+class SSHTunnelSupervisor:
+    """Keeps one or more SSH tunnels to the DB host alive from a background thread.
+
+    - The key is loaded once; tunnels are (re)built off the request path.
+    - Every `health_interval` seconds each tunnel's transport is probed (SSH ignore
+      packet, no MySQL handshake); dead tunnels are rebuilt with exponential backoff
+      on the same local port, so pooled configs stay valid.
+    - `pick()` hands out healthy tunnels round-robin to new DB connections.
+    """
+
+    def __init__(self, settings, count: int = 1, health_interval: float = 10.0,
+                 max_backoff: float = 60.0):
+        if SSHTunnelForwarder is None:
+            raise RuntimeError("sshtunnel is not installed but BACKEND_DB_VIA_SSH=true. Add 'sshtunnel' to requirements and install.")
+        if not settings.ssh_host or not settings.ssh_user or not settings.ssh_key_path:
+            raise RuntimeError("SSH DB mode requires BACKEND_SSH_HOST, BACKEND_SSH_USER and BACKEND_SSH_KEY_PATH in .env")
+        self.settings = settings
+        self.health_interval = max(1.0, float(health_interval))
+        self.max_backoff = max_backoff
+        self._tunnels = [_Tunnel(i) for i in range(max(1, int(count)))]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rr = 0
+        self._pkey = _load_private_key(settings.ssh_key_path, settings.ssh_key_password)
+
+    # ------------------------------
+    # Tunnel lifecycle
+    # ------------------------------
+
+    def _forwarder_kwargs(self, local_port: Optional[int]) -> Dict[str, Any]:
+        s = self.settings
+        kwargs: Dict[str, Any] = dict(
+            ssh_username=s.ssh_user,
+            remote_bind_address=(s.ssh_remote_bind_host, s.ssh_remote_bind_port),
+            local_bind_address=("127.0.0.1", local_port or 0),
+            set_keepalive=10.0,
+            allow_agent=False,
+        )
+        # Optional: SSH password support
+        if s.ssh_password:
+            kwargs["ssh_password"] = s.ssh_password
+        # Fall back to the key path if explicit load failed
+        kwargs["ssh_pkey"] = self._pkey if self._pkey is not None else s.ssh_key_path
+        if s.ssh_key_password:
+            kwargs["ssh_private_key_password"] = s.ssh_key_password
+        return kwargs
+
+    def _open(self, t: _Tunnel) -> None:
+        fwd = SSHTunnelForwarder((self.settings.ssh_host, self.settings.ssh_port), **self._forwarder_kwargs(t.local_port))
+        fwd.start()
+        with self._lock:
+            t.forwarder = fwd
+            t.local_port = int(fwd.local_bind_port)
+            t.healthy = True
+            t.failures = 0
+            t.last_error = None
+            t.up_since = time.time()
+        logger.info(f"[db] SSH tunnel #{t.index} up on 127.0.0.1:{t.local_port}")
+
+    def _close(self, t: _Tunnel) -> None:
+        fwd, t.forwarder = t.forwarder, None
+        if fwd is not None:
+            try:
+                fwd.stop(force=True)
+            except Exception:
+                pass
+
+    def _is_alive(self, t: _Tunnel) -> bool:
+        fwd = t.forwarder
+        if fwd is None or not fwd.is_active:
+            return False
+        try:
+            # Cheap round trip on the SSH transport; raises if the socket is dead
+            fwd._transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    def _reconnect(self, t: _Tunnel) -> None:
+        self._close(t)
+        try:
+            self._open(t)
+            with self._lock:
+                t.reconnects += 1
+        except Exception as e:
+            with self._lock:
+                t.healthy = False
+                t.failures += 1
+                t.last_error = str(e)
+                delay = min(self.max_backoff, 2 ** min(t.failures, 10)) * random.uniform(0.5, 1.0)
+                t.next_attempt = time.monotonic() + delay
+            logger.warning(f"[db] SSH tunnel #{t.index} reconnect failed ({e}); retrying in {delay:.1f}s")
+
+    def _check(self) -> None:
+        for t in self._tunnels:
+            alive = self._is_alive(t)
+            with self._lock:
+                t.last_check = time.time()
+                was_healthy, t.healthy = t.healthy, alive
+            if alive:
+                continue
+            if was_healthy:
+                logger.warning(f"[db] SSH tunnel #{t.index} is down, reconnecting")
+            if time.monotonic() >= t.next_attempt:
+                self._reconnect(t)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            try:
+                self._check()
+            except Exception:
+                logger.exception("[db] SSH tunnel health check failed")
+
+    def start(self) -> None:
+        """Open all tunnels (at least one must come up) and start the health thread."""
+        errors = []
+        for t in self._tunnels:
+            try:
+                self._open(t)
+            except Exception as e:
+                errors.append(e)
+                t.last_error = str(e)
+                t.failures = 1
+        if len(errors) == len(self._tunnels):
+            raise errors[0]
+        self._thread = threading.Thread(target=self._run, name="ssh-tunnel-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for t in self._tunnels:
+            self._close(t)
+
+    # ------------------------------
+    # Consumers
+    # ------------------------------
+
+    def pick(self) -> Tuple[str, int]:
+        """(host, port) of a healthy tunnel, round-robin. Fails fast if all are down."""
+        with self._lock:
+            healthy = [t for t in self._tunnels if t.healthy and t.local_port]
+            if not healthy:
+                raise RuntimeError("No SSH tunnel to the database is up (reconnecting)")
+            self._rr = (self._rr + 1) % len(healthy)
+            return "127.0.0.1", int(healthy[self._rr].local_port)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "index": t.index,
+                    "local_port": t.local_port,
+                    "healthy": t.healthy,
+                    "reconnects": t.reconnects,
+                    "consecutive_failures": t.failures,
+                    "last_error": t.last_error,
+                    "last_check": t.last_check,
+                    "up_since": t.up_since,
+                }
+                for t in self._tunnels
+            ]
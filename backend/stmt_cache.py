@@ -0,0 +1,128 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from mysql.connector import errors as mysql_errors
+
+from settings import settings
+
+logger = logging.getLogger("db")
+
+# Counters across all connections (cursors run on DB executor threads)
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "prepare_errors": 0}
+
+
+def _count(key: str) -> None:
+    with _stats_lock:
+        _stats[key] += 1
+
+
+# ER_UNSUPPORTED_PS: the server cannot prepare this kind of statement
+_UNPREPARABLE_ERRNOS = {1295}
+
+
+def _prepare_failed(error: Exception) -> bool:
+    """Whether a prepared execute failed before the server ran the statement, so
+    the text protocol may run it instead. Anything else (deadlock, KILL QUERY,
+    lock wait timeout, duplicate key...) happened while it ran and must reach the
+    caller: running it again would retry it outside the transaction that failed.
+    """
+    if getattr(error, "errno", None) in _UNPREPARABLE_ERRNOS:
+        return True
+    # Raised by the driver itself (params that do not bind), never sent to the server
+    return isinstance(error, mysql_errors.ProgrammingError) and error.sqlstate is None
+
+
+class PreparedStatementCache:
+    """Per-connection LRU of server-side prepared statements (mysql-connector driver).
+
+    Parameterized statements are prepared on their second use on a connection, so
+    one-off dynamic SQL (IN lists, ad-hoc filters) does not churn the cache; the
+    least recently used statement is deallocated when the cache is full.
+    """
+
+    def __init__(self, conn: Any, capacity: int, min_uses: int = 2):
+        self._conn = conn
+        self.capacity = capacity
+        self.min_uses = min_uses
+        # sql -> (sql object the cursor was prepared with, prepared cursor)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._seen: "OrderedDict[str, int]" = OrderedDict()
+        self._unpreparable: set = set()
+
+    def execute(self, sql: str, params: Optional[tuple]):
+        """Run sql on a cached prepared cursor and return it, or None to use the
+        plain text-protocol cursor instead.
+        """
+        entry = self._entries.get(sql)
+        if entry is not None:
+            self._entries.move_to_end(sql)
+            _count("hits")
+            prepared_sql, cur = entry
+            # The driver only skips re-preparing when given the very same str object
+            cur.execute(prepared_sql, params)
+            return cur
+
+        if sql in self._unpreparable:
+            return None
+        uses = self._seen.pop(sql, 0) + 1
+        if uses < self.min_uses:
+            self._seen[sql] = uses
+            if len(self._seen) > self.capacity * 4:
+                self._seen.popitem(last=False)
+            return None
+
+        _count("misses")
+        cur = self._conn.cursor(prepared=True, dictionary=True)
+        try:
+            cur.execute(sql, params)
+        except Exception as e:
+            try:
+                cur.close()
+            except Exception:
+                pass
+            if not _prepare_failed(e):
+                raise
+            # Some statements cannot be prepared (or the params do not bind): fall back
+            _count("prepare_errors")
+            self._unpreparable.add(sql)
+            logger.debug(f"[db] Not caching prepared statement: {e}")
+            return None
+        self._entries[sql] = (sql, cur)
+        while len(self._entries) > self.capacity:
+            _, (_, old) = self._entries.popitem(last=False)
+            _count("evictions")
+            try:
+                old.close()
+            except Exception as e:
+                logger.debug(f"[db] Failed to deallocate prepared statement: {e}")
+        return cur
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def statement_cache_for(conn: Any) -> Optional[PreparedStatementCache]:
+    """Return the cache attached to a pooled mysql-connector connection (None if disabled)."""
+    if settings.db_stmt_cache_size <= 0:
+        return None
+    cache = getattr(conn, "_kassa_stmt_cache", None)
+    if cache is None:
+        cache = PreparedStatementCache(conn, settings.db_stmt_cache_size)
+        try:
+            conn._kassa_stmt_cache = cache
+        except Exception:
+            return None
+    return cache
+
+
+def get_stmt_cache_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats: Dict[str, Any] = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+    stats["capacity"] = settings.db_stmt_cache_size
+    stats["enabled"] = settings.db_stmt_cache_size > 0 and settings.db_driver == "thread"
+    return stats
@@ -0,0 +1,42 @@
+import json
+from typing import Any, AsyncIterator
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+_END = object()
+
+
+def _encode(item: Any) -> str:
+    # Same encoding as FastAPI's JSONResponse
+    return json.dumps(jsonable_encoder(item), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+async def _json_array_chunks(first: Any, items: AsyncIterator[Any], chunk_bytes: int) -> AsyncIterator[bytes]:
+    if first is _END:
+        yield b"[]"
+        return
+    parts = ["[", _encode(first)]
+    size = len(parts[1]) + 1
+    async for item in items:
+        encoded = _encode(item)
+        parts.append("," + encoded)
+        size += len(encoded) + 1
+        if size >= chunk_bytes:
+            yield "".join(parts).encode("utf-8")
+            parts, size = [], 0
+    parts.append("]")
+    yield "".join(parts).encode("utf-8")
+
+
+async def stream_json_array(items: AsyncIterator[Any], chunk_bytes: int = 64 * 1024) -> StreamingResponse:
+    """Send an async iterator of JSON-able items as a JSON array, encoded as it is
+    consumed (in ~chunk_bytes writes), so memory does not grow with the result size.
+    Pair with cursor.stream() for large result sets.
+
+    The first item is fetched before the response starts, so a failing query
+    (deadline, busy pool) still produces a normal error response.
+    """
+    items = aiter(items)
+    first = await anext(items, _END)
+    return StreamingResponse(_json_array_chunks(first, items, chunk_bytes), media_type="application/json")
@@ -0,0 +1,20 @@
+import os
+import sys
+from pathlib import Path
+
+# Settings read the environment at import; tests never connect to a database
+for key, value in {
+    "BACKEND_ENV": "development",
+    "BACKEND_JWT_SECRET": "test",
+    "BACKEND_JWT_ALGORITHM": "HS256",
+    "BACKEND_JWT_EXP_MINUTES": "60",
+    "BACKEND_PUBLIC_PATHS": "",
+    "BACKEND_USER_PASSWORD_DEFAULT": "test",
+    "BACKEND_LOCAL_DB_HOST": "127.0.0.1",
+    "BACKEND_LOCAL_DB_USER": "test",
+    "BACKEND_LOCAL_DB_PASS": "test",
+    "BACKEND_LOCAL_DB_NAME": "test",
+}.items():
+    os.environ.setdefault(key, value)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
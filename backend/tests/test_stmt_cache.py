@@ -0,0 +1,82 @@
+import pytest
+from mysql.connector import errors as mysql_errors
+
+from stmt_cache import PreparedStatementCache
+
+SQL = "UPDATE users SET isactive = %s WHERE id = %s"
+PARAMS = (0, 7)
+
+
+class FakeCursor:
+    def __init__(self, error=None):
+        self.error = error
+        self.executed = []
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    """Hands out prepared cursors that fail with `error`."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.prepared = []
+
+    def cursor(self, prepared=False, dictionary=False):
+        cur = FakeCursor(self.error)
+        self.prepared.append(cur)
+        return cur
+
+
+def _cache(error):
+    conn = FakeConnection(error)
+    cache = PreparedStatementCache(conn, capacity=4, min_uses=1)
+    return conn, cache
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        mysql_errors.InternalError(msg="Deadlock found when trying to get lock", errno=1213, sqlstate="40001"),
+        mysql_errors.DatabaseError(msg="Query execution was interrupted", errno=1317, sqlstate="70100"),
+        mysql_errors.DatabaseError(msg="Lock wait timeout exceeded", errno=1205, sqlstate="HY000"),
+        mysql_errors.IntegrityError(msg="Duplicate entry", errno=1062, sqlstate="23000"),
+    ],
+)
+def test_execution_errors_reach_the_caller(error):
+    conn, cache = _cache(error)
+    with pytest.raises(type(error)) as raised:
+        cache.execute(SQL, PARAMS)
+    assert raised.value is error
+    # Not run a second time, and still prepared on the next call
+    assert len(conn.prepared[0].executed) == 1
+    assert SQL not in cache._unpreparable
+    conn.error = None
+    assert cache.execute(SQL, PARAMS) is conn.prepared[1]
+
+
+def test_unsupported_statement_falls_back_to_text_protocol():
+    error = mysql_errors.ProgrammingError(
+        msg="This command is not supported in the prepared statement protocol yet", errno=1295, sqlstate="HY000"
+    )
+    conn, cache = _cache(error)
+    assert cache.execute(SQL, PARAMS) is None
+    assert SQL in cache._unpreparable
+    assert conn.prepared[0].closed
+    # Later calls go straight to the text protocol
+    assert cache.execute(SQL, PARAMS) is None
+    assert len(conn.prepared) == 1
+
+
+def test_params_that_do_not_bind_fall_back():
+    error = mysql_errors.ProgrammingError(msg="Incorrect number of arguments executing prepared statement")
+    _, cache = _cache(error)
+    assert cache.execute(SQL, PARAMS) is None
+    assert SQL in cache._unpreparable
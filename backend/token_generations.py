@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from settings import settings
+
+logger = logging.getLogger("auth")
+
+
+# ------------------------------
+# Storage
+# ------------------------------
+
+async def ensure_token_generations_table(cursor) -> None:
+    try:
+        await cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_token_generations (
+                users_id INT NOT NULL PRIMARY KEY,
+                generation INT NOT NULL
+            ) ENGINE=InnoDB;
+            """
+        )
+    except Exception:
+        logger.exception("[auth] Failed to ensure user_token_generations table exists")
+
+
+def _in_clause(count: int) -> str:
+    return ", ".join(["%s"] * count)
+
+
+async def read_token_generation(cursor, user_id: int) -> int:
+    """A user's generation straight from the table (0 until first bumped)."""
+    row = await cursor.fetch_one(
+        "SELECT generation FROM user_token_generations WHERE users_id = %s", (int(user_id),)
+    )
+    return int(row["generation"]) if row else 0
+
+
+class TokenGenerationMap:
+    """Token generations of this process (user id -> generation; users never
+    bumped are absent and at 0).
+
+    Self-contained tokens carry the generation they were issued at and are
+    rejected once it is bumped. The table only holds users whose roles changed
+    or who logged out, so the whole of it is re-read at most every
+    BACKEND_TOKEN_GENERATION_REFRESH_SECONDS, by whichever request finds the map
+    stale; bumps made by this process apply at once. A bump on another worker is
+    therefore honoured here within the refresh interval.
+    """
+
+    def __init__(self):
+        self._generations: Dict[int, int] = {}
+        self._loaded = False
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self, user_id: int) -> int:
+        return self._generations.get(user_id, 0)
+
+    def set(self, user_id: int, generation: int) -> None:
+        self._generations[user_id] = generation
+
+    def stale(self) -> bool:
+        return not self._loaded or time.monotonic() - self._refreshed_at >= settings.token_generation_refresh_seconds
+
+    async def refresh(self, cursor) -> None:
+        async with self._lock:
+            # Another request refreshed while this one waited
+            if not self.stale():
+                return
+            try:
+                rows = await cursor.fetch_all("SELECT users_id, generation FROM user_token_generations") or []
+            except Exception:
+                if self._loaded:
+                    # Retry after another interval instead of on every request
+                    self._refreshed_at = time.monotonic()
+                raise
+            # Replaced wholesale: a local bump whose request rolled back heals here
+            self._generations = {int(row["users_id"]): int(row["generation"]) for row in rows}
+            if not self._loaded:
+                logger.info(f"[auth] Token generations loaded: {len(rows)} users")
+            self._loaded = True
+            self._refreshed_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self._loaded,
+            "users": len(self._generations),
+            "age_s": round(time.monotonic() - self._refreshed_at, 1) if self._loaded else None,
+        }
+
+
+token_generations = TokenGenerationMap()
+
+
+async def current_token_generation(cursor, user_id: int) -> int:
+    """The generation a user's self-contained tokens must carry. Answered from the
+    in-process map; only a stale map costs a query.
+    BACKEND_TOKEN_GENERATION_REFRESH_SECONDS=0 disables the map (one query per call).
+    """
+    if settings.token_generation_refresh_seconds <= 0:
+        return await read_token_generation(cursor, user_id)
+    if token_generations.stale():
+        try:
+            await token_generations.refresh(cursor)
+        except Exception as e:
+            if not token_generations.loaded:
+                raise
+            # Keep serving from the last good state until the next interval
+            logger.warning(f"[auth] Token generation refresh failed, using stale map: {e}")
+    return token_generations.get(int(user_id))
+
+
+async def token_generation_valid(cursor, user_id: int, generation: int) -> bool:
+    """Whether a self-contained token issued at `generation` is still accepted: only
+    a bump since it was issued (a higher current generation) rejects it. A token
+    newer than this worker's map was issued after a bump the map has not read
+    yet; that user's row is re-read instead of failing the request.
+    """
+    user_id = int(user_id)
+    current = await current_token_generation(cursor, user_id)
+    if generation > current and settings.token_generation_refresh_seconds > 0:
+        current = await read_token_generation(cursor, user_id)
+        token_generations.set(user_id, current)
+    return generation >= current
+
+
+async def bump_token_generations(cursor, user_ids: Iterable[Any]) -> None:
+    """Invalidate the self-contained tokens of these users (their roles changed or
+    they logged out) and apply it to this worker at once. Run it in the transaction
+    of the write it stands for; the caller commits. A no-op unless
+    BACKEND_JWT_SELF_CONTAINED is on (the table may not even exist then)."""
+    if not settings.jwt_self_contained:
+        return
+    ids: List[int] = list(dict.fromkeys(int(u) for u in user_ids))
+    if not ids:
+        return
+    await cursor.executemany(
+        "INSERT INTO user_token_generations (users_id, generation) VALUES (%s, 1) "
+        "ON DUPLICATE KEY UPDATE generation = generation + 1",
+        [(uid,) for uid in ids],
+    )
+    rows = await cursor.fetch_all(
+        f"SELECT users_id, generation FROM user_token_generations WHERE users_id IN ({_in_clause(len(ids))})",
+        tuple(ids),
+    ) or []
+    for row in rows:
+        token_generations.set(int(row["users_id"]), int(row["generation"]))
+
+
+async def role_holders(cursor, role_id: int) -> List[int]:
+    """Users holding a role, to bump once it is renamed or deleted (read them first);
+    none without BACKEND_JWT_SELF_CONTAINED, since there is nothing to bump."""
+    if not settings.jwt_self_contained:
+        return []
+    rows = await cursor.fetch_all("SELECT users_id FROM role_attribution WHERE roles_id = %s", (role_id,)) or []
+    return [int(row["users_id"]) for row in rows]
+
+
+def get_token_generation_stats() -> Dict[str, Any]:
+    return {"self_contained": settings.jwt_self_contained, **token_generations.stats()}
+
+
+def token_claims(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Roles and generation of a self-contained token, None for a classic one or
+    while BACKEND_JWT_SELF_CONTAINED is off (such tokens are then checked like
+    classic ones, since nothing bumps their generation)."""
+    if not settings.jwt_self_contained:
+        return None
+    roles = payload.get("roles")
+    generation = payload.get("gen")
+    if not isinstance(roles, list) or not isinstance(generation, int):
+        return None
+    return {"roles": [str(r).lower() for r in roles], "gen": generation}
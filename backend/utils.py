@@ -2,11 +2,12 @@ from fastapi import Request, UploadFile
 from typing import Optional, Tuple, Iterable, Set, List, Dict, Any, Union
 from datetime import datetime
 import logging
-import asyncio
 
 import networkx as nx  # type: ignore
 
-from database import get_db_connection
+from dependencies import open_cursor
+from database import BACKGROUND_POOL
+from id_allocator import next_ids
 
 logger = logging.getLogger("users")
 
@@ -238,62 +239,54 @@ def _base_username_from_names(
     return (initials + year).strip()
 
 
-def ensure_unique_username(
+def _username_candidates(base: str, max_tries: int):
+    """Yield username candidates in preference order: base, base+a..z, base+a1..z999."""
+    import string
+
+    yield base
+    for letter in string.ascii_lowercase:
+        yield f"{base}{letter}"
+    for letter in string.ascii_lowercase:
+        for i in range(1, max_tries):
+            yield f"{base}{letter}{i}"
+
+
+async def ensure_unique_username(
     desired: str, cursor, exclude_user_id: Optional[int] = None, max_tries: int = 1000
 ) -> str:
     """Ensure uniqueness by appending a numeric suffix when needed.
     If `exclude_user_id` is provided, the current user's username won't count as a collision.
     """
-    import string
-
     base = (desired or "").strip()
     if base == "":
         raise ValueError("Nom d'utilisateur vide")
-    # Try without suffix first
-    candidate = base
-    cursor.execute("SELECT id FROM users WHERE username = %s LIMIT 1", (candidate,))
-    row = cursor.fetchone()
-    if not row:
-        return candidate
-    if exclude_user_id is not None:
-        found_id = row[0] if not isinstance(row, dict) else row.get("id")
-        if found_id == exclude_user_id:
+    # Every candidate starts with base: fetch the taken ones in one query
+    # instead of probing candidates one by one
+    prefix = base.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    await cursor.execute(
+        "SELECT id, username FROM users WHERE username LIKE %s", (prefix + "%",)
+    )
+    taken = {}
+    for row in await cursor.fetchall() or []:
+        name = row.get("username") if isinstance(row, dict) else row[1]
+        found_id = row.get("id") if isinstance(row, dict) else row[0]
+        if name is not None:
+            taken.setdefault(str(name).lower(), set()).add(found_id)
+    for candidate in _username_candidates(base, max_tries):
+        # Same collation rules as the column (case-insensitive)
+        owners = taken.get(candidate.lower())
+        if not owners:
             return candidate
-
-    # Try with a-z appended
-    for letter in string.ascii_lowercase:
-        candidate = f"{base}{letter}"
-        cursor.execute("SELECT id FROM users WHERE username = %s LIMIT 1", (candidate,))
-        row = cursor.fetchone()
-        if not row:
+        if exclude_user_id is not None and exclude_user_id in owners:
             return candidate
-        if exclude_user_id is not None:
-            found_id = row[0] if not isinstance(row, dict) else row.get("id")
-            if found_id == exclude_user_id:
-                return candidate
-
-    # Try with a-z and numeric suffix
-    for letter in string.ascii_lowercase:
-        for i in range(1, max_tries):
-            candidate = f"{base}{letter}{i}"
-            cursor.execute(
-                "SELECT id FROM users WHERE username = %s LIMIT 1", (candidate,)
-            )
-            row = cursor.fetchone()
-            if not row:
-                return candidate
-            if exclude_user_id is not None:
-                found_id = row[0] if not isinstance(row, dict) else row.get("id")
-                if found_id == exclude_user_id:
-                    return candidate
     raise ValueError("Impossible de générer un nom d'utilisateur unique")
 
 
-def generate_username_logic(
+async def generate_username_logic(
     firstname: str, lastname: str, birthday: Optional[str], cursor
 ) -> str:
     base = _base_username_from_names(firstname, lastname, birthday)
-    return ensure_unique_username(base, cursor)
+    return await ensure_unique_username(base, cursor)
 
 
 # ------------------------------
@@ -311,7 +304,7 @@ def _build_graph_from_rows(rows: Iterable[Union[Dict[str, Any], tuple]]):
         raise RuntimeError("networkx is required to build the family graph")
     G = nx.DiGraph()
     for row in rows:
-        # Row may be dict (dictionary=True) or tuple in (id, id_father, id_mother)
+        # Row may be dict (dictionary=True) or a tuple / record in (id, id_father, id_mother)
         if isinstance(row, dict):
             uid = row.get("id")
             fid = row.get("id_father")
@@ -328,30 +321,26 @@ def _build_graph_from_rows(rows: Iterable[Union[Dict[str, Any], tuple]]):
     return G
 
 
-def init_users_graph(app) -> None:
+def _store_users_graph(app, G) -> None:
+    if not hasattr(app.state, "users_graph_lock"):
+        # Lazy import to avoid threading in constrained envs
+        import threading
+
+        app.state.users_graph_lock = threading.Lock()
+    with app.state.users_graph_lock:
+        app.state.users_graph = G
+        app.state.users_graph_version = getattr(app.state, "users_graph_version", 0) + 1
+
+
+async def init_users_graph(app, cursor_async) -> None:
     """
     Initialize and store the users graph in app.state at application startup.
-    Uses a synchronous pooled DB connection.
+    Uses the startup AsyncCursor (whichever DB driver is configured).
     """
-    conn = None
-    cursor = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT id, id_father, id_mother FROM users")
-        rows = cursor.fetchall() or []
+        rows = await cursor_async.fetch_records("SELECT id, id_father, id_mother FROM users")
         G = _build_graph_from_rows(rows)
-        # Attach to app state
-        if not hasattr(app.state, "users_graph_lock"):
-            # Lazy import to avoid threading in constrained envs
-            import threading
-
-            app.state.users_graph_lock = threading.Lock()
-        with app.state.users_graph_lock:
-            app.state.users_graph = G
-            app.state.users_graph_version = (
-                getattr(app.state, "users_graph_version", 0) + 1
-            )
+        _store_users_graph(app, G)
         logger.info(
             "[graph] Initialized users_graph with %s nodes, %s edges",
             G.number_of_nodes(),
@@ -359,63 +348,30 @@ def init_users_graph(app) -> None:
         )
     except Exception:
         logger.exception("[graph] Failed to initialize users graph")
-    finally:
-        try:
-            if cursor:
-                cursor.close()
-        finally:
-            try:
-                if conn:
-                    conn.close()
-            except Exception:
-                pass
 
 
 async def update_users_graph(app, cursor_async=None) -> None:
     """
     Refresh the users graph stored in app.state.
-    If an async cursor is provided, it will be used. Otherwise, a sync connection is used.
+    If an async cursor is provided, it will be used. Otherwise, a dedicated cursor is opened.
     """
     rows: List[Union[Dict[str, Any], tuple]] = []
     if cursor_async is not None:
         try:
-            await cursor_async.execute("SELECT id, id_father, id_mother FROM users")
-            rows = await cursor_async.fetchall() or []
+            rows = await cursor_async.fetch_records("SELECT id, id_father, id_mother FROM users")
         except Exception:
             logger.exception(
-                "[graph] Failed to fetch rows with async cursor; falling back to sync"
+                "[graph] Failed to fetch rows with async cursor; falling back to a fresh cursor"
             )
     if not rows:
-        # Fallback to sync query in thread
-        def _fetch_sync():
-            conn_ = None
-            cur_ = None
-            try:
-                conn_ = get_db_connection()
-                cur_ = conn_.cursor(dictionary=True)
-                cur_.execute("SELECT id, id_father, id_mother FROM users")
-                return cur_.fetchall() or []
-            finally:
-                try:
-                    if cur_:
-                        cur_.close()
-                finally:
-                    try:
-                        if conn_:
-                            conn_.close()
-                    except Exception:
-                        pass
-
-        rows = await asyncio.to_thread(_fetch_sync)
+        own_cursor = await open_cursor(BACKGROUND_POOL)
+        try:
+            rows = await own_cursor.fetch_records("SELECT id, id_father, id_mother FROM users")
+        finally:
+            await own_cursor.close()
 
     G = _build_graph_from_rows(rows)
-    if not hasattr(app.state, "users_graph_lock"):
-        import threading
-
-        app.state.users_graph_lock = threading.Lock()
-    with app.state.users_graph_lock:
-        app.state.users_graph = G
-        app.state.users_graph_version = getattr(app.state, "users_graph_version", 0) + 1
+    _store_users_graph(app, G)
     logger.info(
         "[graph] Updated users_graph to version %s (%s nodes, %s edges)",
         getattr(app.state, "users_graph_version", "?"),
@@ -537,18 +493,18 @@ async def send_notification(
         )
         msg_id = cursor.lastrowid
 
-        # 3. Insert recipients
+        # 2. Insert recipients (messages_recipients has no AUTO_INCREMENT)
+        rec_ids = await next_ids("messages_recipients", len(targets))
         values = []
-        for rid in targets:
+        for rec_id, rid in zip(rec_ids, targets):
             sid = sender_id if sender_id else 1 
-            values.append((0, sid, rid, msg_id))
-            next_rec_id += 1
+            values.append((rec_id, 0, sid, rid, msg_id))
 
         if values:
             await cursor.executemany(
                 """
-                INSERT INTO messages_recipients (isreaded, sender_id, receiver_id, messages_id)
-                VALUES (%s, %s, %s, %s)
+                INSERT INTO messages_recipients (id, isreaded, sender_id, receiver_id, messages_id)
+                VALUES (%s, %s, %s, %s, %s)
                 """,
                 values,
             )
@@ -0,0 +1,32 @@
+-- -----------------------------------------------------
+-- Id sequences for tables without AUTO_INCREMENT
+-- -----------------------------------------------------
+-- `roles`, `family_assignation` and `messages_recipients` have no AUTO_INCREMENT:
+-- the backend hands out their ids in blocks reserved here (backend/id_allocator.py)
+-- instead of computing MAX(id) + 1 on every insert.
+--
+-- The backend creates the table and seeds missing rows by itself on first use;
+-- run this ahead of a deploy when its DB user may not CREATE tables, or to seed
+-- the sequences while no writes are running. Safe to run again.
+-- Rows inserted into these tables by hand must take their id from here as well
+-- (UPDATE ... SET next_id = next_id + 1), or they may collide with a reserved block.
+
+USE `database_kassa` ;
+
+CREATE TABLE IF NOT EXISTS `database_kassa`.`id_sequences` (
+  `name` VARCHAR(64) NOT NULL,
+  `next_id` BIGINT NOT NULL,
+  PRIMARY KEY (`name`))
+ENGINE = InnoDB;
+
+INSERT IGNORE INTO `database_kassa`.`id_sequences` (`name`, `next_id`)
+SELECT 'roles', COALESCE(MAX(`id`), 0) + 1 FROM `database_kassa`.`roles`;
+
+INSERT IGNORE INTO `database_kassa`.`id_sequences` (`name`, `next_id`)
+SELECT 'family_assignation', COALESCE(MAX(`id`), 0) + 1 FROM `database_kassa`.`family_assignation`;
+
+INSERT IGNORE INTO `database_kassa`.`id_sequences` (`name`, `next_id`)
+SELECT 'messages_recipients', COALESCE(MAX(`id`), 0) + 1 FROM `database_kassa`.`messages_recipients`;
+
+-- Names of transaction proofs uploaded before their transaction exists
+INSERT IGNORE INTO `database_kassa`.`id_sequences` (`name`, `next_id`) VALUES ('transaction_proofs', 1);
@@ -0,0 +1,33 @@
+-- -----------------------------------------------------
+-- Compact, expiring `revoked_tokens`
+-- -----------------------------------------------------
+-- Logouts used to store the whole token (`token` TEXT) and rows were never
+-- deleted. Revocations are now checked by jti only, and the backend purges rows
+-- whose token has expired (BACKEND_REVOKED_TOKENS_PURGE_INTERVAL), by the
+-- `idx_expires` index.
+--
+-- The backend adds `idx_expires` by itself at startup; this script also drops
+-- the old column and the rows that can never match again. Safe to run again.
+
+USE `database_kassa` ;
+
+-- Rows without jti were never checked; expired ones reject nothing
+DELETE FROM `revoked_tokens` WHERE `jti` IS NULL OR `expires` IS NULL OR `expires` < UTC_TIMESTAMP();
+
+SET @has_idx := (SELECT COUNT(*) FROM information_schema.statistics
+  WHERE table_schema = DATABASE() AND table_name = 'revoked_tokens' AND index_name = 'idx_expires');
+SET @stmt := IF(@has_idx = 0, 'ALTER TABLE `revoked_tokens` ADD INDEX `idx_expires` (`expires`)', 'DO 0');
+PREPARE migration FROM @stmt;
+EXECUTE migration;
+DEALLOCATE PREPARE migration;
+
+SET @has_token := (SELECT COUNT(*) FROM information_schema.columns
+  WHERE table_schema = DATABASE() AND table_name = 'revoked_tokens' AND column_name = 'token');
+SET @stmt := IF(@has_token = 1, 'ALTER TABLE `revoked_tokens` DROP COLUMN `token`', 'DO 0');
+PREPARE migration FROM @stmt;
+EXECUTE migration;
+DEALLOCATE PREPARE migration;
+
+ALTER TABLE `revoked_tokens`
+  MODIFY `jti` VARCHAR(36) NOT NULL,
+  MODIFY `expires` DATETIME NOT NULL;
@@ -0,0 +1,21 @@
+-- -----------------------------------------------------
+-- Token generations for self-contained access tokens
+-- -----------------------------------------------------
+-- With BACKEND_JWT_SELF_CONTAINED=true, access tokens carry the user's roles and
+-- the generation below at login; they are accepted only while it is current.
+-- Role changes and logouts bump it (backend/token_generations.py). Users without
+-- a row are at generation 0.
+--
+-- The backend creates the table by itself at startup; run this ahead of a deploy
+-- when its DB user may not CREATE tables. Safe to run again.
+-- To sign a user out everywhere by hand:
+--   INSERT INTO user_token_generations (users_id, generation) VALUES (<id>, 1)
+--   ON DUPLICATE KEY UPDATE generation = generation + 1;
+
+USE `database_kassa` ;
+
+CREATE TABLE IF NOT EXISTS `database_kassa`.`user_token_generations` (
+  `users_id` INT NOT NULL,
+  `generation` INT NOT NULL,
+  PRIMARY KEY (`users_id`))
+ENGINE = InnoDB;
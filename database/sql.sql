@@ -254,6 +254,28 @@ CREATE TABLE IF NOT EXISTS `database_kassa`.`family_assignation` (
 ENGINE = InnoDB;
 
 
+-- -----------------------------------------------------
+-- Table `database_kassa`.`id_sequences`
+-- (ids of the tables without AUTO_INCREMENT, see migrations/001_id_sequences.sql)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `database_kassa`.`id_sequences` (
+  `name` VARCHAR(64) NOT NULL,
+  `next_id` BIGINT NOT NULL,
+  PRIMARY KEY (`name`))
+ENGINE = InnoDB;
+
+
+-- -----------------------------------------------------
+-- Table `database_kassa`.`user_token_generations`
+-- (self-contained token generations, see migrations/003_user_token_generations.sql)
+-- -----------------------------------------------------
+CREATE TABLE IF NOT EXISTS `database_kassa`.`user_token_generations` (
+  `users_id` INT NOT NULL,
+  `generation` INT NOT NULL,
+  PRIMARY KEY (`users_id`))
+ENGINE = InnoDB;
+
+
 SET SQL_MODE=@OLD_SQL_MODE;
 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS;
 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS;